@@ -0,0 +1,232 @@
+# Backend/core/browser_sessions.py
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+log = logging.getLogger(__name__)
+
+Emit = Callable[[dict[str, Any]], None]
+
+
+def _quiet(_: dict[str, Any]) -> None:
+    pass
+
+
+class BrowserSession:
+    """Un navigateur déjà authentifié, utilisé par un seul worker à la fois."""
+
+    def __init__(self, driver: Any) -> None:
+        self.id = uuid.uuid4().hex[:8]
+        self.driver = driver
+        self.created_monotonic = time.monotonic()
+        self.last_used_monotonic = self.created_monotonic
+        self.uses = 0
+        self.logins = 1
+
+    def age_s(self) -> float:
+        return time.monotonic() - self.created_monotonic
+
+    def idle_s(self) -> float:
+        return time.monotonic() - self.last_used_monotonic
+
+
+class BrowserSessionPool:
+    """
+    Sessions navigateur "chaudes" (login déjà fait) réutilisées d'une requête
+    de scraping à l'autre.
+
+    - acquire(): session inactive saine, sinon nouvelle session + login
+    - health_check(driver) -> "ok" | "expired" | "dead" avant chaque réutilisation;
+      "expired" -> re-login sur le même navigateur, "dead" -> remplacée
+    - release(session, healthy): retour dans le pool (ou fermeture)
+    - les sessions inactives depuis idle_timeout_s / plus vieilles que max_age_s sont fermées
+    """
+
+    def __init__(
+        self,
+        create_driver: Callable[[], Any],
+        login: Callable[[Any, Emit], None],
+        health_check: Callable[[Any], str],
+        *,
+        max_idle: int,
+        idle_timeout_s: float,
+        max_age_s: float,
+        reap_every_s: float = 30.0,
+    ) -> None:
+        self._create_driver = create_driver
+        self._login = login
+        self._health_check = health_check
+        self.max_idle = max_idle
+        self.idle_timeout_s = idle_timeout_s
+        self.max_age_s = max_age_s
+        self._reap_every_s = reap_every_s
+
+        self._idle: list[BrowserSession] = []
+        self._busy: dict[str, BrowserSession] = {}
+        self._lock = threading.Lock()
+        self._reaper: threading.Thread | None = None
+        self._closed = threading.Event()
+
+        self.created = 0
+        self.reused = 0
+        self.relogins = 0
+        self.closed_sessions = 0
+
+    # ── cycle de vie ────────────────────────────────────────────────────────
+
+    def acquire(self, emit: Emit = _quiet) -> tuple[BrowserSession, bool]:
+        """Retourne (session, réutilisée)."""
+        self._ensure_reaper()
+
+        while True:
+            with self._lock:
+                session = self._idle.pop() if self._idle else None
+            if session is None:
+                break
+
+            if self._expired_by_age(session):
+                self._quit(session, "max_age")
+                continue
+
+            t0 = time.perf_counter()
+            state = self._safe_health(session)
+            ms = int((time.perf_counter() - t0) * 1000)
+
+            if state == "ok":
+                emit({"status": "info", "message": f"Session Praxedo {session.id} réutilisée (contrôle {ms} ms)."})
+                with self._lock:
+                    self.reused += 1
+                return self._lease(session), True
+
+            if state == "expired":
+                emit({"status": "info", "message": f"Session Praxedo {session.id} expirée, reconnexion..."})
+                try:
+                    self._login(session.driver, emit)
+                    session.logins += 1
+                    with self._lock:
+                        self.relogins += 1
+                    return self._lease(session), True
+                except Exception as e:
+                    log.warning("re-login session %s échoué: %s", session.id, e)
+
+            self._quit(session, state)
+
+        emit({"status": "info", "message": "Connexion à Selenium (Remote Chrome)..."})
+        driver = self._create_driver()
+        emit({"status": "info", "message": "Session Selenium créée."})
+        try:
+            self._login(driver, emit)
+        except Exception:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            raise
+
+        session = BrowserSession(driver)
+        with self._lock:
+            self.created += 1
+        return self._lease(session), False
+
+    def release(self, session: BrowserSession, healthy: bool = True) -> None:
+        session.last_used_monotonic = time.monotonic()
+        with self._lock:
+            self._busy.pop(session.id, None)
+            keep = (
+                healthy
+                and not self._closed.is_set()
+                and len(self._idle) < self.max_idle
+                and not self._expired_by_age(session)
+            )
+            if keep:
+                self._idle.append(session)
+        if not keep:
+            self._quit(session, "release")
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            stale = [s for s in self._idle if s.idle_s() > self.idle_timeout_s or self._expired_by_age(s)]
+            self._idle = [s for s in self._idle if s not in stale]
+        for s in stale:
+            self._quit(s, "idle")
+        return len(stale)
+
+    def close_all(self) -> int:
+        with self._lock:
+            sessions = list(self._idle)
+            self._idle.clear()
+        for s in sessions:
+            self._quit(s, "close")
+        return len(sessions)
+
+    def shutdown(self) -> None:
+        self._closed.set()
+        self.close_all()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            idle = [
+                {"id": s.id, "idle_s": round(s.idle_s(), 1), "age_s": round(s.age_s(), 1), "uses": s.uses, "logins": s.logins}
+                for s in self._idle
+            ]
+            busy = [
+                {"id": s.id, "age_s": round(s.age_s(), 1), "uses": s.uses, "logins": s.logins}
+                for s in self._busy.values()
+            ]
+            return {
+                "idle": idle,
+                "busy": busy,
+                "max_idle": self.max_idle,
+                "idle_timeout_s": self.idle_timeout_s,
+                "max_age_s": self.max_age_s,
+                "created": self.created,
+                "reused": self.reused,
+                "relogins": self.relogins,
+                "closed": self.closed_sessions,
+            }
+
+    # ── interne ─────────────────────────────────────────────────────────────
+
+    def _lease(self, session: BrowserSession) -> BrowserSession:
+        session.uses += 1
+        session.last_used_monotonic = time.monotonic()
+        with self._lock:
+            self._busy[session.id] = session
+        return session
+
+    def _expired_by_age(self, session: BrowserSession) -> bool:
+        return self.max_age_s > 0 and session.age_s() > self.max_age_s
+
+    def _safe_health(self, session: BrowserSession) -> str:
+        try:
+            return self._health_check(session.driver)
+        except Exception:
+            return "dead"
+
+    def _quit(self, session: BrowserSession, reason: str) -> None:
+        with self._lock:
+            self.closed_sessions += 1
+        log.info("fermeture session navigateur %s (%s)", session.id, reason)
+        try:
+            session.driver.quit()
+        except Exception:
+            pass
+
+    def _ensure_reaper(self) -> None:
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="browser-session-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        while not self._closed.wait(self._reap_every_s):
+            try:
+                self.evict_idle()
+            except Exception:
+                log.exception("éviction des sessions navigateur échouée")
@@ -19,6 +19,47 @@ class Settings(BaseSettings):
     # ✅ Selenium remote (pour Docker)
     SELENIUM_REMOTE_URL: str | None = None
 
+    # imports CSV en arrière-plan (core/import_jobs): threads, durée de conservation
+    # des jobs terminés, dossier des fichiers reçus (vide = dossier temporaire système)
+    IMPORT_JOB_WORKERS: int = 2
+    IMPORT_JOB_RETENTION_S: int = 3600
+    IMPORT_SPOOL_DIR: str | None = None
+
+    # Scraper: navigateurs Praxedo en parallèle (doit rester <= sessions max du grid Selenium)
+    SCRAPER_SESSIONS: int = 1
+    SCRAPER_MAX_SESSIONS: int = 4
+    # jobs de scraping simultanés (core/scrape_jobs); chacun utilise SCRAPER_SESSIONS navigateurs
+    SCRAPE_JOB_WORKERS: int = 1
+    # navigateurs connectés gardés entre deux requêtes
+    SCRAPER_SESSION_IDLE_S: int = 900
+    SCRAPER_SESSION_MAX_AGE_S: int = 4 * 3600
+    # relevés déjà scrapés (raw.pidi_scrape_full) resservis sans navigateur
+    SCRAPER_CACHE_TTL_S: int = 72 * 3600
+    # 0 = identifiants saisis d'un bloc au login Okta
+    SCRAPER_TYPING_DELAY_MS: int = 0
+    # résultats multiples: nombre max de pages détail ouvertes (lignes les mieux classées)
+    SCRAPER_MAX_DETAILS: int = 3
+
+    # totaux /api/orange-ppd/compare-summary gardés en mémoire (0 = désactivé)
+    COMPARE_SUMMARY_CACHE_SIZE: int = 256
+    # utilisateurs authentifiés gardés en mémoire par get_current_user (0 = désactivé)
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL_S: int = 60
+
+    # bcrypt: pool dédié (threads) + attente max avant refus 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE: int = 16
+    # tentatives de login par fenêtre glissante (0 = pas de limite)
+    LOGIN_RATE_WINDOW_S: int = 300
+    LOGIN_MAX_ATTEMPTS_PER_IP: int = 30
+    LOGIN_MAX_ATTEMPTS_PER_ACCOUNT: int = 10
+    # proxies dont on croit X-Forwarded-For pour l'IP client du login
+    # (ex: "172.18.0.1,10.0.0.5"; "*" = tous; vide = IP de la connexion)
+    LOGIN_TRUSTED_PROXIES: str = ""
+
+    # règles de facturation en mémoire: contrôle de version (autres workers) au plus toutes les N s
+    REGLE_INDEX_CHECK_S: float = 5.0
+
     @property
     def DATABASE_URL(self) -> str:
         return (
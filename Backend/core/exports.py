@@ -0,0 +1,79 @@
+# Backend/core/exports.py
+from __future__ import annotations
+
+import os
+import tempfile
+from collections.abc import Iterator
+
+from fastapi.responses import StreamingResponse
+from openpyxl import Workbook
+from starlette.background import BackgroundTask
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# Lignes remontées par aller-retour du curseur serveur
+EXPORT_FETCH_SIZE = 2000
+_CHUNK_SIZE = 256 * 1024
+
+
+def new_write_only_workbook() -> Workbook:
+    # write_only: les lignes partent sur disque au fil de l'eau, mémoire constante
+    return Workbook(write_only=True)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _iter_file(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def new_export_path(suffix: str) -> str:
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def temp_file_response(
+    path: str,
+    filename: str,
+    media_type: str,
+    headers: dict[str, str] | None = None,
+) -> StreamingResponse:
+    """Renvoie un fichier temporaire par blocs, puis le supprime une fois la réponse envoyée."""
+    out_headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    out_headers["Content-Length"] = str(os.path.getsize(path))
+    out_headers.update(headers or {})
+
+    return StreamingResponse(
+        _iter_file(path),
+        media_type=media_type,
+        headers=out_headers,
+        background=BackgroundTask(_remove, path),
+    )
+
+
+def discard_export_path(path: str) -> None:
+    _remove(path)
+
+
+def xlsx_file_response(wb: Workbook, filename: str, headers: dict[str, str] | None = None) -> StreamingResponse:
+    """Sérialise le classeur dans un fichier temporaire puis le renvoie par blocs."""
+    path = new_export_path(".xlsx")
+    try:
+        wb.save(path)
+    except Exception:
+        _remove(path)
+        raise
+    return temp_file_response(path, filename, XLSX_MEDIA_TYPE, headers)
@@ -0,0 +1,267 @@
+# Backend/core/import_jobs.py
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, BinaryIO
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from core.config import get_settings
+from database.connection import SessionLocal
+
+_settings = get_settings()
+IMPORT_JOB_WORKERS = max(1, _settings.IMPORT_JOB_WORKERS)
+IMPORT_JOB_RETENTION_S = _settings.IMPORT_JOB_RETENTION_S
+IMPORT_SPOOL_DIR = _settings.IMPORT_SPOOL_DIR or tempfile.gettempdir()
+
+# cadence des points de contrôle (annulation + position dans le fichier)
+_CHECK_EVERY = 500
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+class ImportProgress:
+    """
+    Compteurs d'un import CSV. Utilisé tel quel en mode synchrone (no-op),
+    et via ImportJob en mode background pour le suivi / l'annulation.
+    """
+
+    def __init__(self) -> None:
+        self.rows_parsed = 0
+        self.rows_upserted = 0
+        self.bytes_total = 0
+        self.bytes_read = 0
+        self.started_monotonic: float | None = None
+        self._fh: BinaryIO | None = None
+        self._cancel = threading.Event()
+
+    def attach(self, fh: BinaryIO, size: int) -> None:
+        self._fh = fh
+        self.bytes_total = size
+
+    def tick(self, n: int = 1) -> None:
+        self.rows_parsed += n
+        if self.rows_parsed % _CHECK_EVERY == 0:
+            self.checkpoint()
+
+    def upserted(self, n: int) -> None:
+        self.rows_upserted += n
+
+    def checkpoint(self) -> None:
+        if self._fh is not None:
+            try:
+                self.bytes_read = self._fh.tell()
+            except Exception:
+                pass
+        if self._cancel.is_set():
+            raise ImportCancelled()
+
+
+class ImportJob(ImportProgress):
+    def __init__(self, kind: str, user_id: int, filename: str | None, path: str) -> None:
+        super().__init__()
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.user_id = user_id
+        self.filename = filename
+        self.path = path
+        self.status = "queued"
+        self.created_at = datetime.utcnow()
+        self.started_at: datetime | None = None
+        self.finished_at: datetime | None = None
+        self.result: dict[str, Any] | None = None
+        self.error: Any = None
+        self.future: Future | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("done", "error", "cancelled")
+
+    def cancel(self) -> bool:
+        with self._lock:
+            if self.is_finished:
+                return False
+            self._cancel.set()
+            if self.status == "queued" and self.future is not None and self.future.cancel():
+                self._finish_locked("cancelled")
+                _remove_spool(self.path)
+            return True
+
+    def _start(self) -> bool:
+        with self._lock:
+            if self._cancel.is_set():
+                self._finish_locked("cancelled")
+                return False
+            self.status = "running"
+            self.started_at = datetime.utcnow()
+            self.started_monotonic = time.monotonic()
+            return True
+
+    def _finish(self, status: str, result: dict[str, Any] | None = None, error: Any = None) -> None:
+        with self._lock:
+            self._finish_locked(status, result, error)
+
+    def _finish_locked(self, status: str, result: dict[str, Any] | None = None, error: Any = None) -> None:
+        if self.is_finished:
+            return
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = datetime.utcnow()
+        if status == "done":
+            self.bytes_read = self.bytes_total
+
+    def snapshot(self) -> dict[str, Any]:
+        elapsed = 0.0
+        if self.started_at is not None and self.finished_at is not None:
+            elapsed = (self.finished_at - self.started_at).total_seconds()
+        elif self.started_monotonic is not None:
+            elapsed = time.monotonic() - self.started_monotonic
+
+        rows_per_s = (self.rows_parsed / elapsed) if elapsed > 0 else None
+
+        progress = None
+        eta_s = None
+        if self.bytes_total > 0:
+            progress = min(1.0, self.bytes_read / self.bytes_total)
+            if self.status == "running" and self.bytes_read > 0 and elapsed > 0:
+                bytes_per_s = self.bytes_read / elapsed
+                eta_s = round((self.bytes_total - self.bytes_read) / bytes_per_s, 1)
+
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "filename": self.filename,
+            "status": self.status,
+            "rows_parsed": self.rows_parsed,
+            "rows_upserted": self.rows_upserted,
+            "rows_per_s": round(rows_per_s, 1) if rows_per_s is not None else None,
+            "progress": round(progress, 4) if progress is not None else None,
+            "eta_s": eta_s,
+            "elapsed_s": round(elapsed, 1),
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+# Registre en mémoire du process (uvicorn --workers 1 dans docker-compose).
+_JOBS: dict[str, ImportJob] = {}
+_JOBS_LOCK = threading.Lock()
+_EXECUTOR: ThreadPoolExecutor | None = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _JOBS_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=IMPORT_JOB_WORKERS, thread_name_prefix="import-job")
+        return _EXECUTOR
+
+
+def _remove_spool(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def spool_upload(src: BinaryIO, filename: str | None = None) -> str:
+    """Copie l'upload sur disque (par blocs) pour que le job survive à la requête."""
+    suffix = os.path.splitext(filename or "")[1] or ".csv"
+    fd, path = tempfile.mkstemp(prefix="import_", suffix=suffix, dir=IMPORT_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            try:
+                src.seek(0)
+            except Exception:
+                pass
+            shutil.copyfileobj(src, out, 1024 * 1024)
+    except Exception:
+        _remove_spool(path)
+        raise
+    return path
+
+
+def _prune_locked() -> None:
+    now = datetime.utcnow()
+    stale = [
+        jid for jid, j in _JOBS.items()
+        if j.finished_at and (now - j.finished_at).total_seconds() > IMPORT_JOB_RETENTION_S
+    ]
+    for jid in stale:
+        _JOBS.pop(jid, None)
+
+
+ImportRunner = Callable[[Session, BinaryIO, ImportProgress], dict[str, Any]]
+
+
+def _execute(job: ImportJob, runner: ImportRunner) -> None:
+    if not job._start():
+        _remove_spool(job.path)
+        return
+
+    db = SessionLocal()
+    try:
+        with open(job.path, "rb") as fh:
+            job.attach(fh, os.path.getsize(job.path))
+            result = runner(db, fh, job)
+        job._finish("done", result=result)
+    except ImportCancelled:
+        db.rollback()
+        job._finish("cancelled")
+    except HTTPException as e:
+        db.rollback()
+        job._finish("error", error=e.detail)
+    except Exception as e:
+        db.rollback()
+        job._finish("error", error={"error_type": e.__class__.__name__, "error": str(e)})
+    finally:
+        db.close()
+        _remove_spool(job.path)
+
+
+def submit_import_job(
+    kind: str,
+    user_id: int,
+    filename: str | None,
+    path: str,
+    runner: ImportRunner,
+) -> ImportJob:
+    """Enregistre un job sur un fichier déjà spoolé sur disque et le confie au pool."""
+    job = ImportJob(kind=kind, user_id=user_id, filename=filename, path=path)
+    with _JOBS_LOCK:
+        _prune_locked()
+        _JOBS[job.id] = job
+    job.future = _executor().submit(_execute, job, runner)
+    return job
+
+
+def get_import_job(job_id: str, user_id: int) -> ImportJob | None:
+    with _JOBS_LOCK:
+        job = _JOBS.get(job_id)
+    if job is None or job.user_id != user_id:
+        return None
+    return job
+
+
+def list_import_jobs(user_id: int) -> list[ImportJob]:
+    with _JOBS_LOCK:
+        _prune_locked()
+        jobs = [j for j in _JOBS.values() if j.user_id == user_id]
+    jobs.sort(key=lambda j: j.created_at, reverse=True)
+    return jobs
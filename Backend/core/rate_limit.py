@@ -0,0 +1,87 @@
+# Backend/core/rate_limit.py
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+
+
+class LoginRateLimiter:
+    """
+    Fenêtre glissante en mémoire sur les tentatives de login, par IP et par
+    compte. Vérifiée avant tout hachage bcrypt: une rafale (credential
+    stuffing) est refusée sans consommer de CPU. Une tentative réussie est
+    rendue à l'IP (succeeded): seuls les échecs comptent, et les logins du
+    matin derrière un même NAT ne s'épuisent pas.
+    """
+
+    def __init__(self, window_s: float, max_per_ip: int, max_per_account: int) -> None:
+        self.window_s = window_s
+        self.max_per_ip = max_per_ip
+        self.max_per_account = max_per_account
+        self._ip: dict[str, deque[float]] = {}
+        self._account: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.rejected = 0
+
+    def attempt(self, ip: str, account: str) -> float | None:
+        """Enregistre la tentative; retourne le délai d'attente (s) si refusée."""
+        now = time.monotonic()
+        account = account.strip().lower()
+        with self._lock:
+            self._sweep_locked(now)
+            waits = [
+                w
+                for w in (
+                    self._wait_locked(self._ip, ip, self.max_per_ip, now),
+                    self._wait_locked(self._account, account, self.max_per_account, now),
+                )
+                if w is not None
+            ]
+            if waits:
+                self.rejected += 1
+                return max(waits)
+            self._ip.setdefault(ip, deque()).append(now)
+            self._account.setdefault(account, deque()).append(now)
+            return None
+
+    def succeeded(self, ip: str, account: str) -> None:
+        """Login réussi: tentative rendue à l'IP, échecs précédents du compte oubliés."""
+        with self._lock:
+            self._refund_locked(self._ip, ip)
+            self._account.pop(account.strip().lower(), None)
+
+    def refund(self, ip: str, account: str) -> None:
+        """Tentative non évaluée (ex: pool bcrypt saturé): ne compte ni pour l'IP ni pour le compte."""
+        with self._lock:
+            self._refund_locked(self._ip, ip)
+            self._refund_locked(self._account, account.strip().lower())
+
+    def _refund_locked(self, hits: dict[str, deque[float]], key: str) -> None:
+        q = hits.get(key)
+        if q:
+            q.pop()
+            if not q:
+                del hits[key]
+
+    def _wait_locked(self, hits: dict[str, deque[float]], key: str, limit: int, now: float) -> float | None:
+        if limit <= 0:
+            return None
+        q = hits.get(key)
+        if q is None:
+            return None
+        while q and q[0] <= now - self.window_s:
+            q.popleft()
+        if len(q) < limit:
+            return None
+        return max(0.0, q[0] + self.window_s - now)
+
+    def _sweep_locked(self, now: float) -> None:
+        # purge des clés inactives (mémoire bornée même sous attaque distribuée)
+        if now - self._last_sweep < self.window_s:
+            return
+        self._last_sweep = now
+        for hits in (self._ip, self._account):
+            for key in [k for k, q in hits.items() if not q or q[-1] <= now - self.window_s]:
+                del hits[key]
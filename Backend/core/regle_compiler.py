@@ -0,0 +1,250 @@
+# Backend/core/regle_compiler.py
+from __future__ import annotations
+
+import re
+import threading
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from core.regle_index import IndexedRule
+
+# condition_json -> prédicat Python sur un dossier (dict des colonnes de
+# canonique.v_dossier_facturable). Grammaire:
+#   {"all": [cond, ...]} / {"any": [cond, ...]} / {"not": cond}
+#   {"field": "code_cloture_code", "op": "in", "value": ["DMS", "MAJ"]}
+#   {"field": "mode_passage", "op": "contains", "value": "souterrain"}
+#   {} ou null -> toujours vrai
+# Comparaisons de texte (eq/ne/in/not_in) en upper/trim comme la vue;
+# contains/startswith/regex insensibles à la casse.
+Dossier = Mapping[str, Any]
+Predicate = Callable[[Dossier], bool]
+
+
+class RuleCompileError(ValueError):
+    pass
+
+
+def _norm(v: Any) -> Any:
+    return v.strip().upper() if isinstance(v, str) else v
+
+
+def _as_list(value: Any, op: str) -> list[Any]:
+    if not isinstance(value, list):
+        raise RuleCompileError(f"'{op}' attend une liste")
+    return value
+
+
+def _leaf(cond: Mapping[str, Any]) -> Predicate:
+    field_name = cond.get("field")
+    if not isinstance(field_name, str) or not field_name:
+        raise RuleCompileError("condition sans 'field'")
+    op = str(cond.get("op") or "eq").lower()
+    value = cond.get("value")
+
+    def get(d: Dossier) -> Any:
+        return d.get(field_name)
+
+    if op in ("eq", "ne"):
+        target = _norm(value)
+        if op == "eq":
+            return lambda d: _norm(get(d)) == target
+        return lambda d: _norm(get(d)) != target
+
+    if op in ("in", "not_in"):
+        targets = frozenset(_norm(v) for v in _as_list(value, op))
+        if op == "in":
+            return lambda d: _norm(get(d)) in targets
+        return lambda d: _norm(get(d)) not in targets
+
+    if op in ("contains", "startswith"):
+        if not isinstance(value, str):
+            raise RuleCompileError(f"'{op}' attend une chaîne")
+        needle = value.casefold()
+        if op == "contains":
+            return lambda d: needle in str(get(d) or "").casefold()
+        return lambda d: str(get(d) or "").casefold().startswith(needle)
+
+    if op == "regex":
+        try:
+            rx = re.compile(str(value), re.IGNORECASE)
+        except re.error as e:
+            raise RuleCompileError(f"regex invalide: {e}") from e
+        return lambda d: rx.search(str(get(d) or "")) is not None
+
+    if op == "is_null":
+        return lambda d: get(d) in (None, "")
+    if op == "not_null":
+        return lambda d: get(d) not in (None, "")
+
+    if op in ("gt", "gte", "lt", "lte"):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise RuleCompileError(f"'{op}' attend un nombre")
+        cmp = {
+            "gt": lambda a: a > value,
+            "gte": lambda a: a >= value,
+            "lt": lambda a: a < value,
+            "lte": lambda a: a <= value,
+        }[op]
+
+        def numeric(d: Dossier) -> bool:
+            try:
+                return cmp(float(str(get(d)).replace(",", ".")))
+            except (TypeError, ValueError):
+                return False
+
+        return numeric
+
+    raise RuleCompileError(f"opérateur inconnu: {op}")
+
+
+def compile_condition(cond: Any) -> Predicate:
+    if cond is None or cond == {}:
+        return lambda d: True
+    if not isinstance(cond, Mapping):
+        raise RuleCompileError("condition: objet JSON attendu")
+
+    if "all" in cond:
+        parts = tuple(compile_condition(c) for c in _as_list(cond["all"], "all"))
+        return lambda d: all(p(d) for p in parts)
+    if "any" in cond:
+        parts = tuple(compile_condition(c) for c in _as_list(cond["any"], "any"))
+        return lambda d: any(p(d) for p in parts)
+    if "not" in cond:
+        inner = compile_condition(cond["not"])
+        return lambda d: not inner(d)
+    return _leaf(cond)
+
+
+def condition_fields(cond: Any) -> set[str]:
+    """Colonnes du dossier lues par la condition (pour ne charger que celles-là)."""
+    if not isinstance(cond, Mapping):
+        return set()
+    out: set[str] = set()
+    for key in ("all", "any"):
+        if isinstance(cond.get(key), list):
+            for c in cond[key]:
+                out |= condition_fields(c)
+    if "not" in cond:
+        out |= condition_fields(cond["not"])
+    if isinstance(cond.get("field"), str):
+        out.add(cond["field"])
+    return out
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    rule: IndexedRule
+    predicate: Predicate | None
+    error: str | None
+    codes_cloture: frozenset[str] | None
+
+
+# mémoïsation par (id, updated_at): une règle modifiée change de clé
+_CacheKey = tuple[int, "datetime | None"]
+_compiled: dict[_CacheKey, CompiledRule] = {}
+_compiled_lock = threading.Lock()
+
+
+def _compile(rule: IndexedRule) -> CompiledRule:
+    try:
+        predicate, error = compile_condition(rule.condition_json), None
+    except RuleCompileError as e:
+        predicate, error = None, str(e)
+    codes = rule.codes_cloture_facturables
+    return CompiledRule(
+        rule=rule,
+        predicate=predicate,
+        error=error,
+        codes_cloture=frozenset(codes) if codes is not None else None,
+    )
+
+
+def compile_rule(rule: IndexedRule, cache: bool = True) -> CompiledRule:
+    if not cache:
+        return _compile(rule)
+    key = (rule.id, rule.updated_at)
+    with _compiled_lock:
+        hit = _compiled.get(key)
+    if hit is not None and hit.rule == rule:
+        return hit
+    compiled = _compile(rule)
+    with _compiled_lock:
+        _compiled[key] = compiled
+    return compiled
+
+
+def prune_compiled(live: Iterable[IndexedRule]) -> None:
+    """Oublie les versions de règles absentes de l'instantané courant."""
+    keep = {(r.id, r.updated_at) for r in live}
+    with _compiled_lock:
+        for key in [k for k in _compiled if k not in keep]:
+            del _compiled[key]
+
+
+def _act_prod(act: Any, prod: Any) -> tuple[str, str] | None:
+    if act is None or prod is None:
+        return None
+    return (str(act).strip().upper(), str(prod).strip().upper())
+
+
+class RuleSet:
+    """
+    Règles compilées groupées par activité|produit, triées comme le LATERAL de
+    v_dossier_facturable (updated_at DESC NULLS LAST, id DESC).
+    """
+
+    def __init__(self, compiled: Iterable[CompiledRule]) -> None:
+        groups: dict[tuple[str, str], list[CompiledRule]] = {}
+        self.invalid: list[CompiledRule] = []
+        for c in compiled:
+            if c.error is not None:
+                self.invalid.append(c)
+                continue
+            key = _act_prod(c.rule.code_activite, c.rule.code_produit)
+            if key is not None:
+                groups.setdefault(key, []).append(c)
+        for rules in groups.values():
+            rules.sort(key=lambda c: c.rule.id, reverse=True)
+            rules.sort(key=lambda c: (c.rule.updated_at is None, _neg_ts(c.rule.updated_at)))
+        self.groups = {k: tuple(v) for k, v in groups.items()}
+
+    def match(self, d: Dossier) -> CompiledRule | None:
+        key = _act_prod(d.get("activite_code"), d.get("produit_code"))
+        candidates = self.groups.get(key, ()) if key else ()
+        cloture = d.get("code_cloture_code")
+        fallback = None
+        for c in candidates:
+            if not c.predicate(d):
+                continue
+            # priorité à une règle dont la liste de clôtures contient celle du dossier
+            if cloture is not None and c.codes_cloture is not None and cloture in c.codes_cloture:
+                return c
+            if fallback is None:
+                fallback = c
+        return fallback
+
+
+def _neg_ts(ts: datetime | None) -> float:
+    return -ts.timestamp() if ts is not None else 0.0
+
+
+def statut_final(d: Dossier, c: CompiledRule | None) -> str:
+    """Même cascade que statut_final dans v_dossier_facturable."""
+    if d.get("activite_code") == "PRV":
+        return "NON_FACTURABLE"
+    if d.get("statut_croisement") != "OK":
+        return "A_VERIFIER"
+    if d.get("activite_code") is None or d.get("produit_code") is None:
+        return "A_VERIFIER"
+    if c is None:
+        return "A_VERIFIER"
+    if c.rule.statut_facturation == "NON_FACTURABLE":
+        return "NON_FACTURABLE"
+    cloture = d.get("code_cloture_code")
+    if c.codes_cloture is not None and (cloture is None or cloture not in c.codes_cloture):
+        return "A_VERIFIER"
+    if c.rule.statut_facturation == "CONDITIONNEL":
+        return "CONDITIONNEL"
+    return "FACTURABLE"
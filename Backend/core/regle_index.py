@@ -0,0 +1,209 @@
+# Backend/core/regle_index.py
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from core.config import get_settings
+from models.regle_facturation import RegleFacturation
+
+# (code_activite, code_produit, plp_applicable): même normalisation que le
+# LATERAL sur referentiels.regle_facturation dans v_dossier_facturable
+RuleKey = tuple[str, str, "bool | None"]
+
+
+def rule_key(code_activite: str | None, code_produit: str | None, plp_applicable: bool | None) -> RuleKey:
+    return ((code_activite or "").strip().upper(), (code_produit or "").strip().upper(), plp_applicable)
+
+
+@dataclass(frozen=True)
+class IndexedRule:
+    """Copie figée d'une ligne referentiels.regle_facturation (sérialisable via RegleFacturationOut)."""
+
+    id: int
+    code: str
+    libelle: str | None
+    condition_sql: str | None
+    condition_json: Any
+    statut_facturation: str | None
+    code_activite: str | None
+    code_produit: str | None
+    plp_applicable: bool | None
+    categorie: str | None
+    codes_cloture_facturables: tuple[str, ...] | None
+    is_active: bool
+    deleted_at: datetime | None
+    created_at: datetime | None
+    updated_at: datetime | None
+    # code / libelle / condition_sql en minuscules (recherche "contient")
+    search_text: str = field(repr=False)
+
+    @classmethod
+    def from_row(cls, r: RegleFacturation) -> IndexedRule:
+        return cls(
+            id=r.id,
+            code=r.code,
+            libelle=r.libelle,
+            condition_sql=r.condition_sql,
+            condition_json=r.condition_json,
+            statut_facturation=r.statut_facturation,
+            code_activite=r.code_activite,
+            code_produit=r.code_produit,
+            plp_applicable=r.plp_applicable,
+            categorie=r.categorie,
+            codes_cloture_facturables=(
+                tuple(r.codes_cloture_facturables) if r.codes_cloture_facturables is not None else None
+            ),
+            is_active=bool(r.is_active),
+            deleted_at=r.deleted_at,
+            created_at=r.created_at,
+            updated_at=r.updated_at,
+            search_text="\n".join(s for s in (r.code, r.libelle, r.condition_sql) if s).casefold(),
+        )
+
+
+def _freeze(groups: dict[Any, list[IndexedRule]]) -> Mapping[Any, tuple[IndexedRule, ...]]:
+    return MappingProxyType({k: tuple(v) for k, v in groups.items()})
+
+
+class RegleSnapshot:
+    """Instantané immuable des règles (toutes, actives ou non), triées par id."""
+
+    def __init__(self, version: int, rules: list[IndexedRule]) -> None:
+        self.version = version
+        self.loaded_at = datetime.utcnow()
+        self.rules: tuple[IndexedRule, ...] = tuple(sorted(rules, key=lambda r: r.id))
+        self.active: tuple[IndexedRule, ...] = tuple(r for r in self.rules if r.is_active)
+        self.by_id: Mapping[int, IndexedRule] = MappingProxyType({r.id: r for r in self.rules})
+
+        by_code: dict[str, list[IndexedRule]] = {}
+        by_key: dict[RuleKey, list[IndexedRule]] = {}
+        by_act_prod: dict[tuple[str, str], list[IndexedRule]] = {}
+        by_statut: dict[str | None, list[IndexedRule]] = {}
+        for r in self.active:
+            by_code.setdefault(r.code, []).append(r)
+            key = rule_key(r.code_activite, r.code_produit, r.plp_applicable)
+            by_key.setdefault(key, []).append(r)
+            by_act_prod.setdefault(key[:2], []).append(r)
+            by_statut.setdefault(r.statut_facturation, []).append(r)
+        # index sur les règles actives uniquement
+        self.by_code = _freeze(by_code)
+        self.by_key = _freeze(by_key)
+        self.by_act_prod = _freeze(by_act_prod)
+        self.by_statut = _freeze(by_statut)
+
+    def search(
+        self,
+        q: str | None = None,
+        action: str | None = None,
+        include_inactive: bool = False,
+    ) -> tuple[IndexedRule, ...]:
+        if action is not None and not include_inactive:
+            rules = self.by_statut.get(action, ())
+        else:
+            rules = self.rules if include_inactive else self.active
+            if action is not None:
+                rules = tuple(r for r in rules if r.statut_facturation == action)
+        if q:
+            needle = q.casefold()
+            rules = tuple(r for r in rules if needle in r.search_text)
+        return rules
+
+    def lookup(
+        self,
+        code_activite: str | None,
+        code_produit: str | None,
+        plp_applicable: bool | None = None,
+    ) -> tuple[IndexedRule, ...]:
+        # plp_applicable=None: toutes les règles du couple, quel que soit leur plp
+        key = rule_key(code_activite, code_produit, plp_applicable)
+        if plp_applicable is None:
+            return self.by_act_prod.get(key[:2], ())
+        return self.by_key.get(key, ())
+
+
+_BUMP_VERSION_SQL = """
+    INSERT INTO referentiels.regle_facturation_version (id, version, updated_at)
+    VALUES (1, 1, now())
+    ON CONFLICT (id) DO UPDATE
+    SET version = referentiels.regle_facturation_version.version + 1,
+        updated_at = now()
+    RETURNING version
+"""
+
+_READ_VERSION_SQL = "SELECT version FROM referentiels.regle_facturation_version WHERE id = 1"
+
+
+class RegleIndex:
+    """
+    Index des règles partagé par le process.
+
+    - les écritures (routes/regles) incrémentent la version dans leur
+      transaction puis remplacent l'instantané après commit (publish)
+    - les autres workers relisent la version au plus toutes les check_s
+      secondes et rechargent s'il a changé; entre deux contrôles, lecture,
+      recherche et lookup ne touchent pas la base
+    """
+
+    def __init__(self, check_s: float) -> None:
+        self.check_s = check_s
+        self._snapshot: RegleSnapshot | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def current(self, db: Session) -> RegleSnapshot:
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - self._checked_at < self.check_s:
+            return snap
+        with self._lock:
+            snap = self._snapshot
+            if snap is not None and time.monotonic() - self._checked_at < self.check_s:
+                return snap
+            version = self._read_version(db)
+            if snap is None or snap.version != version:
+                snap = self._load(db, version)
+            self._checked_at = time.monotonic()
+            return snap
+
+    def bump_version(self, db: Session) -> int:
+        """À appeler dans la transaction de l'écriture (avant commit)."""
+        return int(db.execute(text(_BUMP_VERSION_SQL)).scalar_one())
+
+    def publish(self, db: Session) -> RegleSnapshot:
+        """Après commit: recharge et remplace l'instantané (swap atomique de la référence)."""
+        with self._lock:
+            snap = self._load(db, self._read_version(db))
+            self._checked_at = time.monotonic()
+            return snap
+
+    def stats(self) -> dict[str, Any]:
+        snap = self._snapshot
+        return {
+            "version": snap.version if snap else None,
+            "loaded_at": snap.loaded_at if snap else None,
+            "rules": len(snap.rules) if snap else 0,
+            "active": len(snap.active) if snap else 0,
+            "reloads": self.reloads,
+            "check_s": self.check_s,
+        }
+
+    def _read_version(self, db: Session) -> int:
+        return int(db.execute(text(_READ_VERSION_SQL)).scalar() or 0)
+
+    def _load(self, db: Session, version: int) -> RegleSnapshot:
+        rows = db.query(RegleFacturation).all()
+        snap = RegleSnapshot(version, [IndexedRule.from_row(r) for r in rows])
+        self._snapshot = snap
+        self.reloads += 1
+        return snap
+
+
+regle_index = RegleIndex(get_settings().REGLE_INDEX_CHECK_S)
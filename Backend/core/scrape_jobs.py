@@ -0,0 +1,67 @@
+# Backend/core/scrape_jobs.py
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config import get_settings
+
+log = logging.getLogger(__name__)
+
+# un job utilise déjà plusieurs navigateurs (SCRAPER_SESSIONS): 1 job à la fois par défaut
+SCRAPE_JOB_WORKERS = max(1, get_settings().SCRAPE_JOB_WORKERS)
+
+# runner(job_id, cancel): traite les items pending du job (état en base)
+ScrapeRunner = Callable[[str, threading.Event], None]
+
+# Jobs confiés au pool de CE process (uvicorn --workers 1); l'état durable est
+# dans pilotage.scrape_job / scrape_job_item.
+_ACTIVE: dict[str, threading.Event] = {}
+_LOCK = threading.Lock()
+_EXECUTOR: ThreadPoolExecutor | None = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=SCRAPE_JOB_WORKERS, thread_name_prefix="scrape-job")
+        return _EXECUTOR
+
+
+def _run(job_id: str, cancel: threading.Event, runner: ScrapeRunner) -> None:
+    try:
+        runner(job_id, cancel)
+    except Exception:
+        log.exception("scrape job %s interrompu", job_id)
+    finally:
+        with _LOCK:
+            _ACTIVE.pop(job_id, None)
+
+
+def submit_scrape_job(job_id: str, runner: ScrapeRunner) -> bool:
+    """False si le job est déjà en file / en cours dans ce process."""
+    with _LOCK:
+        if job_id in _ACTIVE:
+            return False
+        cancel = threading.Event()
+        _ACTIVE[job_id] = cancel
+    _executor().submit(_run, job_id, cancel, runner)
+    return True
+
+
+def is_active(job_id: str) -> bool:
+    with _LOCK:
+        return job_id in _ACTIVE
+
+
+def request_cancel(job_id: str) -> bool:
+    """Demande l'arrêt (pris en compte entre deux événements du scraper)."""
+    with _LOCK:
+        cancel = _ACTIVE.get(job_id)
+    if cancel is None:
+        return False
+    cancel.set()
+    return True
@@ -0,0 +1,93 @@
+# Backend/core/scrape_pool.py
+from __future__ import annotations
+
+import queue
+import threading
+from collections.abc import Callable, Iterator
+from typing import Any
+
+# Chaque session prend l'item suivant dès qu'elle est libre (répartition
+# dynamique): une session lente ne bloque pas les relevés des autres.
+NextItem = Callable[[], "tuple[int, dict[str, Any]] | None"]
+Emit = Callable[[dict[str, Any]], None]
+SessionWorker = Callable[[int, NextItem, Emit, threading.Event], None]
+
+# délai de scrutation du flux de sortie (vérifie aussi la fin des workers)
+_POLL_S = 0.5
+
+
+def run_sessions(
+    items: list[dict[str, Any]],
+    sessions: int,
+    worker: SessionWorker,
+) -> Iterator[dict[str, Any]]:
+    """
+    Lance `sessions` workers (un thread = une session navigateur) sur la même
+    file d'items et renvoie leurs événements dans l'ordre où ils arrivent.
+
+    worker(session_id, next_item, emit, stop):
+      - next_item() -> (index, item) ou None quand la file est vide / arrêt demandé
+      - emit(event) publie un événement dans le flux
+      - stop est positionné si le consommateur abandonne (client déconnecté)
+
+    Les items jamais pris (toutes les sessions tombées) sont signalés en erreur.
+    """
+    pending: queue.SimpleQueue[tuple[int, dict[str, Any]]] = queue.SimpleQueue()
+    for i, item in enumerate(items):
+        pending.put((i, item))
+
+    out: queue.SimpleQueue[dict[str, Any]] = queue.SimpleQueue()
+    stop = threading.Event()
+
+    def next_item() -> tuple[int, dict[str, Any]] | None:
+        if stop.is_set():
+            return None
+        try:
+            return pending.get_nowait()
+        except queue.Empty:
+            return None
+
+    def run(sid: int) -> None:
+        try:
+            worker(sid, next_item, out.put, stop)
+        except Exception as e:
+            out.put({"status": "fatal", "session": sid, "message": f"Session {sid} arrêtée: {e}"})
+
+    threads = [
+        threading.Thread(target=run, args=(sid,), name=f"scrape-session-{sid}", daemon=True)
+        for sid in range(1, max(1, sessions) + 1)
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        while True:
+            try:
+                yield out.get(timeout=_POLL_S)
+                continue
+            except queue.Empty:
+                pass
+            if not any(t.is_alive() for t in threads):
+                break
+
+        # vidage final (événements publiés juste avant la fin des threads)
+        while True:
+            try:
+                yield out.get_nowait()
+            except queue.Empty:
+                break
+
+        while True:
+            try:
+                i, item = pending.get_nowait()
+            except queue.Empty:
+                break
+            yield {
+                "status": "error",
+                "releve": item.get("releve"),
+                "index": i,
+                "message": "Non traité: aucune session Praxedo disponible.",
+            }
+    finally:
+        # client parti ou fin normale: les workers s'arrêtent à l'item suivant
+        stop.set()
@@ -0,0 +1,38 @@
+# Backend/core/search.py
+from __future__ import annotations
+
+import re
+from collections.abc import Sequence
+
+from sqlalchemy import or_
+
+# OT (ex: 21717540) / ND (ex: 0142054557): suite de chiffres -> recherche par préfixe
+_EXACT_LOOKING_RE = re.compile(r"^[0-9]{6,}$")
+
+_ESCAPE = "!"
+
+
+def like_escape(s: str) -> str:
+    return s.replace(_ESCAPE, _ESCAPE * 2).replace("%", _ESCAPE + "%").replace("_", _ESCAPE + "_")
+
+
+def looks_exact(needle: str) -> bool:
+    return bool(_EXACT_LOOKING_RE.match(needle))
+
+
+def resolve_mode(needle: str, mode: str = "auto") -> str:
+    if mode == "auto":
+        return "prefix" if looks_exact(needle) else "contains"
+    return mode
+
+
+def text_search(cols: Sequence, needle: str, mode: str = "auto"):
+    """
+    - contains: ILIKE '%x%' (index GIN trigram)
+    - prefix:   LIKE 'x%'   (index btree text_pattern_ops)
+    Les jokers saisis par l'utilisateur sont échappés.
+    """
+    esc = like_escape(needle)
+    if resolve_mode(needle, mode) == "prefix":
+        return or_(*[c.like(f"{esc}%", escape=_ESCAPE) for c in cols])
+    return or_(*[c.ilike(f"%{esc}%", escape=_ESCAPE) for c in cols])
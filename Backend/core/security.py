@@ -1,34 +1,83 @@
 # Backend/core/security.py
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Optional
 import jwt
 import bcrypt # <-- Bdelna passlib b bcrypt
 
+from core.config import get_settings
+
 # Configuration JWT
 SECRET_KEY = "kyntus_super_secret_key_orange_facturation_2026_auth"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 yyam
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+
+class PasswordPoolBusy(RuntimeError):
+    """File du pool bcrypt pleine: la requête est refusée plutôt que mise en attente."""
+
+
+# bcrypt (coûteux en CPU) tourne dans un pool dédié et borné: une rafale de
+# logins n'occupe ni la boucle asyncio ni le threadpool des autres endpoints.
+_settings = get_settings()
+_HASH_WORKERS = max(1, _settings.PASSWORD_HASH_WORKERS)
+_hash_pool = ThreadPoolExecutor(max_workers=_HASH_WORKERS, thread_name_prefix="bcrypt")
+# en cours + en attente
+_hash_slots = threading.BoundedSemaphore(_HASH_WORKERS + max(0, _settings.PASSWORD_HASH_QUEUE))
+
+
+def _submit(fn: Callable[..., Any], *args: Any) -> Future:
+    if not _hash_slots.acquire(blocking=False):
+        raise PasswordPoolBusy("Trop de vérifications de mot de passe en cours")
+    try:
+        fut = _hash_pool.submit(fn, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    fut.add_done_callback(lambda _: _hash_slots.release())
+    return fut
+
+
+def _checkpw(plain_password: str, hashed_password: str) -> bool:
     # bcrypt kay7taj les passwords ykounou f format bytes (encode('utf-8'))
     password_byte_enc = plain_password.encode('utf-8')
     hashed_password_byte_enc = hashed_password.encode('utf-8')
     return bcrypt.checkpw(password_byte_enc, hashed_password_byte_enc)
 
-def get_password_hash(password: str) -> str:
+
+def _hashpw(password: str) -> str:
     # bcrypt kay-generer l'salt w kay-hachi l'password f format bytes, hna kan-rej3ouh string
     pwd_bytes = password.encode('utf-8')
     salt = bcrypt.gensalt()
     hashed_password = bcrypt.hashpw(pwd_bytes, salt)
     return hashed_password.decode('utf-8')
 
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return _submit(_checkpw, plain_password, hashed_password).result()
+
+
+def get_password_hash(password: str) -> str:
+    return _submit(_hashpw, password).result()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.wrap_future(_submit(_checkpw, plain_password, hashed_password))
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await asyncio.wrap_future(_submit(_hashpw, password))
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    
+
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
@@ -0,0 +1,86 @@
+# Backend/core/summary_cache.py
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from core.config import get_settings
+
+# (import_id | "", ppd | "", user_id)
+SummaryKey = tuple[str, str, int]
+
+
+class SummaryCache:
+    """
+    Cache LRU en mémoire des totaux de /api/orange-ppd/compare-summary.
+
+    Chaque invalidation incrémente une génération: un calcul lancé avant une
+    invalidation (import concurrent) n'est pas mis en cache par put().
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[SummaryKey, dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def get(self, key: SummaryKey) -> dict[str, Any] | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key: SummaryKey, value: dict[str, Any], generation: int) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = dict(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, import_id: str | None = None) -> int:
+        """
+        import_id=None: tout (données PIDI modifiées, communes à tous les imports).
+        Sinon: cet import + les totaux "tous imports" (import_id absent).
+        """
+        with self._lock:
+            self._generation += 1
+            if import_id is None:
+                n = len(self._entries)
+                self._entries.clear()
+                return n
+            stale = [k for k in self._entries if k[0] in (import_id, "")]
+            for k in stale:
+                del self._entries[k]
+            return len(stale)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+compare_summary_cache = SummaryCache(get_settings().COMPARE_SUMMARY_CACHE_SIZE)
+
+
+def summary_key(import_id: str | None, ppd: str | None, user_id: int) -> SummaryKey:
+    return (import_id or "", ppd or "", user_id)
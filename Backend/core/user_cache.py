@@ -0,0 +1,86 @@
+# Backend/core/user_cache.py
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from core.config import get_settings
+from models.user import User
+
+_USER_COLUMNS = tuple(c.key for c in User.__table__.columns)
+
+
+class UserCache:
+    """
+    Utilisateurs authentifiés gardés en mémoire (TTL + LRU) par user_id:
+    get_current_user ne touche pas la base sur un hit.
+
+    Les valeurs sont des copies de colonnes; chaque hit rend un User neuf
+    (transitoire) pour qu'une requête ne modifie pas celui d'une autre.
+    """
+
+    def __init__(self, max_entries: int, ttl_s: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict[int, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def get(self, user_id: int) -> User | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            values = entry[1]
+        return User(**values)
+
+    def put(self, user: User, generation: int) -> None:
+        if self.max_entries <= 0 or self.ttl_s <= 0:
+            return
+        values = {k: getattr(user, k) for k in _USER_COLUMNS}
+        with self._lock:
+            # invalidation pendant la lecture en base: valeur peut-être périmée
+            if generation != self._generation:
+                return
+            self._entries[user.id] = (time.monotonic() + self.ttl_s, values)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
+
+
+_settings = get_settings()
+user_cache = UserCache(_settings.USER_CACHE_SIZE, _settings.USER_CACHE_TTL_S)
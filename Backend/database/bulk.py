@@ -0,0 +1,133 @@
+# Backend/database/bulk.py
+from __future__ import annotations
+
+import csv
+import io
+import queue
+import threading
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from database.connection import engine
+
+COPY_BATCH_SIZE = 5000
+
+
+def _copy_buffer(db: Session, table: str, columns: Sequence[str], buf: io.StringIO) -> None:
+    buf.seek(0)
+    cols = ", ".join(columns)
+    # même connexion/transaction que la Session -> commit/rollback gérés par l'appelant
+    raw = db.connection().connection
+    cur = raw.cursor()
+    try:
+        cur.copy_expert(f"COPY {table} ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cur.close()
+
+
+def copy_rows(
+    db: Session,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    batch_size: int = COPY_BATCH_SIZE,
+) -> int:
+    """
+    Charge un flux de tuples dans `table` via COPY FROM STDIN, par paquets de `batch_size`.
+    None -> NULL (champ CSV vide non quoté). La mémoire reste bornée à un paquet.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    pending = 0
+    total = 0
+
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= batch_size:
+            _copy_buffer(db, table, columns, buf)
+            total += pending
+            pending = 0
+            buf.seek(0)
+            buf.truncate(0)
+
+    if pending:
+        _copy_buffer(db, table, columns, buf)
+        total += pending
+
+    return total
+
+
+# --------------------
+# COPY ... TO STDOUT -> flux d'octets (export)
+# --------------------
+_COPY_OUT_QUEUE_SIZE = 64
+_DONE = object()
+
+
+class _QueueWriter:
+    """Fichier en écriture minimal pour copy_expert: chaque write() part dans la file."""
+
+    def __init__(self, q: queue.Queue[Any], stop: threading.Event) -> None:
+        self._q = q
+        self._stop = stop
+
+    def write(self, data: Any) -> int:
+        if self._stop.is_set():
+            raise IOError("export interrompu par le client")
+        b = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+        self._q.put(b)
+        return len(b)
+
+
+def copy_out_chunks(sql: str, params: dict[str, Any] | None = None) -> Iterator[bytes]:
+    """
+    Exécute `COPY (sql) TO STDOUT WITH (FORMAT csv, HEADER true)` sur une connexion
+    dédiée et rend la sortie au fil de l'eau (aucun traitement Python par ligne).
+    La file bornée applique la contre-pression si le client lit lentement.
+    """
+    q: queue.Queue[Any] = queue.Queue(maxsize=_COPY_OUT_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def _run() -> None:
+        raw = engine.raw_connection()
+        try:
+            cur = raw.cursor()
+            try:
+                inner = cur.mogrify(sql, params or {}).decode("utf-8")
+                cur.copy_expert(f"COPY ({inner}) TO STDOUT WITH (FORMAT csv, HEADER true)", _QueueWriter(q, stop))
+            finally:
+                cur.close()
+            raw.rollback()
+            q.put(_DONE)
+        except BaseException as e:
+            try:
+                raw.rollback()
+            except Exception:
+                pass
+            if not stop.is_set():
+                q.put(e)
+        finally:
+            raw.close()
+
+    t = threading.Thread(target=_run, name="copy-out", daemon=True)
+    t.start()
+
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # client parti avant la fin: on vide la file pour débloquer le thread
+        stop.set()
+        while t.is_alive():
+            try:
+                q.get(timeout=0.1)
+            except queue.Empty:
+                pass
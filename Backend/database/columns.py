@@ -0,0 +1,71 @@
+# Backend/database/columns.py
+from __future__ import annotations
+
+from sqlalchemy.engine import Connection
+
+# Même normalisation que routes.praxedo_scraper._normalize_releve_key
+RELEVE_KEY_SQL = "NULLIF(upper(regexp_replace(ltrim(btrim({col}), '0'), '[^0-9A-Za-z]', '', 'g')), '')"
+
+# Même normalisation que routes.praxedo_scraper._normalize_cac
+CAC_KEY_SQL = "NULLIF(upper(regexp_replace({col}, '[^0-9A-Za-z]', '', 'g')), '')"
+
+# Même normalisation que canonique.norm_ot (OT numérique: zéros de tête retirés;
+# OT factice tout à zéro -> NULL, pour ne pas joindre des lignes sans rapport)
+OT_KEY_SQL = (
+    r"CASE WHEN regexp_replace({col}, '\s+', '', 'g') ~ '^[0-9]+$'"
+    r" THEN NULLIF(ltrim(regexp_replace({col}, '\s+', '', 'g'), '0'), '')"
+    r" ELSE NULLIF(regexp_replace({col}, '\s+', '', 'g'), '') END"
+)
+
+
+def _generated(expr: str, col: str) -> str:
+    # calculée par Postgres à l'écriture: COPY / INSERT existants inchangés
+    return f"text GENERATED ALWAYS AS ({expr.format(col=col)}) STORED"
+
+
+# create_all ne modifie pas les tables existantes: colonnes ajoutées après coup
+# (idempotent, exécuté au démarrage avant ensure_indexes).
+# (schema, table, colonne, type SQL)
+COLUMNS: list[tuple[str, str, str, str]] = [
+    # cache des relevés scrapés (routes/praxedo_scraper, repositories/scrape_cache_repo)
+    ("raw", "pidi_scrape_full", "releve_key", "text"),
+    ("raw", "pidi_scrape_full", "expected_cac", "text"),
+    ("raw", "pidi_scrape_full", "expected_ppd", "text"),
+    # clés de jointure des comparaisons Orange PPD (routes/orange_ppd, database/views)
+    ("raw", "pidi", "cac_key", _generated(CAC_KEY_SQL, "n_cac")),
+    ("raw", "pidi", "releve_key", _generated(RELEVE_KEY_SQL, "comment_acqui_rejet")),
+    ("raw", "pidi", "ot_key_norm", _generated(OT_KEY_SQL, "numero_ot")),
+    ("canonique", "orange_ppd_rows", "ot_key_norm", _generated(OT_KEY_SQL, "numero_ot")),
+    ("canonique", "orange_ppd_excel_rows", "cac_key", _generated(CAC_KEY_SQL, "commande")),
+    ("canonique", "orange_ppd_excel_rows", "releve_key", _generated(RELEVE_KEY_SQL, "releve")),
+]
+
+# remplissage des lignes antérieures à l'ajout d'une colonne: exécuté une seule
+# fois, au démarrage qui ajoute la colonne (schema, table, colonne) -> UPDATE
+BACKFILLS: dict[tuple[str, str, str], str] = {
+    ("raw", "pidi_scrape_full", "releve_key"): f"""
+    UPDATE raw.pidi_scrape_full
+    SET releve_key = {RELEVE_KEY_SQL.format(col="releve_input")},
+        expected_cac = COALESCE(expected_cac, num_cac)
+    WHERE releve_key IS NULL AND {RELEVE_KEY_SQL.format(col="releve_input")} IS NOT NULL
+    """,
+}
+
+_COLUMN_EXISTS_SQL = """
+    SELECT 1 FROM information_schema.columns
+    WHERE table_schema = %(schema)s AND table_name = %(table)s AND column_name = %(column)s
+"""
+
+
+def _column_exists(conn: Connection, schema: str, table: str, column: str) -> bool:
+    params = {"schema": schema, "table": table, "column": column}
+    return conn.exec_driver_sql(_COLUMN_EXISTS_SQL, params).first() is not None
+
+
+def ensure_columns(conn: Connection) -> None:
+    for schema, table, column, sql_type in COLUMNS:
+        backfill = BACKFILLS.get((schema, table, column))
+        existed = backfill is not None and _column_exists(conn, schema, table, column)
+        conn.exec_driver_sql(f"ALTER TABLE IF EXISTS {schema}.{table} ADD COLUMN IF NOT EXISTS {column} {sql_type}")
+        if backfill is not None and not existed and _column_exists(conn, schema, table, column):
+            conn.exec_driver_sql(backfill)
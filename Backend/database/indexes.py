@@ -0,0 +1,151 @@
+# Backend/database/indexes.py
+from __future__ import annotations
+
+from sqlalchemy.engine import Connection
+
+# Index créés au démarrage (idempotents). Les relations de canonique peuvent
+# être des vues simples selon l'environnement: on n'indexe que si la relation
+# est une table ou une vue matérialisée (et si l'extension requise est là).
+_RELKIND_GUARDED = """
+DO $do$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = '{schema}' AND c.relname = '{table}' AND c.relkind IN ('r', 'm')
+    ) AND ({ext_check}) THEN
+        EXECUTE $idx${ddl}$idx$;
+    END IF;
+END
+$do$;
+"""
+
+# pg_trgm demande des droits suffisants: sans eux on garde les seq scans
+_CREATE_EXTENSIONS = """
+DO $do$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION
+    WHEN insufficient_privilege OR undefined_file THEN
+        RAISE NOTICE 'pg_trgm indisponible: index trigram ignorés';
+END
+$do$;
+"""
+
+# Même expression que routes/dossiers._sort_key_columns (keyset pagination).
+DOSSIER_KEYSET_INDEX = """
+CREATE INDEX IF NOT EXISTS ix_dossier_facturable_proj_keyset
+ON canonique.dossier_facturable_proj (
+    user_id,
+    (CASE
+        WHEN (statut_final = 'FACTURABLE') THEN 1
+        WHEN (statut_final = 'CONDITIONNEL') THEN 2
+        WHEN (statut_final = 'NON_FACTURABLE') THEN 3
+        WHEN (statut_final = 'A_VERIFIER') THEN 4
+        ELSE 5
+    END),
+    (CASE WHEN (motif_verification = 'CROISEMENT_INCOMPLET') THEN 1 ELSE 2 END),
+    (coalesce(-EXTRACT(epoch FROM generated_at), 1E+15)),
+    key_match
+)
+"""
+
+# périmètre d'un rafraîchissement après changement de règle (repositories.dossier_projection_repo)
+DOSSIER_ACT_PROD_INDEX = """
+CREATE INDEX IF NOT EXISTS ix_dossier_facturable_proj_act_prod
+ON canonique.dossier_facturable_proj ((upper(btrim(activite_code)) || '|' || upper(btrim(produit_code))))
+"""
+
+# rafraîchissement limité aux OT / ND touchés par un import (dossier_projection_repo._scope)
+DOSSIER_OT_PART_INDEX = """
+CREATE INDEX IF NOT EXISTS ix_dossier_facturable_proj_ot_part
+ON canonique.dossier_facturable_proj (user_id, (substring(key_match from '^OT:([^|]+)')))
+"""
+
+DOSSIER_ND_PART_INDEX = """
+CREATE INDEX IF NOT EXISTS ix_dossier_facturable_proj_nd_part
+ON canonique.dossier_facturable_proj (user_id, (substring(key_match from 'ND:(.+)$')))
+"""
+
+# Recherche des dossiers (routes/dossiers._base_query, core/search):
+# - "contient" (ILIKE '%x%') -> GIN trigram
+# - préfixe sur un OT/ND exact (LIKE 'x%') -> btree text_pattern_ops, user_id en tête
+DOSSIER_SEARCH_COLUMNS = ("ot_key", "nd_global", "key_match", "numero_ppd")
+DOSSIER_PREFIX_COLUMNS = ("ot_key", "nd_global", "key_match")
+
+
+def _trgm_index(col: str) -> str:
+    return f"""
+CREATE INDEX IF NOT EXISTS ix_dossier_facturable_proj_{col}_trgm
+ON canonique.dossier_facturable_proj USING gin ({col} gin_trgm_ops)
+"""
+
+
+def _prefix_index(col: str) -> str:
+    return f"""
+CREATE INDEX IF NOT EXISTS ix_dossier_facturable_proj_{col}_prefix
+ON canonique.dossier_facturable_proj (user_id, {col} text_pattern_ops)
+"""
+
+
+# lookup du cache de scraping (repositories/scrape_cache_repo)
+PIDI_SCRAPE_CACHE_INDEX = """
+CREATE INDEX IF NOT EXISTS ix_pidi_scrape_full_cache
+ON raw.pidi_scrape_full (user_id, releve_key, imported_at DESC)
+"""
+
+# cible ON CONFLICT (flux_pidi, user_id) de routes/praxedo_scraper._save_pidi_rows:
+# les bases existantes n'ont que la clé primaire (flux_pidi); create_all pose
+# directement la clé composite du modèle
+PIDI_SCRAPE_FULL_UPSERT_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS ux_pidi_scrape_full_flux_user
+ON raw.pidi_scrape_full (flux_pidi, user_id)
+"""
+
+# clés de jointure des comparaisons Orange PPD (database/columns, database/views)
+PIDI_CAC_RELEVE_INDEX = """
+CREATE INDEX IF NOT EXISTS ix_pidi_cac_releve_key
+ON raw.pidi (cac_key, releve_key)
+"""
+
+PIDI_OT_KEY_INDEX = """
+CREATE INDEX IF NOT EXISTS ix_pidi_ot_key_norm
+ON raw.pidi (ot_key_norm, imported_at DESC)
+"""
+
+ORANGE_PPD_ROWS_OT_KEY_INDEX = """
+CREATE INDEX IF NOT EXISTS ix_orange_ppd_rows_import_ot_key
+ON canonique.orange_ppd_rows (import_id, ot_key_norm)
+"""
+
+ORANGE_PPD_EXCEL_KEYS_INDEX = """
+CREATE INDEX IF NOT EXISTS ix_orange_ppd_excel_rows_import_keys
+ON canonique.orange_ppd_excel_rows (import_id, cac_key, releve_key)
+"""
+
+
+# (schema, table, ddl, extension requise)
+INDEXES: list[tuple[str, str, str, str | None]] = [
+    ("canonique", "dossier_facturable_proj", DOSSIER_KEYSET_INDEX, None),
+    ("canonique", "dossier_facturable_proj", DOSSIER_ACT_PROD_INDEX, None),
+    ("canonique", "dossier_facturable_proj", DOSSIER_OT_PART_INDEX, None),
+    ("canonique", "dossier_facturable_proj", DOSSIER_ND_PART_INDEX, None),
+    *[("canonique", "dossier_facturable_proj", _trgm_index(c), "pg_trgm") for c in DOSSIER_SEARCH_COLUMNS],
+    *[("canonique", "dossier_facturable_proj", _prefix_index(c), None) for c in DOSSIER_PREFIX_COLUMNS],
+    ("raw", "pidi_scrape_full", PIDI_SCRAPE_CACHE_INDEX, None),
+    ("raw", "pidi_scrape_full", PIDI_SCRAPE_FULL_UPSERT_INDEX, None),
+    ("raw", "pidi", PIDI_CAC_RELEVE_INDEX, None),
+    ("raw", "pidi", PIDI_OT_KEY_INDEX, None),
+    ("canonique", "orange_ppd_rows", ORANGE_PPD_ROWS_OT_KEY_INDEX, None),
+    ("canonique", "orange_ppd_excel_rows", ORANGE_PPD_EXCEL_KEYS_INDEX, None),
+]
+
+
+def ensure_indexes(conn: Connection) -> None:
+    conn.exec_driver_sql(_CREATE_EXTENSIONS)
+    for schema, table, ddl, ext in INDEXES:
+        ext_check = f"EXISTS (SELECT 1 FROM pg_extension WHERE extname = '{ext}')" if ext else "true"
+        conn.exec_driver_sql(
+            _RELKIND_GUARDED.format(schema=schema, table=table, ddl=ddl.strip(), ext_check=ext_check)
+        )
@@ -0,0 +1,142 @@
+# Backend/database/views.py
+from __future__ import annotations
+
+from sqlalchemy.engine import Connection
+
+# Vues de comparaison redéfinies au démarrage pour joindre sur les clés
+# normalisées persistées (database/columns) au lieu de recalculer
+# upper(regexp_replace(...)) à chaque requête. Mêmes colonnes de sortie que
+# les vues d'origine (CREATE OR REPLACE VIEW l'exige): si la vue en place a
+# une autre forme, on la laisse telle quelle.
+_COLUMNS_GUARDED = """
+DO $do$
+BEGIN
+    IF {checks} THEN
+        EXECUTE $view${ddl}$view$;
+    END IF;
+EXCEPTION
+    WHEN invalid_table_definition OR wrong_object_type OR datatype_mismatch THEN
+        RAISE NOTICE 'vue {name} non remplacée: %', SQLERRM;
+END
+$do$;
+"""
+
+_COLUMN_CHECK = """EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = '{schema}' AND table_name = '{table}' AND column_name = '{column}'
+    )"""
+
+PIDI_HT_LAST_BY_OT_VIEW = """
+CREATE OR REPLACE VIEW canonique.v_pidi_ht_last_by_ot AS
+WITH x AS (
+    SELECT p.ot_key_norm,
+           p.ht::numeric(12,2) AS ht,
+           row_number() OVER (PARTITION BY p.ot_key_norm ORDER BY p.imported_at DESC NULLS LAST) AS rn
+    FROM raw.pidi p
+    WHERE p.ot_key_norm IS NOT NULL
+)
+SELECT ot_key_norm, ht
+FROM x
+WHERE rn = 1
+"""
+
+ORANGE_PPD_EXCEL_COMPARE_RELEVE_VIEW = r"""
+CREATE OR REPLACE VIEW canonique.v_orange_ppd_excel_compare_releve AS
+WITH o AS (
+    SELECT r.import_id,
+           r.cac_key,
+           r.releve_key,
+           NULLIF(btrim(r.commande), '') AS n_cac,
+           NULLIF(btrim(r.releve), '') AS releve,
+           NULLIF(btrim(r.ppd_num), '') AS numero_ppd_orange,
+           sum(COALESCE(r.montant_brut, 0))::numeric(12,2) AS facturation_orange_ht,
+           sum(COALESCE(r.montant_majore, 0))::numeric(12,2) AS facturation_orange_ttc
+    FROM canonique.orange_ppd_excel_rows r
+    WHERE NULLIF(btrim(r.commande), '') IS NOT NULL
+      AND NULLIF(btrim(r.releve), '') IS NOT NULL
+    GROUP BY r.import_id, r.cac_key, r.releve_key,
+             NULLIF(btrim(r.commande), ''), NULLIF(btrim(r.releve), ''), NULLIF(btrim(r.ppd_num), '')
+), p_releve AS (
+    SELECT p.cac_key,
+           p.releve_key,
+           sum(COALESCE(p.ht, 0))::numeric(12,2) AS facturation_kyntus_ht,
+           sum(COALESCE(
+               NULLIF(replace(regexp_replace(btrim(p.bordereau), '[^0-9,.\-]', '', 'g'), ',', '.'), '')::numeric,
+               0
+           ))::numeric(12,2) AS facturation_kyntus_ttc,
+           array_agg(DISTINCT NULLIF(btrim(p.nd), '')) FILTER (WHERE NULLIF(btrim(p.nd), '') IS NOT NULL) AS nds,
+           array_agg(DISTINCT NULLIF(btrim(p.numero_ot), '')) FILTER (WHERE NULLIF(btrim(p.numero_ot), '') IS NOT NULL) AS numero_ots
+    FROM raw.pidi p
+    WHERE p.cac_key IS NOT NULL
+      AND p.releve_key IS NOT NULL
+    GROUP BY p.cac_key, p.releve_key
+), p_cac AS (
+    SELECT DISTINCT p.cac_key
+    FROM raw.pidi p
+    WHERE p.cac_key IS NOT NULL
+)
+SELECT o.import_id,
+       o.n_cac,
+       o.releve,
+       o.numero_ppd_orange,
+       o.facturation_orange_ht,
+       o.facturation_orange_ttc,
+       pr.facturation_kyntus_ht,
+       pr.facturation_kyntus_ttc,
+       (o.facturation_orange_ht - COALESCE(pr.facturation_kyntus_ht, 0))::numeric(12,2) AS diff_ht,
+       (o.facturation_orange_ttc - COALESCE(pr.facturation_kyntus_ttc, 0))::numeric(12,2) AS diff_ttc,
+       (pr.cac_key IS NOT NULL AND pr.releve_key IS NOT NULL) AS match_found,
+       CASE
+           WHEN pr.cac_key IS NOT NULL AND pr.releve_key IS NOT NULL THEN
+               CASE
+                   WHEN o.facturation_orange_ht - COALESCE(pr.facturation_kyntus_ht, 0) <> 0 THEN 'COMPARAISON_INCOHERENTE'
+                   WHEN o.facturation_orange_ttc - COALESCE(pr.facturation_kyntus_ttc, 0) <> 0 THEN 'COMPARAISON_INCOHERENTE'
+                   ELSE 'OK'
+               END
+           WHEN pc.cac_key IS NOT NULL THEN 'RELEVE_ABSENT_PIDI'
+           ELSE 'CAC_ABSENT_PIDI'
+       END AS reason,
+       CASE
+           WHEN pr.cac_key IS NULL THEN true
+           WHEN o.facturation_orange_ht - COALESCE(pr.facturation_kyntus_ht, 0) <> 0 THEN true
+           WHEN o.facturation_orange_ttc - COALESCE(pr.facturation_kyntus_ttc, 0) <> 0 THEN true
+           ELSE false
+       END AS a_verifier,
+       pr.nds,
+       pr.numero_ots
+FROM o
+LEFT JOIN p_releve pr ON pr.cac_key = o.cac_key AND pr.releve_key = o.releve_key
+LEFT JOIN p_cac pc ON pc.cac_key = o.cac_key
+"""
+
+# (nom, ddl, colonnes requises (schema, table, colonne))
+VIEWS: list[tuple[str, str, list[tuple[str, str, str]]]] = [
+    (
+        "canonique.v_pidi_ht_last_by_ot",
+        PIDI_HT_LAST_BY_OT_VIEW,
+        [("raw", "pidi", "ot_key_norm")],
+    ),
+    (
+        "canonique.v_orange_ppd_excel_compare_releve",
+        ORANGE_PPD_EXCEL_COMPARE_RELEVE_VIEW,
+        [
+            ("raw", "pidi", "cac_key"),
+            ("raw", "pidi", "releve_key"),
+            ("canonique", "orange_ppd_excel_rows", "cac_key"),
+            ("canonique", "orange_ppd_excel_rows", "releve_key"),
+        ],
+    ),
+]
+
+
+def ensure_views(conn: Connection) -> None:
+    for name, ddl, required in VIEWS:
+        checks = " AND ".join(
+            _COLUMN_CHECK.format(schema=schema, table=table, column=column) for schema, table, column in required
+        )
+        # no_parameters: le bloc DO contient un '%' (RAISE NOTICE) que psycopg2
+        # prendrait pour un paramètre si on lui passait un dict, même vide
+        conn.exec_driver_sql(
+            _COLUMNS_GUARDED.format(name=name, checks=checks, ddl=ddl.strip()),
+            execution_options={"no_parameters": True},
+        )
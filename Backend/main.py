@@ -5,15 +5,19 @@ from sqlalchemy import text
 
 from routes import api_router
 from core.config import get_settings
-from database.connection import engine
+from database.connection import SessionLocal, engine
+from database.columns import ensure_columns
+from database.indexes import ensure_indexes
+from database.views import ensure_views
 from models.user import Base
+from repositories.scrape_job_repo import mark_interrupted
 
 from routes.dossiers import router as dossiers_router
 from routes.imports import router as imports_router
 from routes.regles import router as regles_router
 from routes.debug_db import router as debug_router
 from routes.orange_ppd import router as orange_ppd_router
-from routes.praxedo_scraper import router as praxedo_scraper_router
+from routes.praxedo_scraper import router as praxedo_scraper_router, shutdown_browser_sessions
 from routes.auth import router as auth_router
 from routes.admin import router as admin_router
 from routes.import_commentaire_tech import router as commentaire_tech_router
@@ -32,6 +36,11 @@ with engine.begin() as conn:
 
 Base.metadata.create_all(bind=engine)
 
+with engine.begin() as conn:
+    ensure_columns(conn)
+    ensure_indexes(conn)
+    ensure_views(conn)
+
 app = FastAPI(title="Kyntus Facturation API")
 
 settings = get_settings()
@@ -56,7 +65,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition"],
+    expose_headers=["Content-Disposition", "X-Next-Cursor", "X-Projection-Stale"],
 )
 
 # Auth d'abord
@@ -77,6 +86,22 @@ app.include_router(commentaire_tech_router)
 app.include_router(api_router)
 
 
+@app.on_event("startup")
+def interrupt_orphan_scrape_jobs():
+    # jobs de scraping sans worker après redémarrage -> reprenables via /resume
+    db = SessionLocal()
+    try:
+        mark_interrupted(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+def close_browser_sessions():
+    shutdown_browser_sessions()
+
+
 @app.get("/")
 def root():
     return {"status": "ok"}
@@ -1,15 +1,14 @@
 # backend/models/dossiers_facturable.py
 from __future__ import annotations
 
-from sqlalchemy import Boolean, Column, DateTime, Text, Integer
+from sqlalchemy import Boolean, Column, DateTime, Text, Integer, PrimaryKeyConstraint
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 
 from database.connection import Base
 
 
-class VDossierFacturable(Base):
-    __tablename__ = "v_dossier_facturable"
-    __table_args__ = {"schema": "canonique"}
+class DossierFacturableColumns:
+    """Colonnes exposées par canonique.v_dossier_facturable (vue et projection)."""
 
     key_match = Column(Text, primary_key=True)
 
@@ -100,4 +99,40 @@ class VDossierFacturable(Base):
 
     @property
     def regle_articles_attendus(self):
-        return None
\ No newline at end of file
+        return None
+
+
+class VDossierFacturable(DossierFacturableColumns, Base):
+    __tablename__ = "v_dossier_facturable"
+    __table_args__ = {"schema": "canonique"}
+
+
+class DossierFacturableProj(DossierFacturableColumns, Base):
+    """
+    Projection matérialisée de v_dossier_facturable, par (user_id, key_match).
+    Alimentée par repositories.dossier_projection_repo (rafraîchissement différentiel).
+    """
+    __tablename__ = "dossier_facturable_proj"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "key_match"),
+        {"schema": "canonique"},
+    )
+
+    key_match = Column(Text, nullable=False)
+    user_id = Column(Integer, nullable=False)
+
+    row_hash = Column(Text)
+    refreshed_at = Column(DateTime)
+
+
+class DossierProjectionState(Base):
+    __tablename__ = "dossier_facturable_proj_state"
+    __table_args__ = {"schema": "canonique"}
+
+    user_id = Column(Integer, primary_key=True)
+    stale_since = Column(DateTime)
+    stale_reason = Column(Text)
+    refreshed_at = Column(DateTime)
+    rows = Column(Integer)
+    last_changed = Column(Integer)
+    last_duration_ms = Column(Integer)
@@ -1,9 +1,10 @@
 # Backend/models/raw_orange_ppd_row.py
 from __future__ import annotations
 
-from sqlalchemy import Column, String, DateTime, Numeric, ForeignKey, func
+from sqlalchemy import Column, Computed, String, DateTime, Numeric, ForeignKey, Text, func
 from sqlalchemy.orm import relationship
 
+from database.columns import OT_KEY_SQL
 from database.connection import Base
 
 
@@ -30,6 +31,7 @@ class RawOrangePpdRow(Base):
     code_secteur = Column(String, nullable=True)
 
     numero_ot = Column(String, nullable=True, index=True)  # OT normalisée côté import
+    ot_key_norm = Column(Text, Computed(OT_KEY_SQL.format(col="numero_ot"), persisted=True))  # clé de jointure
     numero_att = Column(String, nullable=True)
     oeie = Column(String, nullable=True)
     code_gestion_chantier = Column(String, nullable=True)
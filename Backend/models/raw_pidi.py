@@ -1,5 +1,6 @@
 #Backend/models/raw_pidi.py
-from sqlalchemy import Column, Text, TIMESTAMP, Numeric, Integer, ForeignKey
+from sqlalchemy import Column, Computed, Text, TIMESTAMP, Numeric, Integer, ForeignKey
+from database.columns import CAC_KEY_SQL, OT_KEY_SQL, RELEVE_KEY_SQL
 from database.connection import Base
 
 
@@ -34,4 +35,9 @@ class RawPidi(Base):
 
     n_cac = Column(Text, nullable=True)
     comment_acqui_rejet = Column(Text, nullable=True)
-    cause_acqui_rejet = Column(Text, nullable=True)
\ No newline at end of file
+    cause_acqui_rejet = Column(Text, nullable=True)
+
+    # clés de jointure normalisées, calculées par Postgres (database/columns)
+    cac_key = Column(Text, Computed(CAC_KEY_SQL.format(col="n_cac"), persisted=True))
+    releve_key = Column(Text, Computed(RELEVE_KEY_SQL.format(col="comment_acqui_rejet"), persisted=True))
+    ot_key_norm = Column(Text, Computed(OT_KEY_SQL.format(col="numero_ot"), persisted=True))
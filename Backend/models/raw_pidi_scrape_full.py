@@ -26,4 +26,9 @@ class RawPidiScrapeFull(Base):
     ht = Column(Numeric, nullable=True)
     prix_majore = Column(Numeric, nullable=True)
     raw_payload = Column(Text, nullable=True)
-    imported_at = Column(TIMESTAMP, nullable=True)
\ No newline at end of file
+    imported_at = Column(TIMESTAMP, nullable=True)
+
+    # clé du cache de scraping (relevé normalisé + CAC / PPD demandés)
+    releve_key = Column(Text, nullable=True)
+    expected_cac = Column(Text, nullable=True)
+    expected_ppd = Column(Text, nullable=True)
\ No newline at end of file
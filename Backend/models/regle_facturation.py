@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, Text, Boolean, DateTime, func
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import BigInteger, Column, Integer, Text, Boolean, DateTime, func
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from database.connection import Base
 
 
@@ -20,6 +20,7 @@ class RegleFacturation(Base):
     code_produit = Column(Text)
     plp_applicable = Column(Boolean)
     categorie = Column(Text)
+    codes_cloture_facturables = Column(ARRAY(Text))
 
     # ✅ Soft delete
     is_active = Column(Boolean, nullable=False, server_default="true")
@@ -27,4 +28,14 @@ class RegleFacturation(Base):
 
     # (si tes colonnes existent déjà en DB, garde-les ici)
     created_at = Column(DateTime(timezone=False), server_default=func.now())
-    updated_at = Column(DateTime(timezone=False), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=False), onupdate=func.now())
+
+class RegleFacturationVersion(Base):
+    """Compteur incrémenté à chaque écriture de règle (core/regle_index: rechargement des autres workers)."""
+
+    __tablename__ = "regle_facturation_version"
+    __table_args__ = {"schema": "referentiels"}
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, server_default="0")
+    updated_at = Column(DateTime(timezone=False), server_default=func.now(), onupdate=func.now())
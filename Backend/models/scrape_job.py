@@ -0,0 +1,60 @@
+# Backend/models/scrape_job.py
+from __future__ import annotations
+
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, PrimaryKeyConstraint, Sequence, Text, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+from database.connection import Base
+
+# ordre global des changements d'état des items (tail NDJSON repris via ?after=)
+SCRAPE_JOB_ITEM_SEQ = Sequence("scrape_job_item_seq", schema="pilotage")
+
+
+class ScrapeJob(Base):
+    """Run de scraping Praxedo persistant (reprenable après coupure / redémarrage)."""
+
+    __tablename__ = "scrape_job"
+    __table_args__ = {"schema": "pilotage"}
+
+    job_id = Column(Text, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+
+    # queued | running | cancelling | cancelled | done | error | interrupted
+    status = Column(Text, nullable=False, default="queued")
+    sessions = Column(Integer, nullable=False, default=1)
+    force_refresh = Column(Boolean, nullable=False, default=False)
+    total = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    error = Column(Text)
+    # dernier retour de /save-pidi appliqué aux résultats du job
+    save_result = Column(JSONB)
+
+
+class ScrapeJobItem(Base):
+    __tablename__ = "scrape_job_item"
+    __table_args__ = (
+        PrimaryKeyConstraint("job_id", "idx"),
+        {"schema": "pilotage"},
+    )
+
+    job_id = Column(Text, nullable=False)
+    idx = Column(Integer, nullable=False)
+
+    n_cac = Column(Text)
+    releve = Column(Text, nullable=False)
+    numero_ppd_orange = Column(Text)
+
+    # pending | running | ok | error
+    status = Column(Text, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    result = Column(JSONB)
+    message = Column(Text)
+    cached = Column(Boolean, nullable=False, default=False)
+    # résultat déjà passé par la logique /save-pidi
+    saved = Column(Boolean, nullable=False, default=False)
+
+    seq = Column(BigInteger, SCRAPE_JOB_ITEM_SEQ, server_default=SCRAPE_JOB_ITEM_SEQ.next_value(), index=True)
+    updated_at = Column(DateTime, server_default=func.now())
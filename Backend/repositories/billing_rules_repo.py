@@ -1,10 +1,13 @@
 # Backend/repositories/billing_rules_repo.py
 
 import re
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
-from backend.models.ref_factregle import RefFactRegle
-from backend.models.ref_remu_codecloture import RefRemuCodeCloture
+from models.ref_factregle import RefFactRegle
+from models.ref_remu_codecloture import RefRemuCodeCloture
 
 def _split_codes(text: str) -> set[str]:
     """
@@ -39,35 +42,13 @@ def is_code_cloture_facturable(db: Session, activite_remu: str, code_cloture: st
     ).first()
     if not row:
         return False
-    return (row.remu_fournisseur or "").strip().upper() == "OUI"
-
-def compute_facturation(db: Session, code_activite: str, code_produit: str, is_plp: bool, activite_remu: str, code_cloture: str):
-    rule = get_fact_rule(db, code_activite, code_produit, is_plp)
-    if not rule:
-        return {
-            "statut_final": "A_VERIFIER",
-            "articles": [],
-            "commentaire": "Aucune règle factregle trouvée",
-        }
-
-    # 1) check cloture dans la liste de la règle (ex: DMS MAJ TKO REA)
-    allowed = _split_codes(rule.codes_cloture_facturable)
-    if code_cloture.upper() not in allowed:
-        return {
-            "statut_final": "A_VERIFIER",
-            "articles": [],
-            "commentaire": f"Code clôture {code_cloture} non présent dans codes_cloture_facturable",
-        }
+    return _remu_ok(row)
 
-    # 2) check remu code clôture
-    if not is_code_cloture_facturable(db, activite_remu, code_cloture):
-        return {
-            "statut_final": "NON_FACTURABLE",
-            "articles": [],
-            "commentaire": f"Code clôture {code_cloture} remu_fournisseur != OUI",
-        }
+def _remu_ok(row: RefRemuCodeCloture) -> bool:
+    return (row.remu_fournisseur or "").strip().upper() == "OUI"
 
-    # 3) build articles (ici on retourne les champs bruts, ton moteur actuel fera le mapping LSIMx -> LSIM1 etc)
+def _rule_articles(rule: RefFactRegle) -> list[str]:
+    # ici on retourne les champs bruts, ton moteur actuel fera le mapping LSIMx -> LSIM1 etc
     articles = []
     for s in [
         rule.branchement_immeuble,
@@ -80,10 +61,139 @@ def compute_facturation(db: Session, code_activite: str, code_produit: str, is_p
     ]:
         if s and s.strip():
             articles.append(s.strip())
+    return articles
+
+def _no_rule() -> dict:
+    return {
+        "statut_final": "A_VERIFIER",
+        "articles": [],
+        "commentaire": "Aucune règle factregle trouvée",
+    }
+
+def _cloture_absente(code_cloture: str) -> dict:
+    return {
+        "statut_final": "A_VERIFIER",
+        "articles": [],
+        "commentaire": f"Code clôture {code_cloture} non présent dans codes_cloture_facturable",
+    }
+
+def _remu_refusee(code_cloture: str) -> dict:
+    return {
+        "statut_final": "NON_FACTURABLE",
+        "articles": [],
+        "commentaire": f"Code clôture {code_cloture} remu_fournisseur != OUI",
+    }
 
+def compute_facturation(db: Session, code_activite: str, code_produit: str, is_plp: bool, activite_remu: str, code_cloture: str):
+    rule = get_fact_rule(db, code_activite, code_produit, is_plp)
+    if not rule:
+        return _no_rule()
+
+    # 1) check cloture dans la liste de la règle (ex: DMS MAJ TKO REA)
+    allowed = _split_codes(rule.codes_cloture_facturable)
+    if code_cloture.upper() not in allowed:
+        return _cloture_absente(code_cloture)
+
+    # 2) check remu code clôture
+    if not is_code_cloture_facturable(db, activite_remu, code_cloture):
+        return _remu_refusee(code_cloture)
+
+    # 3) build articles
     return {
         "statut_final": "FACTURABLE",
-        "articles": articles,
+        "articles": _rule_articles(rule),
         "commentaire": rule.commentaires or "",
     }
 
+
+# --------------------
+# Évaluation par lot
+# --------------------
+class FacturationInput(NamedTuple):
+    code_activite: str
+    code_produit: str
+    is_plp: bool
+    activite_remu: str
+    code_cloture: str
+
+
+class _PreparedRule(NamedTuple):
+    allowed: frozenset[str]
+    articles: tuple[str, ...]
+    commentaire: str
+
+
+class BillingLookup:
+    """
+    ref.factregle et ref.remu_codecloture chargées une fois en tables de
+    hachage (codes clôture déjà découpés): compute_facturation sans requête
+    par dossier.
+
+    À la place du .first() sans ORDER BY du chemin unitaire, la règle de plus
+    petit id l'emporte quand plusieurs lignes partagent la même clé.
+    """
+
+    def __init__(self, db: Session) -> None:
+        # (code_activite, code_produit, PLP ?) -> règle
+        self.rules: dict[tuple[str, str, bool], _PreparedRule] = {}
+        for rule in db.query(RefFactRegle).order_by(RefFactRegle.id):
+            if rule.plp == "PLP":
+                is_plp = True
+            elif rule.plp in (None, "", "-"):
+                is_plp = False
+            else:
+                continue
+            self.rules.setdefault(
+                (rule.code_activite, rule.code_produit, is_plp),
+                _PreparedRule(
+                    allowed=frozenset(_split_codes(rule.codes_cloture_facturable)),
+                    articles=tuple(_rule_articles(rule)),
+                    commentaire=rule.commentaires or "",
+                ),
+            )
+
+        # (activite, code_cloture) -> remu_fournisseur == OUI
+        self.remu: dict[tuple[str, str], bool] = {}
+        rows = db.query(
+            RefRemuCodeCloture.activite,
+            RefRemuCodeCloture.code_cloture,
+            RefRemuCodeCloture.remu_fournisseur,
+        ).order_by(RefRemuCodeCloture.id)
+        for activite, code_cloture, remu_fournisseur in rows:
+            self.remu.setdefault(
+                (activite, code_cloture),
+                (remu_fournisseur or "").strip().upper() == "OUI",
+            )
+
+    def evaluate(self, item: FacturationInput) -> dict:
+        rule = self.rules.get((item.code_activite, item.code_produit, bool(item.is_plp)))
+        if rule is None:
+            return _no_rule()
+        if item.code_cloture.upper() not in rule.allowed:
+            return _cloture_absente(item.code_cloture)
+        if not self.remu.get((item.activite_remu, item.code_cloture), False):
+            return _remu_refusee(item.code_cloture)
+        return {
+            "statut_final": "FACTURABLE",
+            "articles": list(rule.articles),
+            "commentaire": rule.commentaire,
+        }
+
+
+def iter_facturation(
+    db: Session,
+    items: Iterable[FacturationInput | tuple],
+    lookup: BillingLookup | None = None,
+) -> Iterator[dict]:
+    """Résultats dans l'ordre des items (liste ou flux), référentiels lus une seule fois."""
+    lookup = lookup or BillingLookup(db)
+    for item in items:
+        yield lookup.evaluate(FacturationInput(*item))
+
+
+def compute_facturation_batch(
+    db: Session,
+    items: Iterable[FacturationInput | tuple],
+    lookup: BillingLookup | None = None,
+) -> list[dict]:
+    return list(iter_facturation(db, items, lookup))
@@ -0,0 +1,450 @@
+# Backend/repositories/dossier_projection_repo.py
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database.connection import SessionLocal
+from models.dossiers_facturable import DossierProjectionState, VDossierFacturable
+
+log = logging.getLogger(__name__)
+
+VIEW = "canonique.v_dossier_facturable"
+PROJ = "canonique.dossier_facturable_proj"
+STATE = "canonique.dossier_facturable_proj_state"
+
+# colonnes de la vue recopiées telles quelles dans la projection
+VIEW_COLUMNS: list[str] = [c.name for c in VDossierFacturable.__table__.columns]
+_PK = ("user_id", "key_match")
+
+# un seul rafraîchissement à la fois par user (verrou de transaction)
+_USER_LOCK_SQL = text("SELECT pg_advisory_xact_lock(hashtext('dossier_facturable_proj'), :uid)")
+
+
+def _act_prod_key(expr_act: str, expr_prod: str) -> str:
+    # même normalisation que le LATERAL sur referentiels.regle_facturation dans la vue
+    return f"upper(btrim({expr_act})) || '|' || upper(btrim({expr_prod}))"
+
+
+def act_prod_keys(pairs: Iterable[tuple[str | None, str | None]]) -> list[str]:
+    out: set[str] = set()
+    for act, prod in pairs:
+        if act is None or prod is None:
+            continue
+        out.add(f"{act.strip().upper()}|{prod.strip().upper()}")
+    return sorted(out)
+
+
+# key_match = 'OT:<ot_norm>|ND:<nd_norm>' / 'OT:<ot_norm>' / 'ND:<nd_norm>' (v_croisement)
+def _ot_part(alias: str) -> str:
+    return f"substring({alias}.key_match from '^OT:([^|]+)')"
+
+
+def _nd_part(alias: str) -> str:
+    return f"substring({alias}.key_match from 'ND:(.+)$')"
+
+
+@dataclass(frozen=True)
+class DossierKeys:
+    """OT / ND normalisés comme ot_norm / nd_norm de v_croisement."""
+
+    ots: frozenset[str]
+    nds: frozenset[str]
+
+    def __len__(self) -> int:
+        return len(self.ots) + len(self.nds)
+
+
+def _ot_norm(v: Any) -> str | None:
+    if v is None:
+        return None
+    return re.sub(r"[^0-9]", "", str(v)).lstrip("0") or None
+
+
+def _nd_norm(v: Any) -> str | None:
+    if v is None:
+        return None
+    return re.sub(r"\s+", "", str(v)) or None
+
+
+def dossier_keys(ots: Iterable[Any] = (), nds: Iterable[Any] = ()) -> DossierKeys:
+    """Clés touchées par une écriture (OT / ND bruts des lignes importées)."""
+    return DossierKeys(
+        ots=frozenset(k for k in map(_ot_norm, ots) if k),
+        nds=frozenset(k for k in map(_nd_norm, nds) if k),
+    )
+
+
+def _scope(
+    alias: str,
+    user_id: int | None,
+    act_prod: list[str] | None,
+    keys: DossierKeys | None = None,
+    user_ids: list[int] | None = None,
+) -> tuple[str, dict[str, Any]]:
+    where = [f"{alias}.user_id IS NOT NULL"]
+    params: dict[str, Any] = {}
+    if user_id is not None:
+        where.append(f"{alias}.user_id = :user_id")
+        params["user_id"] = user_id
+    if user_ids is not None:
+        where.append(f"{alias}.user_id = ANY(:user_ids)")
+        params["user_ids"] = user_ids
+    if act_prod is not None:
+        where.append(f"{_act_prod_key(alias + '.activite_code', alias + '.produit_code')} = ANY(:act_prod)")
+        params["act_prod"] = act_prod
+    if keys is not None:
+        where.append(f"({_ot_part(alias)} = ANY(:ots) OR {_nd_part(alias)} = ANY(:nds))")
+        params["ots"] = sorted(keys.ots)
+        params["nds"] = sorted(keys.nds)
+    return " AND ".join(where), params
+
+
+def _expand_keys(db: Session, user_id: int, keys: DossierKeys) -> DossierKeys:
+    """
+    Ajoute l'autre moitié des key_match déjà projetés qui partagent un OT ou
+    un ND touché: si l'écriture change le ND d'un OT, l'ancien dossier
+    (OT:x|ND:ancien) et celui qui reprend l'ancien ND sont aussi recalculés.
+    """
+    if not keys:
+        return keys
+    where, params = _scope("p", user_id, None, keys)
+    rows = db.execute(
+        text(f"SELECT {_ot_part('p')}, {_nd_part('p')} FROM {PROJ} p WHERE {where}"),
+        params,
+    ).all()
+    return DossierKeys(
+        ots=keys.ots | {ot for ot, _ in rows if ot},
+        nds=keys.nds | {nd for _, nd in rows if nd},
+    )
+
+
+def _refresh_sql(scope_v: str, scope_p: str) -> tuple[str, str, str]:
+    cols = ", ".join(VIEW_COLUMNS)
+    v_cols = ", ".join(f"v.{c}" for c in VIEW_COLUMNS)
+
+    build = f"""
+        CREATE TEMP TABLE _dfp_new ON COMMIT DROP AS
+        SELECT DISTINCT ON (v.user_id, v.key_match)
+            {v_cols},
+            md5(ROW({v_cols})::text) AS row_hash
+        FROM {VIEW} v
+        WHERE {scope_v}
+        ORDER BY v.user_id, v.key_match
+    """
+
+    delete = f"""
+        DELETE FROM {PROJ} p
+        WHERE {scope_p}
+          AND NOT EXISTS (
+              SELECT 1 FROM _dfp_new n
+              WHERE n.user_id = p.user_id AND n.key_match = p.key_match
+          )
+    """
+
+    updates = ",\n            ".join(f"{c} = EXCLUDED.{c}" for c in VIEW_COLUMNS if c not in _PK)
+    upsert = f"""
+        INSERT INTO {PROJ} ({cols}, row_hash, refreshed_at)
+        SELECT {cols}, row_hash, :now FROM _dfp_new
+        ON CONFLICT (user_id, key_match) DO UPDATE SET
+            {updates},
+            row_hash = EXCLUDED.row_hash,
+            refreshed_at = EXCLUDED.refreshed_at
+        WHERE {PROJ}.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+        RETURNING (xmax = 0) AS inserted
+    """
+    return build, delete, upsert
+
+
+def refresh_projection(
+    db: Session,
+    *,
+    user_id: int | None = None,
+    act_prod: list[str] | None = None,
+    keys: DossierKeys | None = None,
+) -> dict[str, Any]:
+    """
+    Recalcule la vue sur le périmètre demandé (un user, et/ou des couples
+    activité|produit, et/ou les dossiers d'OT / ND touchés par une écriture)
+    et n'écrit que les key_match ajoutés / modifiés / disparus.
+    Ne commit pas.
+    """
+    t0 = time.perf_counter()
+    if keys is not None and user_id is None:
+        raise ValueError("refresh_projection: keys demande user_id")
+
+    user_ids: list[int] | None = None
+    if user_id is not None:
+        # un seul rafraîchissement à la fois par user
+        db.execute(_USER_LOCK_SQL, {"uid": user_id})
+    else:
+        # tous users (changement de règle): même verrou, pris pour chaque user
+        # déjà projeté, dans l'ordre des id (pas d'interblocage avec le chemin
+        # par user qui n'en prend qu'un). Les projections jamais construites
+        # le seront en entier à la première lecture.
+        user_ids = list(
+            db.execute(text(f"SELECT user_id FROM {STATE} WHERE refreshed_at IS NOT NULL ORDER BY user_id")).scalars()
+        )
+        for uid in user_ids:
+            db.execute(_USER_LOCK_SQL, {"uid": uid})
+    if keys is not None:
+        keys = _expand_keys(db, user_id, keys)
+
+    scope_v, params = _scope("v", user_id, act_prod, keys, user_ids)
+    scope_p, _ = _scope("p", user_id, act_prod, keys, user_ids)
+    build, delete, upsert = _refresh_sql(scope_v, scope_p)
+
+    db.execute(text("DROP TABLE IF EXISTS _dfp_new"))
+    db.execute(text(build), params)
+    deleted = int(db.execute(text(delete), params).rowcount or 0)
+    flags = db.execute(text(upsert), {"now": datetime.utcnow()}).scalars().all()
+    inserted = sum(1 for f in flags if f)
+    updated = len(flags) - inserted
+
+    per_user = db.execute(text("SELECT user_id, count(*) FROM _dfp_new GROUP BY user_id")).all()
+    duration_ms = int((time.perf_counter() - t0) * 1000)
+    changed = inserted + updated + deleted
+
+    if user_id is not None:
+        if keys is None:
+            rows = int(per_user[0][1]) if per_user else 0
+        else:
+            rows = int(db.execute(text(f"SELECT count(*) FROM {PROJ} WHERE user_id = :uid"), {"uid": user_id}).scalar_one())
+        db.execute(
+            text(f"""
+                INSERT INTO {STATE} (user_id, stale_since, stale_reason, refreshed_at, rows, last_changed, last_duration_ms)
+                VALUES (:uid, NULL, NULL, :now, :rows, :changed, :ms)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    stale_since = NULL,
+                    stale_reason = NULL,
+                    refreshed_at = EXCLUDED.refreshed_at,
+                    rows = EXCLUDED.rows,
+                    last_changed = EXCLUDED.last_changed,
+                    last_duration_ms = EXCLUDED.last_duration_ms
+            """),
+            {"uid": user_id, "now": datetime.utcnow(), "rows": rows, "changed": changed, "ms": duration_ms},
+        )
+
+    return {
+        "scope_rows": sum(int(n) for _, n in per_user),
+        "users": len(per_user),
+        "inserted": inserted,
+        "updated": updated,
+        "deleted": deleted,
+        "scoped_keys": len(keys) if keys is not None else None,
+        "duration_ms": duration_ms,
+    }
+
+
+def mark_stale(db: Session, user_ids: Iterable[int] | None, reason: str) -> None:
+    """user_ids=None -> tous les users déjà projetés. Ne commit pas."""
+    if user_ids is None:
+        db.execute(
+            text(f"UPDATE {STATE} SET stale_since = COALESCE(stale_since, :now), stale_reason = :reason"),
+            {"now": datetime.utcnow(), "reason": reason},
+        )
+        return
+
+    for uid in set(user_ids):
+        db.execute(
+            text(f"""
+                INSERT INTO {STATE} (user_id, stale_since, stale_reason)
+                VALUES (:uid, :now, :reason)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    stale_since = COALESCE({STATE}.stale_since, EXCLUDED.stale_since),
+                    stale_reason = EXCLUDED.stale_reason
+            """),
+            {"uid": uid, "now": datetime.utcnow(), "reason": reason},
+        )
+
+
+# au-delà, recalculer toute la tranche du user coûte moins que les ANY(:ots/:nds)
+SCOPED_REFRESH_MAX_KEYS = 20_000
+
+
+def refresh_user_after_write(
+    db: Session,
+    user_id: int,
+    reason: str,
+    keys: DossierKeys | None = None,
+) -> dict[str, Any] | None:
+    """
+    À appeler après le commit d'un import: marque le user stale (durable), puis
+    tente le rafraîchissement différentiel. keys (OT / ND écrits) limite le
+    recalcul aux dossiers concernés, si la projection était à jour avant
+    l'écriture; sinon (ou keys=None, ex. suppression) toute la tranche du user.
+    En cas d'échec la projection reste stale: la prochaine lecture la sert
+    telle quelle et relance le calcul en arrière-plan (ensure_readable).
+    """
+    try:
+        st = db.get(DossierProjectionState, user_id, populate_existing=True)
+        if keys is not None and (not _built(st) or st.stale_since is not None or len(keys) > SCOPED_REFRESH_MAX_KEYS):
+            keys = None
+        mark_stale(db, [user_id], reason)
+        db.commit()
+        stats = refresh_projection(db, user_id=user_id, keys=keys)
+        db.commit()
+        return stats
+    except Exception:
+        db.rollback()
+        log.exception("refresh dossier_facturable_proj échoué (user_id=%s, %s)", user_id, reason)
+        return None
+
+
+def refresh_rules_after_write(db: Session, pairs: Iterable[tuple[str | None, str | None]]) -> dict[str, Any] | None:
+    """Changement de règle: on ne réécrit que les dossiers des couples activité|produit concernés."""
+    keys = act_prod_keys(pairs)
+    if not keys:
+        return None
+    try:
+        stats = refresh_projection(db, act_prod=keys)
+        db.commit()
+        return stats
+    except Exception:
+        db.rollback()
+        log.exception("refresh dossier_facturable_proj échoué (règles %s)", keys)
+        try:
+            mark_stale(db, None, "regle")
+            db.commit()
+        except Exception:
+            db.rollback()
+        return None
+
+
+# Rafraîchissements déclenchés par une lecture: hors requête, dans un thread
+# dédié, au plus un en attente ou en cours par user (uvicorn --workers 1).
+_BG_PENDING: set[int] = set()
+_BG_LOCK = threading.Lock()
+_BG_EXECUTOR: ThreadPoolExecutor | None = None
+
+
+def _bg_executor() -> ThreadPoolExecutor:
+    global _BG_EXECUTOR
+    with _BG_LOCK:
+        if _BG_EXECUTOR is None:
+            _BG_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="projection-refresh")
+        return _BG_EXECUTOR
+
+
+def _refresh_in_background(user_id: int) -> None:
+    db = SessionLocal()
+    try:
+        refresh_projection(db, user_id=user_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        log.exception("refresh dossier_facturable_proj en arrière-plan échoué (user_id=%s)", user_id)
+    finally:
+        db.close()
+        with _BG_LOCK:
+            _BG_PENDING.discard(user_id)
+
+
+def schedule_refresh(user_id: int) -> bool:
+    """Planifie le rafraîchissement du user; False s'il est déjà planifié."""
+    with _BG_LOCK:
+        if user_id in _BG_PENDING:
+            return False
+        _BG_PENDING.add(user_id)
+    try:
+        _bg_executor().submit(_refresh_in_background, user_id)
+    except Exception:
+        with _BG_LOCK:
+            _BG_PENDING.discard(user_id)
+        raise
+    return True
+
+
+def refresh_pending(user_id: int) -> bool:
+    with _BG_LOCK:
+        return user_id in _BG_PENDING
+
+
+def _built(st: DossierProjectionState | None) -> bool:
+    return st is not None and st.refreshed_at is not None
+
+
+def ensure_readable(db: Session, user_id: int) -> bool:
+    """
+    Avant une lecture. Projection jamais construite (premier accès, nouveau
+    user): construite dans la requête, sinon la lecture serait vide. Projection
+    construite mais stale: servie en l'état, recalcul planifié en arrière-plan.
+    Retourne True si la lecture porte sur une projection stale.
+    """
+    st = db.get(DossierProjectionState, user_id)
+    if _built(st):
+        if st.stale_since is None:
+            return False
+        schedule_refresh(user_id)
+        return True
+
+    # même verrou que refresh_projection (réentrant dans la transaction): des
+    # premières lectures concurrentes ne construisent qu'une fois
+    db.execute(_USER_LOCK_SQL, {"uid": user_id})
+    st = db.get(DossierProjectionState, user_id, populate_existing=True)
+    if not _built(st):
+        refresh_projection(db, user_id=user_id)
+    db.commit()
+    return False
+
+
+def projection_status(db: Session, user_id: int) -> dict[str, Any]:
+    st = db.get(DossierProjectionState, user_id)
+    now = datetime.utcnow()
+    if st is None:
+        return {
+            "user_id": user_id,
+            "built": False,
+            "stale": True,
+            "refresh_pending": refresh_pending(user_id),
+            "refreshed_at": None,
+            "stale_since": None,
+        }
+
+    return {
+        "user_id": user_id,
+        "built": st.refreshed_at is not None,
+        "stale": st.refreshed_at is None or st.stale_since is not None,
+        "refresh_pending": refresh_pending(user_id),
+        "stale_since": st.stale_since,
+        "stale_reason": st.stale_reason,
+        "stale_for_s": round((now - st.stale_since).total_seconds(), 1) if st.stale_since else None,
+        "refreshed_at": st.refreshed_at,
+        "age_s": round((now - st.refreshed_at).total_seconds(), 1) if st.refreshed_at else None,
+        "rows": st.rows,
+        "last_changed": st.last_changed,
+        "last_duration_ms": st.last_duration_ms,
+    }
+
+
+def load_projection_rows(
+    db: Session,
+    columns: Iterable[str],
+    user_id: int,
+    limit: int = 100_000,
+) -> list[dict[str, Any]]:
+    """Lignes de la projection d'un utilisateur (colonnes de la vue uniquement), pour évaluation en mémoire."""
+    cols = [c for c in VIEW_COLUMNS if c in set(columns)]
+    if not cols:
+        return []
+    where, params = _scope("p", user_id, None)
+    rows = db.execute(
+        text(f"""
+            SELECT {", ".join("p." + c for c in cols)}
+            FROM {PROJ} p
+            WHERE {where}
+            ORDER BY p.user_id, p.key_match
+            LIMIT :limit
+        """),
+        {**params, "limit": limit},
+    ).mappings()
+    return [dict(r) for r in rows]
@@ -0,0 +1,68 @@
+# Backend/repositories/scrape_cache_repo.py
+from __future__ import annotations
+
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+log = logging.getLogger(__name__)
+
+# (relevé normalisé, CAC normalisé | None, PPD | None)
+CacheKey = tuple[str, "str | None", "str | None"]
+
+
+def find_cached_rows(
+    db: Session,
+    user_id: int,
+    keys: list[CacheKey],
+    max_age_s: int,
+) -> dict[CacheKey, dict[str, Any]]:
+    """
+    Dernière ligne scrapée (raw.pidi_scrape_full) encore valide pour chaque clé.
+    - CAC demandé: la ligne doit porter ce CAC
+    - PPD demandé: PPD demandé lors du scraping ou PPD lu sur Praxedo identique
+    Retourne {clé: {"row": payload d'origine, "scraped_at": datetime}}.
+    """
+    releve_keys = sorted({k[0] for k in keys if k[0]})
+    if not releve_keys or max_age_s <= 0:
+        return {}
+
+    rows = db.execute(
+        text("""
+            SELECT releve_key, num_cac, num_ppd, expected_ppd, raw_payload, imported_at
+            FROM raw.pidi_scrape_full
+            WHERE user_id = :uid
+              AND releve_key = ANY(:keys)
+              AND imported_at >= :cutoff
+            ORDER BY imported_at DESC
+        """),
+        {"uid": user_id, "keys": releve_keys, "cutoff": datetime.utcnow() - timedelta(seconds=max_age_s)},
+    ).all()
+
+    by_releve: dict[str, list] = {}
+    for r in rows:
+        by_releve.setdefault(r.releve_key, []).append(r)
+
+    out: dict[CacheKey, dict[str, Any]] = {}
+    for key in keys:
+        releve_key, cac, ppd = key
+        for r in by_releve.get(releve_key, ()):
+            if cac and r.num_cac != cac:
+                continue
+            if ppd and ppd not in (r.expected_ppd, (r.num_ppd or "").strip()):
+                continue
+            try:
+                payload = json.loads(r.raw_payload or "")
+            except ValueError:
+                log.warning("raw_payload illisible (releve_key=%s)", releve_key)
+                continue
+            if not isinstance(payload, dict):
+                continue
+            out[key] = {"row": payload, "scraped_at": r.imported_at}
+            break
+
+    return out
@@ -0,0 +1,245 @@
+# Backend/repositories/scrape_job_repo.py
+from __future__ import annotations
+
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Iterable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models.scrape_job import ScrapeJob, ScrapeJobItem
+
+JOB = "pilotage.scrape_job"
+ITEM = "pilotage.scrape_job_item"
+
+FINISHED = ("cancelled", "done", "error", "interrupted")
+
+
+def create_job(
+    db: Session,
+    user_id: int,
+    items: list[dict[str, Any]],
+    *,
+    sessions: int,
+    force_refresh: bool,
+) -> ScrapeJob:
+    """Crée le job et ses items (pending). Ne commit pas."""
+    job = ScrapeJob(
+        job_id=str(uuid.uuid4()),
+        user_id=user_id,
+        status="queued",
+        sessions=sessions,
+        force_refresh=force_refresh,
+        total=len(items),
+    )
+    db.add(job)
+    db.flush()
+    db.add_all(
+        ScrapeJobItem(
+            job_id=job.job_id,
+            idx=i,
+            n_cac=x.get("n_cac"),
+            releve=x["releve"],
+            numero_ppd_orange=x.get("numero_ppd_orange"),
+        )
+        for i, x in enumerate(items)
+    )
+    db.flush()
+    return job
+
+
+def get_job(db: Session, job_id: str, user_id: int) -> ScrapeJob | None:
+    job = db.get(ScrapeJob, job_id, populate_existing=True)
+    if job is None or job.user_id != user_id:
+        return None
+    return job
+
+
+def list_jobs(db: Session, user_id: int, limit: int = 50) -> list[ScrapeJob]:
+    return (
+        db.query(ScrapeJob)
+        .filter(ScrapeJob.user_id == user_id)
+        .order_by(ScrapeJob.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def item_counts(db: Session, job_id: str) -> dict[str, int]:
+    rows = db.execute(
+        text(f"SELECT status, count(*) FROM {ITEM} WHERE job_id = :jid GROUP BY status"),
+        {"jid": job_id},
+    ).all()
+    return {status: int(n) for status, n in rows}
+
+
+def job_snapshot(db: Session, job: ScrapeJob) -> dict[str, Any]:
+    counts = item_counts(db, job.job_id)
+    done = counts.get("ok", 0) + counts.get("error", 0)
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "sessions": job.sessions,
+        "force_refresh": job.force_refresh,
+        "total": job.total,
+        "items": counts,
+        "progress": round(done / job.total, 4) if job.total else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "error": job.error,
+        "save_result": job.save_result,
+    }
+
+
+def set_status(db: Session, job_id: str, status: str, *, error: str | None = None) -> None:
+    """Ne commit pas."""
+    now = datetime.utcnow()
+    db.execute(
+        text(f"""
+            UPDATE {JOB}
+            SET status = :status,
+                error = COALESCE(:error, error),
+                started_at = COALESCE(:started_at, started_at),
+                finished_at = :finished_at
+            WHERE job_id = :jid
+        """),
+        {
+            "jid": job_id,
+            "status": status,
+            "error": error,
+            "started_at": now if status == "running" else None,
+            "finished_at": now if status in FINISHED else None,
+        },
+    )
+
+
+def current_status(db: Session, job_id: str) -> str | None:
+    return db.execute(text(f"SELECT status FROM {JOB} WHERE job_id = :jid"), {"jid": job_id}).scalar()
+
+
+def pending_items(db: Session, job_id: str) -> list[dict[str, Any]]:
+    """Items à (re)traiter. Les items 'running' d'un run interrompu repassent en pending."""
+    db.execute(
+        text(f"""
+            UPDATE {ITEM}
+            SET status = 'pending', seq = nextval('pilotage.scrape_job_item_seq'), updated_at = :now
+            WHERE job_id = :jid AND status = 'running'
+        """),
+        {"jid": job_id, "now": datetime.utcnow()},
+    )
+    rows = db.execute(
+        text(f"""
+            SELECT idx, n_cac, releve, numero_ppd_orange
+            FROM {ITEM}
+            WHERE job_id = :jid AND status = 'pending'
+            ORDER BY idx
+        """),
+        {"jid": job_id},
+    ).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def requeue(db: Session, job_id: str, *, retry_errors: bool) -> int:
+    """Repasse en pending les items en erreur (si demandé). Ne commit pas."""
+    if not retry_errors:
+        return 0
+    res = db.execute(
+        text(f"""
+            UPDATE {ITEM}
+            SET status = 'pending', message = NULL,
+                seq = nextval('pilotage.scrape_job_item_seq'), updated_at = :now
+            WHERE job_id = :jid AND status = 'error'
+        """),
+        {"jid": job_id, "now": datetime.utcnow()},
+    )
+    return int(res.rowcount or 0)
+
+
+def mark_item(
+    db: Session,
+    job_id: str,
+    idx: int,
+    status: str,
+    *,
+    result: dict[str, Any] | None = None,
+    message: str | None = None,
+    cached: bool = False,
+) -> None:
+    """Ne commit pas."""
+    db.execute(
+        text(f"""
+            UPDATE {ITEM}
+            SET status = :status,
+                attempts = attempts + CASE WHEN :status IN ('ok', 'error') AND NOT :cached THEN 1 ELSE 0 END,
+                result = COALESCE(CAST(:result AS jsonb), result),
+                message = :message,
+                cached = :cached,
+                saved = CASE WHEN :status = 'ok' THEN false ELSE saved END,
+                seq = nextval('pilotage.scrape_job_item_seq'),
+                updated_at = :now
+            WHERE job_id = :jid AND idx = :idx
+        """),
+        {
+            "jid": job_id,
+            "idx": idx,
+            "status": status,
+            "result": json.dumps(result, ensure_ascii=False) if result is not None else None,
+            "message": message,
+            "cached": cached,
+            "now": datetime.utcnow(),
+        },
+    )
+
+
+def unsaved_results(db: Session, job_id: str) -> list[tuple[int, dict[str, Any]]]:
+    rows = db.execute(
+        text(f"""
+            SELECT idx, result FROM {ITEM}
+            WHERE job_id = :jid AND status = 'ok' AND NOT saved AND result IS NOT NULL
+            ORDER BY idx
+        """),
+        {"jid": job_id},
+    ).all()
+    return [(int(idx), result) for idx, result in rows]
+
+
+def mark_saved(db: Session, job_id: str, idxs: Iterable[int], save_result: dict[str, Any]) -> None:
+    """Ne commit pas."""
+    db.execute(
+        text(f"UPDATE {ITEM} SET saved = true WHERE job_id = :jid AND idx = ANY(:idxs)"),
+        {"jid": job_id, "idxs": list(idxs)},
+    )
+    db.execute(
+        text(f"UPDATE {JOB} SET save_result = CAST(:res AS jsonb) WHERE job_id = :jid"),
+        {"jid": job_id, "res": json.dumps(save_result, default=str)},
+    )
+
+
+def tail_items(db: Session, job_id: str, after_seq: int, limit: int = 500) -> list[dict[str, Any]]:
+    rows = db.execute(
+        text(f"""
+            SELECT seq, idx, n_cac, releve, numero_ppd_orange, status, attempts, result, message, cached
+            FROM {ITEM}
+            WHERE job_id = :jid AND seq > :after
+            ORDER BY seq
+            LIMIT :limit
+        """),
+        {"jid": job_id, "after": after_seq, "limit": limit},
+    ).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def mark_interrupted(db: Session) -> int:
+    """Au démarrage: les jobs restés queued/running n'ont plus de worker. Ne commit pas."""
+    res = db.execute(
+        text(f"""
+            UPDATE {JOB}
+            SET status = 'interrupted', finished_at = :now
+            WHERE status IN ('queued', 'running', 'cancelling')
+        """),
+        {"now": datetime.utcnow()},
+    )
+    return int(res.rowcount or 0)
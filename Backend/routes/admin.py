@@ -8,7 +8,10 @@ from database.connection import get_db
 from routes.auth import get_current_user, require_admin
 from models.user import User
 from schemas.user import AdminUserCreate, UserOut, UserRoleUpdate, UserStatusUpdate
-from core.security import get_password_hash
+from core.security import PasswordPoolBusy, get_password_hash
+from core.summary_cache import compare_summary_cache
+from core.user_cache import user_cache
+from repositories.dossier_projection_repo import refresh_user_after_write
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -32,9 +35,14 @@ def create_user_by_admin(
     if existing_user:
         raise HTTPException(status_code=400, detail="Cet email est déjà utilisé.")
 
+    try:
+        hashed_password = get_password_hash(payload.password)
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Serveur d'authentification saturé, réessayez.")
+
     new_user = User(
         email=payload.email,
-        hashed_password=get_password_hash(payload.password),
+        hashed_password=hashed_password,
         role=payload.role,
         is_active=payload.is_active,
     )
@@ -58,6 +66,7 @@ def update_user_role(
 
     user.role = payload.role
     db.commit()
+    user_cache.invalidate(user.id)
     db.refresh(user)
     return user
 
@@ -75,10 +84,16 @@ def update_user_status(
 
     user.is_active = payload.is_active
     db.commit()
+    user_cache.invalidate(user.id)
     db.refresh(user)
     return user
 
 
+@router.get("/user-cache")
+def user_cache_stats(current_user: User = Depends(require_admin)) -> Dict[str, Any]:
+    return user_cache.stats()
+
+
 @router.post("/truncate-all")
 async def truncate_all(
     db: Session = Depends(get_db),
@@ -122,10 +137,14 @@ async def truncate_all(
         db.execute(text("DELETE FROM raw.pidi_scrape_full WHERE user_id = :user_id"), {"user_id": user_id})
 
         db.commit()
+        compare_summary_cache.invalidate()
+        # sources de v_dossier_facturable vidées: la projection du user suit
+        projection = refresh_user_after_write(db, user_id, "truncate_all")
 
         return {
             "success": True,
-            "message": "Toutes les données de votre session ont été vidées avec succès"
+            "message": "Toutes les données de votre session ont été vidées avec succès",
+            "projection": projection,
         }
 
     except Exception as e:
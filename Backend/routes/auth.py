@@ -1,15 +1,20 @@
 # Backend/routes/auth.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 import jwt
 from jwt.exceptions import InvalidTokenError
 
-from database.connection import get_db
+from core.config import get_settings
+from core.rate_limit import LoginRateLimiter
+from core.user_cache import user_cache
+from database.connection import SessionLocal, get_db
 from models.user import User
 from schemas.user import UserOut, Token, TokenData
 from core.security import (
-    verify_password,
+    PasswordPoolBusy,
+    verify_password_async,
     create_access_token,
     SECRET_KEY,
     ALGORITHM,
@@ -19,8 +24,34 @@ router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+_settings = get_settings()
+login_limiter = LoginRateLimiter(
+    window_s=_settings.LOGIN_RATE_WINDOW_S,
+    max_per_ip=_settings.LOGIN_MAX_ATTEMPTS_PER_IP,
+    max_per_account=_settings.LOGIN_MAX_ATTEMPTS_PER_ACCOUNT,
+)
+_TRUSTED_PROXIES = {p.strip() for p in (_settings.LOGIN_TRUSTED_PROXIES or "").split(",") if p.strip()}
+
+
+def _client_ip(request: Request) -> str:
+    peer = request.client.host if request.client else "unknown"
+    if not _TRUSTED_PROXIES or ("*" not in _TRUSTED_PROXIES and peer not in _TRUSTED_PROXIES):
+        return peer
+    # X-Forwarded-For: client, proxy1, proxy2 -> première adresse (en partant
+    # de la droite) qui n'est pas un proxy de confiance; "*": la plus à gauche
+    hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    if not hops:
+        return peer
+    if "*" in _TRUSTED_PROXIES:
+        return hops[0]
+    for hop in reversed(hops):
+        if hop not in _TRUSTED_PROXIES:
+            return hop
+    return hops[0]
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+    # pas de Depends(get_db): sur un hit du cache (core/user_cache), aucune connexion n'est prise
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -35,6 +66,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         raise credentials_exception
 
     user = None
+    uid = None
 
     if user_id is not None:
         try:
@@ -42,15 +74,23 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         except Exception:
             raise credentials_exception
 
-        user = db.query(User).filter(User.id == uid).first()
+        cached = user_cache.get(uid)
+        if cached is not None:
+            return cached
+
+    generation = user_cache.generation()
+    with SessionLocal() as db:
+        if uid is not None:
+            user = db.query(User).filter(User.id == uid).first()
 
-    if user is None and email:
-        token_data = TokenData(email=email)
-        user = db.query(User).filter(User.email == token_data.email).first()
+        if user is None and email:
+            token_data = TokenData(email=email)
+            user = db.query(User).filter(User.email == token_data.email).first()
 
     if user is None:
         raise credentials_exception
 
+    user_cache.put(user, generation)
     return user
 
 
@@ -74,11 +114,39 @@ def register_disabled():
     )
 
 
+def _find_user_by_email(db: Session, email: str) -> User | None:
+    return db.query(User).filter(User.email == email).first()
+
+
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
+async def login(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Session = Depends(get_db),
+):
+    # refus avant tout hachage (core/rate_limit)
+    client_ip = _client_ip(request)
+    retry_after = login_limiter.attempt(client_ip, form_data.username)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Trop de tentatives de connexion. Réessayez plus tard.",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.5)))},
+        )
+
+    user = await run_in_threadpool(_find_user_by_email, db, form_data.username)
+
+    try:
+        password_ok = bool(user) and await verify_password_async(form_data.password, user.hashed_password)
+    except PasswordPoolBusy:
+        login_limiter.refund(client_ip, form_data.username)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Serveur d'authentification saturé. Réessayez dans quelques secondes.",
+            headers={"Retry-After": "2"},
+        )
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou mot de passe incorrect",
@@ -91,6 +159,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
             detail="Compte inactif. Veuillez contacter un administrateur."
         )
 
+    login_limiter.succeeded(client_ip, form_data.username)
     access_token = create_access_token(
         data={
             "sub": user.email,
@@ -1,8 +1,8 @@
 # Backend/routes/croisement.py
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 
+from core.search import text_search
 from database.connection import get_db
 from models.croisement import VCroisement
 
@@ -27,11 +27,9 @@ def list_croisement(
     db: Session = Depends(get_db),
 ):
     query = db.query(VCroisement)
-    if q:
-        query = query.filter(or_(
-            VCroisement.ot_key.ilike(f"%{q}%"),
-            VCroisement.nd_global.ilike(f"%{q}%"),
-        ))
+    needle = (q or "").strip()
+    if needle:
+        query = query.filter(text_search((VCroisement.ot_key, VCroisement.nd_global), needle))
     if statut_pidi:
         query = query.filter(VCroisement.statut_pidi.ilike(f"%{statut_pidi}%"))
 
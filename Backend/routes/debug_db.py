@@ -1,13 +1,24 @@
 # Backend/routes/debug_db.py
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from fastapi.encoders import jsonable_encoder
 import inspect
+import time
 import traceback
 
 from database.connection import get_db
+from models.ref_factregle import RefFactRegle
 from models.regle_facturation import RegleFacturation
+from models.user import User
+from repositories.billing_rules_repo import (
+    BillingLookup,
+    FacturationInput,
+    _split_codes,
+    compute_facturation,
+    compute_facturation_batch,
+)
+from routes.auth import require_admin
 from schemas.regle_facturation import RegleFacturationOut
 
 router = APIRouter(prefix="/api/_debug", tags=["debug"])
@@ -73,3 +84,51 @@ def debug_regle(code: str, db: Session = Depends(get_db)):
             "error": repr(e),
             "traceback": traceback.format_exc(),
         })
+
+
+def _bench_items(db: Session, n: int) -> list[FacturationInput]:
+    # combinaisons réelles (chaque code clôture de chaque règle) + cas sans règle
+    items: list[FacturationInput] = []
+    for rule in db.query(RefFactRegle).order_by(RefFactRegle.id):
+        is_plp = rule.plp == "PLP"
+        for code in sorted(_split_codes(rule.codes_cloture_facturable)) or ["XXX"]:
+            items.append(FacturationInput(rule.code_activite, rule.code_produit, is_plp, rule.code_activite, code))
+            items.append(FacturationInput(rule.code_activite, rule.code_produit, not is_plp, rule.code_activite, code))
+    items.append(FacturationInput("?", "?", False, "?", "XXX"))
+    return (items * (n // len(items) + 1))[:n]
+
+
+@router.get("/bench-facturation")
+def bench_facturation(
+    n: int = Query(1000, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin),
+):
+    """
+    compute_facturation unitaire (2 requêtes / dossier) vs compute_facturation_batch.
+    Réservé aux admins et plafonné: le chemin unitaire charge la base.
+    """
+    items = _bench_items(db, n)
+
+    t0 = time.perf_counter()
+    per_row = [compute_facturation(db, *it) for it in items]
+    per_row_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    lookup = BillingLookup(db)
+    load_s = time.perf_counter() - t0
+    batch = compute_facturation_batch(db, items, lookup)
+    batch_s = time.perf_counter() - t0
+
+    mismatches = [i for i, (a, b) in enumerate(zip(per_row, batch)) if a != b]
+    return {
+        "items": len(items),
+        "rules": len(lookup.rules),
+        "remu_codes": len(lookup.remu),
+        "per_row_s": round(per_row_s, 4),
+        "batch_s": round(batch_s, 4),
+        "batch_load_s": round(load_s, 4),
+        "speedup": round(per_row_s / batch_s, 1) if batch_s else None,
+        "mismatches": len(mismatches),
+        "mismatch_samples": [{"input": items[i], "per_row": per_row[i], "batch": batch[i]} for i in mismatches[:5]],
+    }
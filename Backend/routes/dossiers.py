@@ -1,18 +1,39 @@
 # Backend/routes/dossiers.py
 from __future__ import annotations
 
-import io
+import base64
 import json
 import re
+from datetime import datetime
+from decimal import Decimal
 from typing import Any
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from fastapi.responses import StreamingResponse
-from sqlalchemy import case, or_
+from sqlalchemy import Boolean, DateTime, Integer, Numeric, case, extract, func, literal, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import Session
 
+from core.exports import (
+    CSV_MEDIA_TYPE,
+    EXPORT_FETCH_SIZE,
+    PARQUET_MEDIA_TYPE,
+    discard_export_path,
+    new_export_path,
+    new_write_only_workbook,
+    temp_file_response,
+    xlsx_file_response,
+)
+from core.search import text_search
+from database.bulk import copy_out_chunks
 from database.connection import get_db
-from models.dossiers_facturable import VDossierFacturable
+from models.dossiers_facturable import DossierFacturableProj
+from repositories.dossier_projection_repo import (
+    VIEW_COLUMNS,
+    ensure_readable,
+    projection_status,
+    refresh_projection,
+)
 from schemas.dossier_facturable import DossierFacturable
 
 # --- NOUVEAU: Imports dyal l'Auth ---
@@ -24,6 +45,107 @@ router = APIRouter(prefix="/api/dossiers", tags=["dossiers"])
 
 _TOKEN_RE = re.compile(r"\b[A-Z]{2,}[A-Z0-9]{0,12}\b")
 
+# --------------------
+# Tri des dossiers (même ordre que l'index ix_dossier_facturable_proj_keyset)
+# --------------------
+STATUT_FINAL_RANK = {
+    "FACTURABLE": 1,
+    "CONDITIONNEL": 2,
+    "NON_FACTURABLE": 3,
+    "A_VERIFIER": 4,
+}
+STATUT_FINAL_RANK_DEFAULT = 5
+
+MOTIF_VERIFICATION_RANK = {"CROISEMENT_INCOMPLET": 1}
+MOTIF_VERIFICATION_RANK_DEFAULT = 2
+
+# generated_at DESC NULLS LAST <=> -epoch ASC, les NULL rangés après toute date réelle
+GENERATED_AT_NULL_KEY = Decimal("1e15")
+
+
+def _rank_case(col, ranks: dict[str, int], default: int):
+    return case(*[(col == k, v) for k, v in ranks.items()], else_=default)
+
+
+def _generated_key(col):
+    return func.coalesce(-extract("epoch", col), literal(GENERATED_AT_NULL_KEY, Numeric))
+
+
+def _sort_key_columns(model=DossierFacturableProj) -> tuple:
+    # toutes les composantes sont ASC -> comparaison de tuple possible pour le keyset
+    return (
+        _rank_case(model.statut_final, STATUT_FINAL_RANK, STATUT_FINAL_RANK_DEFAULT),
+        _rank_case(model.motif_verification, MOTIF_VERIFICATION_RANK, MOTIF_VERIFICATION_RANK_DEFAULT),
+        _generated_key(model.generated_at),
+        model.key_match,
+    )
+
+
+def _encode_cursor(r: Any) -> str:
+    gen = getattr(r, "generated_at", None)
+    payload = [
+        STATUT_FINAL_RANK.get(r.statut_final, STATUT_FINAL_RANK_DEFAULT),
+        MOTIF_VERIFICATION_RANK.get(r.motif_verification, MOTIF_VERIFICATION_RANK_DEFAULT),
+        gen.isoformat() if gen is not None else None,
+        r.key_match,
+    ]
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[int, int, datetime | None, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        r1, r2, gen, key = json.loads(raw.decode("utf-8"))
+        return int(r1), int(r2), (datetime.fromisoformat(gen) if gen else None), str(key)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+
+def _after_cursor(qs, cursor: str):
+    r1, r2, gen, key = _decode_cursor(cursor)
+    gen_key = _generated_key(literal(gen)) if gen is not None else literal(GENERATED_AT_NULL_KEY, Numeric)
+    return qs.filter(tuple_(*_sort_key_columns()) > tuple_(literal(r1), literal(r2), gen_key, literal(key)))
+
+
+def _export_filename(ext: str, q: str | None, statut: str | None, croisement: str | None, ppd: str | None) -> str:
+    filename_parts = ["dossiers"]
+    if statut:
+        filename_parts.append(f"statut_{statut}")
+    if croisement:
+        filename_parts.append(f"croisement_{croisement}")
+    if ppd:
+        filename_parts.append(f"ppd_{ppd}")
+    if q:
+        clean_q = re.sub(r"[^\w\-_]", "_", q)[:30]
+        filename_parts.append(f"search_{clean_q}")
+
+    return "_".join(filename_parts) + "." + ext
+
+
+def _export_columns() -> list:
+    # colonnes de la vue (hors row_hash / refreshed_at propres à la projection)
+    return [getattr(DossierFacturableProj, c) for c in VIEW_COLUMNS]
+
+
+def _arrow_type(pa, t):
+    if isinstance(t, Boolean):
+        return pa.bool_()
+    if isinstance(t, Integer):
+        return pa.int64()
+    if isinstance(t, DateTime):
+        return pa.timestamp("us")
+    if isinstance(t, ARRAY):
+        return pa.list_(pa.string())
+    return pa.string()  # Text, JSONB (sérialisé)
+
+
+def _arrow_batch(pa, schema, rows: list[Any], jsonb_idx: list[int]):
+    columns = [list(col) for col in zip(*rows)]
+    for i in jsonb_idx:
+        columns[i] = [json.dumps(v, ensure_ascii=False) if v is not None else None for v in columns[i]]
+    return pa.record_batch(columns, schema=schema)
+
 
 def _excel_cell(v: Any) -> str:
     if v is None:
@@ -69,68 +191,103 @@ def _base_query(
     croisement: str | None,
     ppd: str | None,
     current_user: User,  # <-- NOUVEAU: Kanpassiw l'user l'moteur dyal recherche
+    search_mode: str = "auto",
+    response: Response | None = None,
 ):
-    qs = db.query(VDossierFacturable)
+    # lecture sur la projection matérialisée: construite ici si elle ne l'a
+    # jamais été, sinon servie en l'état (stale -> recalcul en arrière-plan,
+    # cf. GET /projection)
+    stale = ensure_readable(db, current_user.id)
+    if response is not None:
+        response.headers["X-Projection-Stale"] = "true" if stale else "false"
+    qs = db.query(DossierFacturableProj)
 
     # --- NOUVEAU: L'ISOLATION DES DONNÉES ---
     # L'backend ghadi yjbed ghir les dossiers li user_id dyalhom kay-sawi id dyal l'user connecte
-    qs = qs.filter(VDossierFacturable.user_id == current_user.id)
+    qs = qs.filter(DossierFacturableProj.user_id == current_user.id)
     # ----------------------------------------
 
     if q:
         needle = q.strip()
         if needle:
             qs = qs.filter(
-                or_(
-                    VDossierFacturable.ot_key.ilike(f"%{needle}%"),
-                    VDossierFacturable.nd_global.ilike(f"%{needle}%"),
-                    VDossierFacturable.key_match.ilike(f"%{needle}%"),
+                text_search(
+                    (DossierFacturableProj.ot_key, DossierFacturableProj.nd_global, DossierFacturableProj.key_match),
+                    needle,
+                    search_mode,
                 )
             )
 
     if statut:
-        qs = qs.filter(VDossierFacturable.statut_final == statut)
+        qs = qs.filter(DossierFacturableProj.statut_final == statut)
 
     if croisement:
-        qs = qs.filter(VDossierFacturable.statut_croisement == croisement)
+        qs = qs.filter(DossierFacturableProj.statut_croisement == croisement)
 
     if ppd:
         needle_ppd = ppd.strip()
         if needle_ppd:
-            qs = qs.filter(VDossierFacturable.numero_ppd.ilike(f"%{needle_ppd}%"))
-
-    qs = qs.order_by(
-        case(
-            (VDossierFacturable.statut_final == "FACTURABLE", 1),
-            (VDossierFacturable.statut_final == "CONDITIONNEL", 2),
-            (VDossierFacturable.statut_final == "NON_FACTURABLE", 3),
-            (VDossierFacturable.statut_final == "A_VERIFIER", 4),
-            else_=5,
-        ).asc(),
-        case(
-            (VDossierFacturable.motif_verification == "CROISEMENT_INCOMPLET", 1),
-            else_=2,
-        ).asc(),
-        VDossierFacturable.generated_at.desc().nullslast(),
-        VDossierFacturable.key_match.asc(),
-    )
+            qs = qs.filter(text_search((DossierFacturableProj.numero_ppd,), needle_ppd, "contains"))
+
+    # statut_final, motif_verification, generated_at DESC NULLS LAST, key_match
+    qs = qs.order_by(*_sort_key_columns())
 
     return qs
 
 
 @router.get("/", response_model=list[DossierFacturable])
 def get_dossiers(
+    response: Response,
     q: str | None = None,
     statut: str | None = None,
     croisement: str | None = None,
     ppd: str | None = None,
+    search_mode: str = Query("auto", pattern="^(auto|contains|prefix)$", description="auto: préfixe si q ressemble à un OT/ND"),
     limit: int = Query(50, ge=1, le=5000),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None, description="Curseur opaque (en-tête X-Next-Cursor de la page précédente)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),  # <-- NOUVEAU: Le Videur 
 ):
-    qs = _base_query(db, q=q, statut=statut, croisement=croisement, ppd=ppd, current_user=current_user)
-    return qs.limit(limit).offset(offset).all()
+    qs = _base_query(
+        db, q=q, statut=statut, croisement=croisement, ppd=ppd, current_user=current_user, search_mode=search_mode,
+        response=response,
+    )
+
+    if cursor:
+        if offset:
+            raise HTTPException(status_code=400, detail="cursor et offset sont exclusifs")
+        rows = _after_cursor(qs, cursor).limit(limit).all()
+    else:
+        rows = qs.limit(limit).offset(offset).all()
+
+    # page pleine -> il peut rester des lignes: on expose le curseur de la suivante
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1])
+
+    return rows
+
+
+@router.get("/projection")
+def get_projection_status(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    return projection_status(db, current_user.id)
+
+
+@router.post("/projection/refresh")
+def force_projection_refresh(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    try:
+        stats = refresh_projection(db, user_id=current_user.id)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Erreur rafraîchissement projection: {e}")
+    return {**projection_status(db, current_user.id), "refresh": stats}
 
 
 @router.get("/export.xlsx")
@@ -143,15 +300,13 @@ def export_dossiers_xlsx(
     current_user: User = Depends(get_current_user),  # <-- NOUVEAU: Le Videur
 ):
     qs = _base_query(db, q=q, statut=statut, croisement=croisement, ppd=ppd, current_user=current_user)
-    rows = qs.all()
 
-    from openpyxl import Workbook
-    from openpyxl.styles import Alignment
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font
     from openpyxl.utils import get_column_letter
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "dossiers"
+    wb = new_write_only_workbook()
+    ws = wb.create_sheet("dossiers")
 
     headers = [
         "key_match",
@@ -192,14 +347,23 @@ def export_dossiers_xlsx(
         "compte_rendu",
         "phrase_declencheuse",
     ]
-    ws.append(headers)
-
-    for col_idx in range(1, len(headers) + 1):
-        cell = ws.cell(row=1, column=col_idx)
-        cell.font = cell.font.copy(bold=True)
-        cell.alignment = Alignment(wrap_text=True)
+    # write_only: largeurs et volets figés avant la première ligne
+    for col_idx, h in enumerate(headers, start=1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = min(60, max(8, len(h) + 2))
+    ws.freeze_panes = "A2"
 
-    for r in rows:
+    header_font = Font(bold=True)
+    header_alignment = Alignment(wrap_text=True)
+    header_cells = []
+    for h in headers:
+        cell = WriteOnlyCell(ws, value=h)
+        cell.font = header_font
+        cell.alignment = header_alignment
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    # curseur serveur: les lignes arrivent par paquets, jamais toutes en mémoire
+    for r in qs.yield_per(EXPORT_FETCH_SIZE):
         ws.append([
             _excel_cell(getattr(r, "key_match", None)),
             _excel_cell(getattr(r, "ot_key", None)),
@@ -240,31 +404,64 @@ def export_dossiers_xlsx(
             _excel_cell(getattr(r, "phrase_declencheuse", None)),
         ])
 
-    for col_idx in range(1, len(headers) + 1):
-        col_letter = get_column_letter(col_idx)
-        ws.column_dimensions[col_letter].width = min(60, max(8, len(headers[col_idx - 1]) + 2))
-
-    ws.freeze_panes = "A2"
+    return xlsx_file_response(wb, _export_filename("xlsx", q, statut, croisement, ppd))
 
-    bio = io.BytesIO()
-    wb.save(bio)
-    bio.seek(0)
 
-    filename_parts = ["dossiers"]
-    if statut:
-        filename_parts.append(f"statut_{statut}")
-    if croisement:
-        filename_parts.append(f"croisement_{croisement}")
-    if ppd:
-        filename_parts.append(f"ppd_{ppd}")
-    if q:
-        clean_q = re.sub(r"[^\w\-_]", "_", q)[:30]
-        filename_parts.append(f"search_{clean_q}")
+@router.get("/export.csv")
+def export_dossiers_csv(
+    q: str | None = None,
+    statut: str | None = None,
+    croisement: str | None = None,
+    ppd: str | None = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    qs = _base_query(db, q=q, statut=statut, croisement=croisement, ppd=ppd, current_user=current_user)
 
-    filename = "_".join(filename_parts) + ".xlsx"
+    # mêmes filtres / tri que la liste, compilés puis exécutés par COPY TO STDOUT
+    compiled = qs.with_entities(*_export_columns()).statement.compile(dialect=db.get_bind().dialect)
+    filename = _export_filename("csv", q, statut, croisement, ppd)
 
     return StreamingResponse(
-        bio,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        copy_out_chunks(str(compiled), dict(compiled.params)),
+        media_type=CSV_MEDIA_TYPE,
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
+
+
+@router.get("/export.parquet")
+def export_dossiers_parquet(
+    q: str | None = None,
+    statut: str | None = None,
+    croisement: str | None = None,
+    ppd: str | None = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Export parquet indisponible: pyarrow n'est pas installé")
+
+    qs = _base_query(db, q=q, statut=statut, croisement=croisement, ppd=ppd, current_user=current_user)
+    cols = _export_columns()
+    schema = pa.schema([(c.name, _arrow_type(pa, c.type)) for c in cols])
+    jsonb_idx = [i for i, c in enumerate(cols) if isinstance(c.type, JSONB)]
+
+    path = new_export_path(".parquet")
+    try:
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            batch: list[Any] = []
+            for row in qs.with_entities(*cols).yield_per(EXPORT_FETCH_SIZE):
+                batch.append(row)
+                if len(batch) >= EXPORT_FETCH_SIZE:
+                    writer.write_batch(_arrow_batch(pa, schema, batch, jsonb_idx))
+                    batch = []
+            if batch:
+                writer.write_batch(_arrow_batch(pa, schema, batch, jsonb_idx))
+    except Exception:
+        discard_export_path(path)
+        raise
+
+    return temp_file_response(path, _export_filename("parquet", q, statut, croisement, ppd), PARQUET_MEDIA_TYPE)
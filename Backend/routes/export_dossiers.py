@@ -1,36 +1,23 @@
 # backend/routes/export_dossiers.py
 from __future__ import annotations
 
-from io import BytesIO
 from typing import Optional
 import re
 
 from fastapi import APIRouter, Depends, Query
-from fastapi.responses import StreamingResponse
-from openpyxl import Workbook
+from fastapi.responses import JSONResponse
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, Font, PatternFill
 from openpyxl.utils import get_column_letter
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from core.exports import EXPORT_FETCH_SIZE, new_write_only_workbook, xlsx_file_response
 from database.connection import get_db
 
 router = APIRouter(prefix="/api/dossiers", tags=["dossiers-export"])
 
 
-def _autosize_columns(ws):
-    for col_idx in range(1, ws.max_column + 1):
-        max_len = 0
-        col_letter = get_column_letter(col_idx)
-        for row_idx in range(1, min(ws.max_row, 2000) + 1):
-            v = ws.cell(row=row_idx, column=col_idx).value
-            if v is None:
-                continue
-            s = str(v)
-            max_len = max(max_len, len(s))
-        ws.column_dimensions[col_letter].width = min(max(10, max_len + 2), 60)
-
-
 def _excel_safe(v):
     if v is None:
         return None
@@ -57,6 +44,11 @@ def _get_status_color(statut: str) -> str:
     return colors.get(statut, "FFFFFF")
 
 
+def _status_fill(statut: str) -> PatternFill:
+    color = _get_status_color(statut)
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+
 def _clean_filename(filename: str) -> str:
     """Nettoie le nom de fichier pour enlever les caractères problématiques"""
     # Remplacer les caractères non alphanumériques par des underscores
@@ -152,14 +144,14 @@ def export_dossiers_xlsx(
             """
         )
 
+        # curseur serveur: les lignes arrivent par paquets de EXPORT_FETCH_SIZE
         rows = db.execute(
-            sql,
+            sql.execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE),
             {"statut": statut_final, "croisement": statut_croisement, "ppd": ppd, "limit": limit},
-        ).mappings().all()
+        ).mappings()
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Dossiers"
+        wb = new_write_only_workbook()
+        ws = wb.create_sheet("Dossiers")
 
         headers = [
             "OT", "ND", "PPD", "Attachement", "Act", "Prod", "Code cible", "Clôture",
@@ -171,20 +163,27 @@ def export_dossiers_xlsx(
             "Articles PIDI (brut)", "Articles APP (parsés)", "Articles attendus (règle)",
             "Palier", "Palier phrase", "Compte-rendu", "Evenements (extrait)"
         ]
-        ws.append(headers)
+
+        # write_only: largeurs fixes (plus de passe d'autosize) et volets avant la 1re ligne
+        for c, h in enumerate(headers, start=1):
+            ws.column_dimensions[get_column_letter(c)].width = min(max(10, len(h) + 2), 60)
+        ws.freeze_panes = "A2"
+        ws.row_dimensions[1].height = 30
 
         header_font = Font(bold=True, color="FFFFFF")
         header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
         header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
 
-        for c in range(1, len(headers) + 1):
-            cell = ws.cell(row=1, column=c)
+        header_cells = []
+        for h in headers:
+            cell = WriteOnlyCell(ws, value=h)
             cell.font = header_font
             cell.fill = header_fill
             cell.alignment = header_alignment
+            header_cells.append(cell)
+        ws.append(header_cells)
 
-        ws.row_dimensions[1].height = 30
-
+        n_rows = 0
         for r in rows:
             row_data = [
                 _excel_safe(r.get("ot_key")),
@@ -219,31 +218,20 @@ def export_dossiers_xlsx(
                 _excel_safe(r.get("evenements_extrait")),
             ]
 
-            row_num = ws.max_row + 1
-            ws.append(row_data)
-
             if r.get("statut_final"):
-                ws.cell(row=row_num, column=15).fill = PatternFill(
-                    start_color=_get_status_color(r["statut_final"]),
-                    end_color=_get_status_color(r["statut_final"]),
-                    fill_type="solid",
-                )
+                cell = WriteOnlyCell(ws, value=row_data[14])
+                cell.fill = _status_fill(r["statut_final"])
+                row_data[14] = cell
 
             if r.get("statut_croisement"):
-                ws.cell(row=row_num, column=18).fill = PatternFill(
-                    start_color=_get_status_color(r["statut_croisement"]),
-                    end_color=_get_status_color(r["statut_croisement"]),
-                    fill_type="solid",
-                )
+                cell = WriteOnlyCell(ws, value=row_data[17])
+                cell.fill = _status_fill(r["statut_croisement"])
+                row_data[17] = cell
 
-        ws.freeze_panes = "A2"
-        ws.auto_filter.ref = ws.dimensions
-        _autosize_columns(ws)
+            ws.append(row_data)
+            n_rows += 1
 
-        # Sauvegarder dans un buffer
-        bio = BytesIO()
-        wb.save(bio)
-        bio.seek(0)
+        ws.auto_filter.ref = f"A1:{get_column_letter(len(headers))}{n_rows + 1}"
 
         # Construire le nom de fichier
         filename_parts = ["dossiers"]
@@ -260,16 +248,10 @@ def export_dossiers_xlsx(
         filename = _clean_filename(filename)
 
         # CRITIQUE: Configurer correctement les headers
-        headers = {
-            "Content-Disposition": f'attachment; filename="{filename}"',
-            "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            "Access-Control-Expose-Headers": "Content-Disposition",  # Important pour le frontend
-        }
-
-        return StreamingResponse(
-            bio,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers=headers,
+        return xlsx_file_response(
+            wb,
+            filename,
+            headers={"Access-Control-Expose-Headers": "Content-Disposition"},  # Important pour le frontend
         )
     
     except Exception as e:
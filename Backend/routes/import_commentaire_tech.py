@@ -15,6 +15,7 @@ from routes.auth import get_current_user
 from models.user import User
 from models.raw_praxedo_cr10 import RawPraxedoCr10
 from database.connection import get_db
+from repositories.dossier_projection_repo import dossier_keys, refresh_user_after_write
 
 router = APIRouter(prefix="/api/import", tags=["imports"])
 
@@ -240,6 +241,10 @@ async def import_commentaire_tech_cr10(
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+    projection = refresh_user_after_write(
+        db, current_user.id, "import_commentaire_tech", dossier_keys(r["id_externe"] for r in rows_list)
+    )
+
     return {
         "ok": True,
         "message": "Import commentaire tech -> raw.praxedo_cr10 terminé",
@@ -249,4 +254,5 @@ async def import_commentaire_tech_cr10(
         "with_palier": with_palier,
         "with_compte_rendu": with_compte_rendu,
         "delimiter_used": "\\t" if sep == "\t" else sep,
+        "projection": projection,
     }
\ No newline at end of file
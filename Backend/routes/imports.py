@@ -9,18 +9,33 @@ import math
 import unicodedata
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
+from functools import partial
 from io import TextIOWrapper
-from typing import Any
+from typing import Any, BinaryIO
 from collections.abc import Iterator
 
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
+from core.import_jobs import (
+    ImportCancelled,
+    ImportProgress,
+    ImportRunner,
+    get_import_job,
+    list_import_jobs,
+    spool_upload,
+    submit_import_job,
+)
+from core.summary_cache import compare_summary_cache
 from database.connection import get_db
+from database.bulk import copy_rows
 from models.raw_praxedo import RawPraxedo
-from models.raw_pidi import RawPidi
 from models.raw_praxedo_cr10 import RawPraxedoCr10
+from repositories.dossier_projection_repo import dossier_keys, refresh_user_after_write
 
 from routes.auth import get_current_user
 from models.user import User
@@ -66,14 +81,6 @@ def _norm(s: str) -> str:
     return s.strip("_")
 
 
-def _val(h: dict[str, Any], *keys: str) -> str | None:
-    for k in keys:
-        v = h.get(k)
-        if v is not None and str(v).strip() != "":
-            return str(v).strip()
-    return None
-
-
 def _fix_mojibake(s: str | None) -> str | None:
     if not s:
         return s
@@ -93,58 +100,6 @@ def _clean_text(s: str | None) -> str | None:
     return out if out and out.strip() != "" else None
 
 
-def _pick_first(old: str | None, new: str | None) -> str | None:
-    if old is not None and str(old).strip() != "":
-        return old
-    if new is not None and str(new).strip() != "":
-        return new
-    return None
-
-
-def _merge_articles(old: str | None, new: str | None) -> str | None:
-    a = _clean_text(old)
-    b = _clean_text(new)
-    if not a and not b:
-        return None
-    if a and not b:
-        return a
-    if b and not a:
-        return b
-
-    def split_items(x: str) -> list[str]:
-        parts = re.split(r"[,\n;|]+", x)
-        return [p.strip() for p in parts if p and p.strip()]
-
-    sa = split_items(a or "")
-    sb = split_items(b or "")
-    seen = set()
-    merged: list[str] = []
-    for it in sa + sb:
-        key = it.lower()
-        if key in seen:
-            continue
-        seen.add(key)
-        merged.append(it)
-    return ", ".join(merged) if merged else (a or b)
-
-
-def _normalize_row(r: dict[str, Any]) -> dict[str, Any]:
-    out: dict[str, Any] = {}
-    for k, v in r.items():
-        if k is None:
-            continue
-        nk = _norm(k)
-        vv = v.strip() if isinstance(v, str) else v
-
-        if nk in out and str(out.get(nk) or "").strip() != "":
-            continue
-        if str(vv or "").strip() == "" and nk in out:
-            continue
-
-        out[nk] = vv
-    return out
-
-
 def _sa_only_known_columns(model_cls, payload: dict) -> dict:
     allowed = set(model_cls.__table__.columns.keys())
     return {k: v for k, v in payload.items() if k in allowed}
@@ -166,16 +121,16 @@ def _digits_only(v: str | None) -> str | None:
     return s if s else None
 
 
-def _detect_delimiter(file: UploadFile, requested: str) -> str:
+def _detect_delimiter(fh: BinaryIO, requested: str) -> str:
     try:
-        pos = file.file.tell()
+        pos = fh.tell()
     except Exception:
         pos = None
 
     try:
-        head = file.file.read(8192)
+        head = fh.read(8192)
         if pos is not None:
-            file.file.seek(pos)
+            fh.seek(pos)
 
         txt = head.decode("utf-8-sig", errors="ignore")
         first = (txt.splitlines()[0] if txt else "")
@@ -205,15 +160,15 @@ def _detect_delimiter(file: UploadFile, requested: str) -> str:
         return requested
 
 
-def _read_header_and_reader(file: UploadFile, delimiter: str):
+def _read_header_and_reader(fh: BinaryIO, delimiter: str):
     try:
-        file.file.seek(0)
+        fh.seek(0)
     except Exception:
         pass
 
-    text = TextIOWrapper(file.file, encoding="utf-8-sig", errors="ignore", newline="")
-    reader = csv.DictReader(text, delimiter=delimiter)
-    raw_headers = reader.fieldnames or []
+    text = TextIOWrapper(fh, encoding="utf-8-sig", errors="ignore", newline="")
+    reader = csv.reader(text, delimiter=delimiter)
+    raw_headers = next(reader, None) or []
     norm_headers = [_norm(h) for h in raw_headers]
     return raw_headers, norm_headers, reader
 
@@ -295,61 +250,170 @@ PRAXEDO_CR10_REQUIRED = {
 }
 
 
-def _find_value_by_header_like(raw_row: dict[str, Any], *contains_all: str) -> str | None:
+# --------------------
+# Plan de colonnes: les en-têtes sont fixes pour tout le fichier, on résout
+# une seule fois alias / recherches floues en indices de colonnes.
+# --------------------
+ColumnPlan = dict[str, Any]
+
+PRAXEDO_FIELDS: dict[str, tuple[str, ...]] = {
+    "numero": ("numero", "n", "no", "ot", "numero_ot", "ot_key"),
+    "desc_site": ("desc_site", "desc__site"),
+    "description": ("description",),
+    "compte_rendu": ("compte_rendu", "compterendu", "compte__rendu", "compte_rendu_", "compte_rendu_praxedo"),
+    "statut": ("statut",),
+    "planifiee": ("planifiee", "planifiee_au", "date_planifiee"),
+    "nom_technicien": ("nom_technicien", "technicien"),
+    "prenom_technicien": ("prenom_technicien",),
+    "equipiers": ("equipiers",),
+    "nd": ("nd",),
+    "act_prod": ("act_prod", "activite_produit", "act_prod_code"),
+    "code_intervenant": ("code_intervention", "code_intervenant", "code_interven", "code_interv"),
+    "cp": ("cp",),
+    "ville_site": ("ville_site", "ville"),
+    "csv_extra": ("csv_extra",),
+}
+
+PRAXEDO_LIKE: dict[str, tuple[tuple[str, ...], ...]] = {
+    "desc_site_like": (("desc", "site"), ("infos", "site")),
+    "compte_rendu_like": (("compte", "rendu"), ("compte-rendu",)),
+}
+
+PIDI_FIELDS: dict[str, tuple[str, ...]] = {
+    "numero_flux_pidi": ("n_de_flux_pidi", "n_flux_pidi", "numero_flux_pidi", "flux_pidi"),
+    "contrat": ("contrat",),
+    "type_pidi": ("type", "type_pidi", "type_attachement", "type_d_attachement"),
+    "statut": ("statut", "statut_attachement"),
+    "nd": ("nd", "n_d", "ndi", "n_di", "numero_di", "numero_de_di"),
+    "code_secteur": ("code_secteur", "secteur"),
+    "numero_ot": ("numero_ot", "n_ot", "ot", "ot_key", "numero_de_l_ot", "numero_intervention"),
+    "numero_att": ("numero_att", "n_att", "n_att_", "n_attachement", "numero_attachement"),
+    "oeie": ("oeie",),
+    "code_gestion_chantier": ("code_gestion_chantier", "code_gestion", "codes_chantier_de_gestion"),
+    "agence": ("agence",),
+    "liste_articles": ("liste_des_articles", "liste_articles", "liste_d_articles", "article"),
+    "numero_ppd": ("n_ppd", "numero_ppd", "ppd", "n_pdd", "numero_pdd", "n__ppd"),
+    "attachement_valide": ("attachement_valide", "attachement_validee", "attachement_valide_le", "attachement_valide_at"),
+    "bordereau": ("bordereau",),
+    "ht": ("ht", "montant_ht", "prix_majore", "prix", "prix_majoré"),
+    "n_cac": ("n_cac", "numero_cac", "cac", "n_cac_"),
+    "comment_acqui_rejet": ("comment_acqui_rejet", "commentaire_acqui_rejet", "comment_acqui_rejet_pidi"),
+    "cause_acqui_rejet": ("cause_acqui_rejet", "cause_acqui_rejet_pidi"),
+}
+
+PRAXEDO_CR10_FIELDS: dict[str, tuple[str, ...]] = {
+    "ot": ("id_externe_ot", "id_externe", "idexterne", "id_externe_"),
+    "nom_site": ("nom_site", "nom_du_site", "site", "nomsite"),
+    "compte_rendu": ("compte_rendu", "compterendu", "compte_rendu_"),
+    "evenements": ("evenements", "evenement", "events"),
+    "palier": ("palier", "pallier", "niveau", "tier"),
+}
+
+PRAXEDO_CR10_LIKE: dict[str, tuple[tuple[str, ...], ...]] = {
+    "ot_like": (("id", "externe"),),
+    "nom_site_like": (("nom", "site"),),
+    "compte_rendu_like": (("compte", "rendu"),),
+    "evenements_like": (("evenement",),),
+}
+
+CLOTURE_DIRECT_KEYS = (
+    "code_cloture_code", "code_cloture", "cloture", "etat_cloture",
+    "code_intervention", "code_intervenant", "code_interven", "code_interv",
+)
+
+CLOTURE_CODE_RE = re.compile(r"\b([A-Z]{3})\b")
+
+
+def _effective_columns(raw_headers: list[str]) -> dict[str, int]:
+    # comme csv.DictReader: en cas d'en-tête dupliqué, la dernière colonne gagne
+    last: dict[str, int] = {}
+    for idx, h in enumerate(raw_headers):
+        last[h] = idx
+    return last
+
+
+def _header_groups(raw_headers: list[str]) -> dict[str, tuple[int, ...]]:
+    # en-tête normalisé -> colonnes (ordre du fichier); la 1re valeur non vide gagne
+    groups: dict[str, list[int]] = {}
+    for h, idx in _effective_columns(raw_headers).items():
+        groups.setdefault(_norm(h), []).append(idx)
+    return {k: tuple(v) for k, v in groups.items()}
+
+
+def _cols_like(raw_headers: list[str], *contains_all: str) -> tuple[int, ...]:
     wants = [w.lower() for w in contains_all]
-    for k, v in raw_row.items():
-        if not k or v is None:
-            continue
-        lk = str(k).lower()
-        if all(w in lk for w in wants):
-            s = str(v).strip()
-            if s != "":
-                return s
+    return tuple(
+        idx for h, idx in _effective_columns(raw_headers).items()
+        if h and all(w in str(h).lower() for w in wants)
+    )
+
+
+def _build_plan(
+    raw_headers: list[str],
+    fields: dict[str, tuple[str, ...]],
+    like: dict[str, tuple[tuple[str, ...], ...]] | None = None,
+) -> ColumnPlan:
+    groups = _header_groups(raw_headers)
+    plan: ColumnPlan = {}
+    for name, keys in fields.items():
+        plan[name] = tuple(idx for k in keys for idx in groups.get(k, ()))
+    for name, patterns in (like or {}).items():
+        plan[name] = tuple(idx for pat in patterns for idx in _cols_like(raw_headers, *pat))
+    return plan
+
+
+def _cloture_plan(raw_headers: list[str]) -> ColumnPlan:
+    groups = _header_groups(raw_headers)
+    return {
+        "cloture_direct": tuple(idx for k in CLOTURE_DIRECT_KEYS for idx in groups.get(k, ())),
+        "cloture_hint_groups": tuple(
+            g for nk, g in groups.items()
+            if ("clotur" in nk) or ("interven" in nk) or ("clot" in nk)
+        ),
+        "all_groups": tuple(groups.values()),
+    }
+
+
+def _rv(row: list[str], cols: tuple[int, ...]) -> str | None:
+    n = len(row)
+    for idx in cols:
+        if idx < n:
+            v = row[idx].strip()
+            if v:
+                return v
     return None
 
 
-def _guess_cloture(h: dict[str, Any]) -> str | None:
-    direct = _val(
-        h,
-        "code_cloture_code", "code_cloture", "cloture", "etat_cloture",
-        "code_intervention", "code_intervenant", "code_interven", "code_interv",
-    )
+def _match_cloture(v: str) -> str | None:
+    vv = v.strip().upper()
+    if vv in CLOTURE_CODES:
+        return vv
+    m = CLOTURE_CODE_RE.search(vv)
+    if m and m.group(1) in CLOTURE_CODES:
+        return m.group(1)
+    return None
+
+
+def _guess_cloture(row: list[str], plan: ColumnPlan) -> str | None:
+    direct = _rv(row, plan["cloture_direct"])
     if direct:
-        d = direct.strip().upper()
-        if d in CLOTURE_CODES:
-            return d
-        m = re.search(r"\b([A-Z]{3})\b", d)
-        if m and m.group(1) in CLOTURE_CODES:
-            return m.group(1)
-
-    for k, v in h.items():
-        if not v:
-            continue
-        kk = (k or "").lower()
-        if ("clotur" in kk) or ("interven" in kk) or ("clot" in kk):
-            vv = str(v).strip().upper()
-            if vv in CLOTURE_CODES:
-                return vv
-            m = re.search(r"\b([A-Z]{3})\b", vv)
-            if m and m.group(1) in CLOTURE_CODES:
-                return m.group(1)
-
-    for v in h.values():
-        if not v:
-            continue
-        vv = str(v).strip().upper()
-        if vv in CLOTURE_CODES:
-            return vv
-        m = re.search(r"\b([A-Z]{3})\b", vv)
-        if m and m.group(1) in CLOTURE_CODES:
-            return m.group(1)
+        code = _match_cloture(direct)
+        if code:
+            return code
+
+    for groups in (plan["cloture_hint_groups"], plan["all_groups"]):
+        for g in groups:
+            v = _rv(row, g)
+            if not v:
+                continue
+            code = _match_cloture(v)
+            if code:
+                return code
 
     return None
 
 
-def _pidi_dossier_key_safe(h: dict[str, Any], i: int, now: datetime) -> str:
-    numero_ot = _clean_text(_val(h, "numero_ot", "n_ot", "ot", "ot_key", "numero_de_l_ot", "numero_intervention"))
-    nd = _clean_text(_val(h, "nd", "n_d", "ndi", "n_di", "numero_di", "numero_de_di"))
+def _pidi_dossier_key_safe(numero_ot: str | None, nd: str | None, i: int, now: datetime) -> str:
     if (not numero_ot) and (not nd):
         return f"NO_OTND_{int(now.timestamp())}_{i}"
     return f"{numero_ot or 'NA'}|{nd or 'NA'}"
@@ -380,62 +444,71 @@ def _extract_commentaire_releve(compte_rendu: str | None) -> str | None:
     val = (m.group(1) or "").strip()
     return val if val else None
 
-def _chunk_list(items: list[dict[str, Any]], size: int) -> Iterator[list[dict[str, Any]]]:
-    for i in range(0, len(items), size):
-        chunk = items[i:i + size]
-        yield chunk
 
-@router.post("/praxedo")
-async def import_praxedo(
-    file: UploadFile = File(...),
-    delimiter_q: str | None = Query(None),
-    delimiter: str = Form(";"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+# --------------------
+# Exécution: inline (threadpool) ou job background
+# --------------------
+async def _dispatch_import(
+    kind: str,
+    file: UploadFile,
+    runner: ImportRunner,
+    background: bool,
+    db: Session,
+    current_user: User,
 ):
+    if background:
+        path = await run_in_threadpool(spool_upload, file.file, file.filename)
+        job = submit_import_job(kind, current_user.id, file.filename, path, runner)
+        return JSONResponse(status_code=202, content=job.snapshot())
+
+    # parsing + SQL bloquants: hors de la boucle asyncio
+    return await run_in_threadpool(runner, db, file.file, ImportProgress())
+
+
+def _import_praxedo_file(
+    db: Session,
+    fh: BinaryIO,
+    progress: ImportProgress,
+    *,
+    delimiter: str,
+    user_id: int,
+) -> dict[str, Any]:
     try:
-        d0 = _resolve_delimiter(delimiter_q, delimiter)
-        eff_delim = _detect_delimiter(file, d0)
+        eff_delim = _detect_delimiter(fh, delimiter)
 
-        raw_headers, norm_headers, reader = _read_header_and_reader(file, eff_delim)
+        raw_headers, norm_headers, reader = _read_header_and_reader(fh, eff_delim)
         _require_columns_strict(raw_headers, norm_headers, PRAXEDO_REQUIRED, "PRAXEDO")
 
+        plan = _build_plan(raw_headers, PRAXEDO_FIELDS, PRAXEDO_LIKE)
+        plan.update(_cloture_plan(raw_headers))
+
         now = datetime.utcnow()
         ds_non_null = 0
         by_key: dict[tuple[str, int], dict[str, Any]] = {}
 
-        for raw_row in reader:
-            if not raw_row:
+        for row in reader:
+            if not row:
                 continue
+            progress.tick()
 
-            h = _normalize_row(raw_row)
-
-            numero = _val(h, "numero", "n", "no", "ot", "numero_ot", "ot_key")
+            numero = _rv(row, plan["numero"])
             if not numero:
                 continue
 
-            cloture = _guess_cloture(h)
+            cloture = _guess_cloture(row, plan)
 
-            ds = _clean_text(_val(h, "desc_site", "desc__site"))
+            ds = _clean_text(_rv(row, plan["desc_site"]))
             if not ds:
-                ds = _clean_text(
-                    _find_value_by_header_like(raw_row, "desc", "site")
-                    or _find_value_by_header_like(raw_row, "infos", "site")
-                )
+                ds = _clean_text(_rv(row, plan["desc_site_like"]))
 
-            desc = _clean_text(_val(h, "description"))
+            desc = _clean_text(_rv(row, plan["description"]))
 
             if ds:
                 ds_non_null += 1
 
-            compte_rendu = _clean_text(
-                _val(h, "compte_rendu", "compterendu", "compte__rendu", "compte_rendu_", "compte_rendu_praxedo")
-            )
+            compte_rendu = _clean_text(_rv(row, plan["compte_rendu"]))
             if not compte_rendu:
-                compte_rendu = _clean_text(
-                    _find_value_by_header_like(raw_row, "compte", "rendu")
-                    or _find_value_by_header_like(raw_row, "compte-rendu")
-                )
+                compte_rendu = _clean_text(_rv(row, plan["compte_rendu_like"]))
 
             commentaire_releve = _extract_commentaire_releve(compte_rendu)
 
@@ -446,24 +519,24 @@ async def import_praxedo(
 
             obj_payload = {
                 "numero": numero,
-                "user_id": current_user.id,
-                "statut": _val(h, "statut"),
-                "planifiee": _val(h, "planifiee", "planifiee_au", "date_planifiee"),
-                "nom_technicien": _val(h, "nom_technicien", "technicien"),
-                "prenom_technicien": _val(h, "prenom_technicien"),
-                "equipiers": _val(h, "equipiers"),
-                "nd": _val(h, "nd"),
-                "act_prod": _val(h, "act_prod", "activite_produit", "act_prod_code"),
-                "code_intervenant": _val(h, "code_intervention", "code_intervenant", "code_interven", "code_interv") or cloture,
-                "cp": _val(h, "cp"),
-                "ville_site": _val(h, "ville_site", "ville"),
+                "user_id": user_id,
+                "statut": _rv(row, plan["statut"]),
+                "planifiee": _rv(row, plan["planifiee"]),
+                "nom_technicien": _rv(row, plan["nom_technicien"]),
+                "prenom_technicien": _rv(row, plan["prenom_technicien"]),
+                "equipiers": _rv(row, plan["equipiers"]),
+                "nd": _rv(row, plan["nd"]),
+                "act_prod": _rv(row, plan["act_prod"]),
+                "code_intervenant": _rv(row, plan["code_intervenant"]) or cloture,
+                "cp": _rv(row, plan["cp"]),
+                "ville_site": _rv(row, plan["ville_site"]),
                 "desc_site": ds,
                 "description": desc,
                 "compte_rendu": compte_rendu,
                 "imported_at": now,
             }
 
-            existing_extra = _val(h, "csv_extra")
+            existing_extra = _rv(row, plan["csv_extra"])
             if existing_extra and str(existing_extra).strip():
                 try:
                     old = json.loads(existing_extra)
@@ -478,7 +551,7 @@ async def import_praxedo(
                 obj_payload["csv_extra"] = json.dumps(extra_payload, ensure_ascii=False)
 
             obj_payload = _sa_only_known_columns(RawPraxedo, obj_payload)
-            by_key[(numero, current_user.id)] = obj_payload
+            by_key[(numero, user_id)] = obj_payload
 
         rows_list = list(by_key.values())
         if not rows_list:
@@ -507,12 +580,23 @@ async def import_praxedo(
             },
         )
 
+        progress.checkpoint()
         db.execute(stmt)
         db.commit()
+        progress.upserted(len(rows_list))
+
+        keys = dossier_keys((r["numero"] for r in rows_list), (r.get("nd") for r in rows_list))
+        projection = refresh_user_after_write(db, user_id, "import_praxedo", keys)
 
-        return {"ok": True, "rows": len(rows_list), "desc_site_non_null": ds_non_null, "delimiter_used": eff_delim}
+        return {
+            "ok": True,
+            "rows": len(rows_list),
+            "desc_site_non_null": ds_non_null,
+            "delimiter_used": eff_delim,
+            "projection": projection,
+        }
 
-    except HTTPException:
+    except (HTTPException, ImportCancelled):
         db.rollback()
         raise
     except Exception as e:
@@ -520,235 +604,224 @@ async def import_praxedo(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.post("/pidi")
-async def import_pidi(
+@router.post("/praxedo")
+async def import_praxedo(
     file: UploadFile = File(...),
     delimiter_q: str | None = Query(None),
     delimiter: str = Form(";"),
+    background: bool = Query(False, description="Import en tâche de fond (retourne un job_id)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    runner = partial(
+        _import_praxedo_file,
+        delimiter=_resolve_delimiter(delimiter_q, delimiter),
+        user_id=current_user.id,
+    )
+    return await _dispatch_import("praxedo", file, runner, background, db, current_user)
+
+
+# --------------------
+# PIDI: import streaming (COPY -> staging -> merge SQL)
+# --------------------
+PIDI_STAGE_COLUMNS = [
+    "seq", "dossier_key", "numero_flux_pidi",
+    "contrat", "type_pidi", "statut", "nd", "code_secteur", "numero_ot", "numero_att", "oeie",
+    "code_gestion_chantier", "agence", "liste_articles", "numero_ppd", "attachement_valide",
+    "bordereau", "ht", "n_cac", "comment_acqui_rejet", "cause_acqui_rejet",
+]
+
+# champs fusionnés en "premier non vide" dans l'ordre du fichier
+PIDI_PICK_FIRST_FIELDS = [
+    "contrat", "type_pidi", "statut", "nd", "code_secteur", "numero_ot", "numero_att", "oeie",
+    "code_gestion_chantier", "agence", "numero_ppd", "attachement_valide", "bordereau", "ht",
+    "n_cac", "comment_acqui_rejet", "cause_acqui_rejet",
+]
+
+
+def _pidi_stage_row(row: list[str], plan: ColumnPlan, i: int, now: datetime) -> tuple:
+    numero_ot = _clean_text(_rv(row, plan["numero_ot"]))
+    nd = _clean_text(_rv(row, plan["nd"]))
+    return (
+        i,
+        _pidi_dossier_key_safe(numero_ot, nd, i, now),
+        _clean_text(_rv(row, plan["numero_flux_pidi"])),
+        _clean_text(_rv(row, plan["contrat"])),
+        _clean_text(_rv(row, plan["type_pidi"])),
+        _clean_text(_rv(row, plan["statut"])),
+        nd,
+        _clean_text(_rv(row, plan["code_secteur"])),
+        numero_ot,
+        _clean_text(_rv(row, plan["numero_att"])),
+        _clean_text(_rv(row, plan["oeie"])),
+        _clean_text(_rv(row, plan["code_gestion_chantier"])),
+        _clean_text(_rv(row, plan["agence"])),
+        _clean_text(_rv(row, plan["liste_articles"])),
+        _clean_text(_rv(row, plan["numero_ppd"])),
+        _clean_text(_rv(row, plan["attachement_valide"])),
+        _clean_text(_rv(row, plan["bordereau"])),
+        _parse_ht(_rv(row, plan["ht"])),
+        _clean_text(_rv(row, plan["n_cac"])),
+        _clean_text(_rv(row, plan["comment_acqui_rejet"])),
+        _clean_text(_rv(row, plan["cause_acqui_rejet"])),
+    )
+
+
+def _iter_pidi_stage_rows(reader, plan: ColumnPlan, now: datetime, progress: ImportProgress) -> Iterator[tuple]:
+    for i, row in enumerate(reader):
+        if not row:
+            continue
+        progress.tick()
+        yield _pidi_stage_row(row, plan, i, now)
+
+
+_PIDI_STAGE_DDL = """
+    CREATE TEMP TABLE _pidi_stage (
+        seq bigint NOT NULL,
+        dossier_key text NOT NULL,
+        numero_flux_pidi text,
+        contrat text, type_pidi text, statut text, nd text, code_secteur text,
+        numero_ot text, numero_att text, oeie text, code_gestion_chantier text, agence text,
+        liste_articles text, numero_ppd text, attachement_valide text, bordereau text,
+        ht numeric, n_cac text, comment_acqui_rejet text, cause_acqui_rejet text
+    ) ON COMMIT DROP
+"""
+
+# 1 ligne par dossier (OT|ND): flux = premier flux non vide, sinon la clé dossier
+_PIDI_STAGE_DOSSIERS_DDL = """
+    CREATE TEMP TABLE _pidi_stage_dossier ON COMMIT DROP AS
+    SELECT
+        dossier_key,
+        MIN(seq) AS dseq,
+        COALESCE(
+            (array_agg(numero_flux_pidi ORDER BY seq) FILTER (WHERE numero_flux_pidi IS NOT NULL))[1],
+            dossier_key
+        ) AS flux
+    FROM _pidi_stage
+    GROUP BY dossier_key
+"""
+
+_PIDI_DUPLICATES_SQL = """
+    WITH f AS (
+        SELECT flux, COUNT(*) AS n, MIN(dseq) AS fseq
+        FROM _pidi_stage_dossier
+        GROUP BY flux
+    )
+    SELECT
+        (SELECT COALESCE(SUM(n - 1), 0) FROM f) AS merged,
+        ARRAY(SELECT flux FROM f WHERE n > 1 ORDER BY fseq LIMIT 20) AS samples
+"""
+
+
+def _pidi_merge_sql() -> str:
+    # Ordre (dseq, seq) = ordre de première apparition du dossier puis ordre des lignes:
+    # premier non vide par dossier, puis par flux (ordre d'apparition des dossiers).
+    picks = ",\n                ".join(
+        f"(array_agg(s.{c} ORDER BY s.dseq, s.seq) FILTER (WHERE s.{c} IS NOT NULL))[1] AS {c}"
+        for c in PIDI_PICK_FIRST_FIELDS
+    )
+    cols = ", ".join(PIDI_PICK_FIRST_FIELDS)
+    sets = ",\n            ".join(f"{c} = EXCLUDED.{c}" for c in PIDI_PICK_FIRST_FIELDS + ["liste_articles", "imported_at"])
+    return f"""
+        WITH s AS (
+            SELECT st.*, d.flux, d.dseq
+            FROM _pidi_stage st
+            JOIN _pidi_stage_dossier d USING (dossier_key)
+        ),
+        tok AS (
+            SELECT s.flux, s.dseq, s.seq, t.ord,
+                   regexp_replace(t.tok, '^\\s+|\\s+$', '', 'g') AS item
+            FROM s
+            CROSS JOIN LATERAL regexp_split_to_table(s.liste_articles, '[,\\n;|]+')
+                 WITH ORDINALITY AS t(tok, ord)
+            WHERE s.liste_articles IS NOT NULL
+        ),
+        art AS (
+            -- fusion articles: split, dédoublonnage insensible à la casse, ordre conservé
+            SELECT flux, string_agg(item, ', ' ORDER BY dseq, seq, ord) AS merged
+            FROM (
+                SELECT DISTINCT ON (flux, lower(item)) flux, item, dseq, seq, ord
+                FROM tok
+                WHERE item <> ''
+                ORDER BY flux, lower(item), dseq, seq, ord
+            ) u
+            GROUP BY flux
+        ),
+        agg AS (
+            SELECT
+                s.flux,
+                MIN(s.dseq) AS fseq,
+                COUNT(s.liste_articles) AS n_listes,
+                (array_agg(s.liste_articles ORDER BY s.dseq, s.seq)
+                    FILTER (WHERE s.liste_articles IS NOT NULL))[1] AS first_liste,
+                {picks}
+            FROM s
+            GROUP BY s.flux
+        )
+        INSERT INTO raw.pidi (numero_flux_pidi, user_id, {cols}, liste_articles, imported_at)
+        SELECT
+            a.flux, :user_id, {", ".join("a." + c for c in PIDI_PICK_FIRST_FIELDS)},
+            CASE
+                WHEN a.n_listes > 1 THEN COALESCE(NULLIF(art.merged, ''), a.first_liste)
+                ELSE a.first_liste
+            END,
+            :now
+        FROM agg a
+        LEFT JOIN art ON art.flux = a.flux
+        ORDER BY a.fseq
+        ON CONFLICT (numero_flux_pidi, user_id) DO UPDATE SET
+            {sets}
+        RETURNING numero_ot, nd
+    """
+
+
+def _import_pidi_file(
+    db: Session,
+    fh: BinaryIO,
+    progress: ImportProgress,
+    *,
+    delimiter: str,
+    user_id: int,
+) -> dict[str, Any]:
     try:
-        d0 = _resolve_delimiter(delimiter_q, delimiter)
-        eff_delim = _detect_delimiter(file, d0)
+        eff_delim = _detect_delimiter(fh, delimiter)
 
-        raw_headers, norm_headers, reader = _read_header_and_reader(file, eff_delim)
+        raw_headers, norm_headers, reader = _read_header_and_reader(fh, eff_delim)
         _require_columns_strict(raw_headers, norm_headers, PIDI_REQUIRED, "PIDI")
 
+        plan = _build_plan(raw_headers, PIDI_FIELDS)
         now = datetime.utcnow()
-        agg: dict[str, dict[str, Any]] = {}
-        rows_in = 0
-
-        for i, raw_row in enumerate(reader):
-            if not raw_row:
-                continue
-            rows_in += 1
-
-            h = _normalize_row(raw_row)
-            dossier_key = _pidi_dossier_key_safe(h, i, now)
-
-            rec = agg.get(dossier_key)
-            if rec is None:
-                rec = {
-                    "numero_flux_pidi": None,
-                    "contrat": None,
-                    "type_pidi": None,
-                    "statut": None,
-                    "nd": None,
-                    "code_secteur": None,
-                    "numero_ot": None,
-                    "numero_att": None,
-                    "oeie": None,
-                    "code_gestion_chantier": None,
-                    "agence": None,
-                    "liste_articles": None,
-                    "numero_ppd": None,
-                    "attachement_valide": None,
-                    "bordereau": None,
-                    "ht": None,
-                    "n_cac": None,
-                    "comment_acqui_rejet": None,
-                    "cause_acqui_rejet": None,
-                    "imported_at": now,
-                    "user_id": current_user.id,
-                }
-                agg[dossier_key] = rec
-
-            flux = _clean_text(_val(h, "n_de_flux_pidi", "n_flux_pidi", "numero_flux_pidi", "flux_pidi"))
-            rec["numero_flux_pidi"] = _pick_first(rec.get("numero_flux_pidi"), flux) or dossier_key
-
-            rec["contrat"] = _pick_first(rec.get("contrat"), _clean_text(_val(h, "contrat")))
-            rec["type_pidi"] = _pick_first(
-                rec.get("type_pidi"),
-                _clean_text(_val(h, "type", "type_pidi", "type_attachement", "type_d_attachement"))
-            )
-            rec["statut"] = _pick_first(rec.get("statut"), _clean_text(_val(h, "statut", "statut_attachement")))
-
-            rec["nd"] = _pick_first(
-                rec.get("nd"),
-                _clean_text(_val(h, "nd", "n_d", "ndi", "n_di", "numero_di", "numero_de_di"))
-            )
-            rec["numero_ot"] = _pick_first(
-                rec.get("numero_ot"),
-                _clean_text(_val(h, "numero_ot", "n_ot", "ot", "ot_key", "numero_de_l_ot", "numero_intervention"))
-            )
-
-            rec["code_secteur"] = _pick_first(rec.get("code_secteur"), _clean_text(_val(h, "code_secteur", "secteur")))
-            rec["numero_att"] = _pick_first(
-                rec.get("numero_att"),
-                _clean_text(_val(h, "numero_att", "n_att", "n_att_", "n_attachement", "numero_attachement"))
-            )
-            rec["oeie"] = _pick_first(rec.get("oeie"), _clean_text(_val(h, "oeie")))
-
-            rec["code_gestion_chantier"] = _pick_first(
-                rec.get("code_gestion_chantier"),
-                _clean_text(_val(h, "code_gestion_chantier", "code_gestion", "codes_chantier_de_gestion"))
-            )
-            rec["agence"] = _pick_first(rec.get("agence"), _clean_text(_val(h, "agence")))
-
-            rec["liste_articles"] = _merge_articles(
-                rec.get("liste_articles"),
-                _val(h, "liste_des_articles", "liste_articles", "liste_d_articles", "article"),
-            )
 
-            rec["numero_ppd"] = _pick_first(
-                rec.get("numero_ppd"),
-                _clean_text(_val(h, "n_ppd", "numero_ppd", "ppd", "n_pdd", "numero_pdd", "n__ppd"))
-            )
-            rec["attachement_valide"] = _pick_first(
-                rec.get("attachement_valide"),
-                _clean_text(_val(h, "attachement_valide", "attachement_validee", "attachement_valide_le", "attachement_valide_at"))
-            )
+        # 1) lignes -> table temporaire via COPY (mémoire constante)
+        db.execute(text(_PIDI_STAGE_DDL))
+        copy_rows(db, "_pidi_stage", PIDI_STAGE_COLUMNS, _iter_pidi_stage_rows(reader, plan, now, progress))
 
-            rec["bordereau"] = _pick_first(rec.get("bordereau"), _clean_text(_val(h, "bordereau")))
-            ht_new = _parse_ht(_val(h, "ht", "montant_ht", "prix_majore", "prix", "prix_majoré"))
-            rec["ht"] = rec.get("ht") if rec.get("ht") is not None else ht_new
-
-            rec["n_cac"] = _pick_first(
-                rec.get("n_cac"),
-                _clean_text(_val(h, "n_cac", "numero_cac", "cac", "n_cac_"))
-            )
-            rec["comment_acqui_rejet"] = _pick_first(
-                rec.get("comment_acqui_rejet"),
-                _clean_text(_val(h, "comment_acqui_rejet", "commentaire_acqui_rejet", "comment_acqui_rejet_pidi"))
-            )
-            rec["cause_acqui_rejet"] = _pick_first(
-                rec.get("cause_acqui_rejet"),
-                _clean_text(_val(h, "cause_acqui_rejet", "cause_acqui_rejet_pidi"))
-            )
-
-        # Déduplication finale par vraie clé SQL: (numero_flux_pidi, user_id)
-        rows_map: dict[tuple[str, int], dict[str, Any]] = {}
-        duplicate_flux_keys: list[str] = []
-
-        for rec in agg.values():
-            flux_value = _clean_text(rec.get("numero_flux_pidi"))
-            if not flux_value:
-                continue
-
-            payload = {
-                "numero_flux_pidi": flux_value,
-                "user_id": current_user.id,
-                "contrat": rec.get("contrat"),
-                "type_pidi": rec.get("type_pidi"),
-                "statut": rec.get("statut"),
-                "nd": rec.get("nd"),
-                "code_secteur": rec.get("code_secteur"),
-                "numero_ot": rec.get("numero_ot"),
-                "numero_att": rec.get("numero_att"),
-                "oeie": rec.get("oeie"),
-                "code_gestion_chantier": rec.get("code_gestion_chantier"),
-                "agence": rec.get("agence"),
-                "liste_articles": rec.get("liste_articles"),
-                "numero_ppd": rec.get("numero_ppd"),
-                "attachement_valide": rec.get("attachement_valide"),
-                "bordereau": rec.get("bordereau"),
-                "ht": rec.get("ht"),
-                "n_cac": rec.get("n_cac"),
-                "comment_acqui_rejet": rec.get("comment_acqui_rejet"),
-                "cause_acqui_rejet": rec.get("cause_acqui_rejet"),
-                "imported_at": now,
-            }
-            payload = _sa_only_known_columns(RawPidi, payload)
-
-            key = (payload["numero_flux_pidi"], payload["user_id"])
-            if key in rows_map:
-                duplicate_flux_keys.append(payload["numero_flux_pidi"])
-
-                existing = rows_map[key]
-                for field in [
-                    "contrat", "type_pidi", "statut", "nd", "code_secteur", "numero_ot",
-                    "numero_att", "oeie", "code_gestion_chantier", "agence", "numero_ppd",
-                    "attachement_valide", "bordereau", "n_cac",
-                    "comment_acqui_rejet", "cause_acqui_rejet"
-                ]:
-                    existing[field] = _pick_first(existing.get(field), payload.get(field))
-
-                existing["liste_articles"] = _merge_articles(
-                    existing.get("liste_articles"),
-                    payload.get("liste_articles")
-                )
-
-                if existing.get("ht") is None and payload.get("ht") is not None:
-                    existing["ht"] = payload.get("ht")
-
-                existing["imported_at"] = now
-            else:
-                rows_map[key] = payload
-
-        rows_list = list(rows_map.values())
-
-        if not rows_list:
-            return {
-                "ok": True,
-                "rows_in": rows_in,
-                "rows_upserted": 0,
-                "delimiter_used": eff_delim,
-                "duplicate_flux_merged": 0,
-            }
-
-        t = RawPidi.__table__
-
-        for chunk in _chunk_list(rows_list, 300):
-            stmt = pg_insert(t).values(chunk)
-            stmt = stmt.on_conflict_do_update(
-                index_elements=[t.c.numero_flux_pidi, t.c.user_id],
-                set_={
-                    "contrat": stmt.excluded.contrat,
-                    "type_pidi": stmt.excluded.type_pidi,
-                    "statut": stmt.excluded.statut,
-                    "nd": stmt.excluded.nd,
-                    "code_secteur": stmt.excluded.code_secteur,
-                    "numero_ot": stmt.excluded.numero_ot,
-                    "numero_att": stmt.excluded.numero_att,
-                    "oeie": stmt.excluded.oeie,
-                    "code_gestion_chantier": stmt.excluded.code_gestion_chantier,
-                    "agence": stmt.excluded.agence,
-                    "liste_articles": stmt.excluded.liste_articles,
-                    "numero_ppd": stmt.excluded.numero_ppd,
-                    "attachement_valide": stmt.excluded.attachement_valide,
-                    "bordereau": stmt.excluded.bordereau,
-                    "ht": stmt.excluded.ht,
-                    "n_cac": stmt.excluded.n_cac,
-                    "comment_acqui_rejet": stmt.excluded.comment_acqui_rejet,
-                    "cause_acqui_rejet": stmt.excluded.cause_acqui_rejet,
-                    "imported_at": stmt.excluded.imported_at,
-                },
-            )
-            db.execute(stmt)
+        # 2) fusion / dédoublonnage (dossier puis flux) en SQL
+        progress.checkpoint()
+        db.execute(text(_PIDI_STAGE_DOSSIERS_DDL))
+        dup = db.execute(text(_PIDI_DUPLICATES_SQL)).mappings().first()
+        # (numero_ot, nd) des flux écrits: périmètre du rafraîchissement de la projection
+        touched = db.execute(text(_pidi_merge_sql()), {"user_id": user_id, "now": now}).all()
+        rows_upserted = len(touched)
 
         db.commit()
+        compare_summary_cache.invalidate()
+        progress.upserted(rows_upserted)
+
+        keys = dossier_keys((ot for ot, _ in touched), (nd for _, nd in touched))
+        projection = refresh_user_after_write(db, user_id, "import_pidi", keys)
 
         return {
             "ok": True,
-            "rows_in": rows_in,
-            "rows_upserted": len(rows_list),
+            "rows_in": progress.rows_parsed,
+            "rows_upserted": rows_upserted,
             "delimiter_used": eff_delim,
-            "duplicate_flux_merged": len(duplicate_flux_keys),
-            "duplicate_flux_samples": duplicate_flux_keys[:20],
+            "duplicate_flux_merged": int(dup["merged"] or 0) if dup else 0,
+            "duplicate_flux_samples": list(dup["samples"] or []) if dup else [],
+            "projection": projection,
         }
 
-    except HTTPException:
+    except (HTTPException, ImportCancelled):
         db.rollback()
         raise
     except Exception as e:
@@ -762,49 +835,66 @@ async def import_pidi(
         )
 
 
-@router.post("/praxedo-cr10")
-async def import_praxedo_cr10(
+@router.post("/pidi")
+async def import_pidi(
     file: UploadFile = File(...),
     delimiter_q: str | None = Query(None),
     delimiter: str = Form(";"),
+    background: bool = Query(False, description="Import en tâche de fond (retourne un job_id)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    runner = partial(
+        _import_pidi_file,
+        delimiter=_resolve_delimiter(delimiter_q, delimiter),
+        user_id=current_user.id,
+    )
+    return await _dispatch_import("pidi", file, runner, background, db, current_user)
+
+
+def _import_praxedo_cr10_file(
+    db: Session,
+    fh: BinaryIO,
+    progress: ImportProgress,
+    *,
+    delimiter: str,
+    user_id: int,
+) -> dict[str, Any]:
     try:
-        d0 = _resolve_delimiter(delimiter_q, delimiter)
-        eff_delim = _detect_delimiter(file, d0)
+        eff_delim = _detect_delimiter(fh, delimiter)
 
-        raw_headers, norm_headers, reader = _read_header_and_reader(file, eff_delim)
+        raw_headers, norm_headers, reader = _read_header_and_reader(fh, eff_delim)
         _require_columns_strict(raw_headers, norm_headers, PRAXEDO_CR10_REQUIRED, "PRAXEDO_CR10")
 
+        plan = _build_plan(raw_headers, PRAXEDO_CR10_FIELDS, PRAXEDO_CR10_LIKE)
+
         now = datetime.utcnow()
         by_ot: dict[str, dict[str, Any]] = {}
 
-        for raw_row in reader:
-            if not raw_row:
+        for row in reader:
+            if not row:
                 continue
+            progress.tick()
 
-            h = _normalize_row(raw_row)
-
-            ot_raw = _clean_text(_val(h, "id_externe_ot", "id_externe", "idexterne", "id_externe_"))
+            ot_raw = _clean_text(_rv(row, plan["ot"]))
             if not ot_raw:
-                ot_raw = _clean_text(_find_value_by_header_like(raw_row, "id", "externe"))
+                ot_raw = _clean_text(_rv(row, plan["ot_like"]))
 
             ot = re.sub(r"\s+", "", ot_raw) if ot_raw else None
             if not ot:
                 continue
 
-            nd = _clean_text(_val(h, "nom_site", "nom_du_site", "site", "nomsite")) \
-                 or _clean_text(_find_value_by_header_like(raw_row, "nom", "site"))
+            nd = _clean_text(_rv(row, plan["nom_site"])) \
+                 or _clean_text(_rv(row, plan["nom_site_like"]))
 
-            cr = _clean_text(_val(h, "compte_rendu", "compterendu", "compte_rendu_")) \
-                 or _clean_text(_find_value_by_header_like(raw_row, "compte", "rendu"))
+            cr = _clean_text(_rv(row, plan["compte_rendu"])) \
+                 or _clean_text(_rv(row, plan["compte_rendu_like"]))
 
-            evenements = _clean_text(_val(h, "evenements", "evenement", "events"))
+            evenements = _clean_text(_rv(row, plan["evenements"]))
             if not evenements:
-                evenements = _clean_text(_find_value_by_header_like(raw_row, "evenement"))
+                evenements = _clean_text(_rv(row, plan["evenements_like"]))
 
-            palier_csv = _clean_text(_val(h, "palier", "pallier", "niveau", "tier"))
+            palier_csv = _clean_text(_rv(row, plan["palier"]))
             palier = palier_csv or _extract_palier_from_evenements(evenements)
 
             by_ot[ot] = {
@@ -814,7 +904,7 @@ async def import_praxedo_cr10(
                 "evenements": evenements,
                 "palier": palier,
                 "imported_at": now,
-                "user_id": current_user.id,
+                "user_id": user_id,
             }
 
         rows_list = list(by_ot.values())
@@ -838,14 +928,61 @@ async def import_praxedo_cr10(
             },
         )
 
+        progress.checkpoint()
         db.execute(stmt)
         db.commit()
+        progress.upserted(len(rows_list))
+
+        keys = dossier_keys(r["id_externe"] for r in rows_list)
+        projection = refresh_user_after_write(db, user_id, "import_praxedo_cr10", keys)
 
-        return {"ok": True, "rows": len(rows_list), "delimiter_used": eff_delim}
+        return {"ok": True, "rows": len(rows_list), "delimiter_used": eff_delim, "projection": projection}
 
-    except HTTPException:
+    except (HTTPException, ImportCancelled):
         db.rollback()
         raise
     except Exception as e:
         db.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/praxedo-cr10")
+async def import_praxedo_cr10(
+    file: UploadFile = File(...),
+    delimiter_q: str | None = Query(None),
+    delimiter: str = Form(";"),
+    background: bool = Query(False, description="Import en tâche de fond (retourne un job_id)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    runner = partial(
+        _import_praxedo_cr10_file,
+        delimiter=_resolve_delimiter(delimiter_q, delimiter),
+        user_id=current_user.id,
+    )
+    return await _dispatch_import("praxedo_cr10", file, runner, background, db, current_user)
+
+
+# --------------------
+# Suivi des jobs d'import
+# --------------------
+@router.get("/jobs")
+def list_jobs(current_user: User = Depends(get_current_user)):
+    return [j.snapshot() for j in list_import_jobs(current_user.id)]
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = get_import_job(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job d'import introuvable")
+    return job.snapshot()
+
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = get_import_job(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job d'import introuvable")
+    job.cancel()
+    return job.snapshot()
\ No newline at end of file
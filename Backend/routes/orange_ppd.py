@@ -4,19 +4,25 @@ from __future__ import annotations
 import csv
 import io
 import re
+import time
 import unicodedata
 import uuid
 from decimal import Decimal, InvalidOperation
+from collections.abc import Iterator
 from typing import Any
 
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from core.summary_cache import compare_summary_cache, summary_key
+from database.bulk import copy_rows
 from database.connection import get_db
 from models.raw_orange_ppd_import import RawOrangePpdImport
-from models.raw_orange_ppd_row import RawOrangePpdRow
-from models.raw_orange_ppd_pivot_row import RawOrangePpdPivotRow
+# tables chargées par COPY, mais modèles à enregistrer (relations de
+# RawOrangePpdImport, create_all)
+from models.raw_orange_ppd_row import RawOrangePpdRow  # noqa: F401
+from models.raw_orange_ppd_pivot_row import RawOrangePpdPivotRow  # noqa: F401
 
 # --- NOUVEAU: Imports pour la protection admin ---
 from routes.auth import require_admin
@@ -39,24 +45,32 @@ def _norm(s: str) -> str:
     return s.strip("_")
 
 
-def _normalize_row(raw: dict[str, Any]) -> dict[str, Any]:
-    out: dict[str, Any] = {}
-    for k, v in (raw or {}).items():
-        if not k:
-            continue
-        nk = _norm(k)
-        out[nk] = v.strip() if isinstance(v, str) else v
-    return out
+def _header_plan(raw_headers: list[str], fields: dict[str, tuple[str, ...]]) -> dict[str, tuple[int, ...]]:
+    """
+    Résout une fois par fichier les alias d'en-têtes en indices de colonnes.
+    Même priorité que l'ancien dict normalisé: en-tête dupliqué -> dernière colonne.
+    """
+    last_raw: dict[str, int] = {}
+    for idx, h in enumerate(raw_headers):
+        if h:
+            last_raw[h] = idx
+    by_norm: dict[str, int] = {}
+    for h, idx in last_raw.items():
+        by_norm[_norm(h)] = idx
 
+    return {
+        name: tuple(by_norm[k] for k in keys if k in by_norm)
+        for name, keys in fields.items()
+    }
 
-def _pick(h: dict[str, Any], *keys: str) -> str | None:
-    for k in keys:
-        v = h.get(k)
-        if v is None:
-            continue
-        vv = str(v).strip()
-        if vv:
-            return vv
+
+def _pick(row: list[str], cols: tuple[int, ...]) -> str | None:
+    n = len(row)
+    for idx in cols:
+        if idx < n:
+            vv = row[idx].strip()
+            if vv:
+                return vv
     return None
 
 
@@ -118,46 +132,38 @@ def _cell_str(x: Any) -> str:
     return str(x).strip()
 
 
-def _find_header_row_and_map(ws) -> tuple[int, dict[str, int]]:
-    max_scan = min(ws.max_row or 0, 150)
-    max_col = min(ws.max_column or 0, 120)
+# zones balayées (mêmes bornes que l'ancien scan cellule par cellule)
+_HDR_MAX_ROW, _HDR_MAX_COL = 150, 120
+_META_MAX_ROW, _META_MAX_COL = 60, 40
+_EMPTY_STREAK_STOP = 15
 
-    for r in range(1, max_scan + 1):
-        values = [_cell_str(ws.cell(row=r, column=c).value) for c in range(1, max_col + 1)]
-        normed = [_norm(v) for v in values]
+EXCEL_ROW_COLUMNS = (
+    "row_id", "import_id", "ppd_num", "objet", "commande", "gdf", "releve", "attachement",
+    "debut_trvx", "fin_trvx", "montant_brut", "montant_majore", "sheet_name",
+)
 
-        found: dict[str, int] = {}
-        for key, aliases in _HDR_ALIASES.items():
-            for idx, name in enumerate(normed, start=1):
-                if name in aliases:
-                    found[key] = idx
-                    break
 
-        if _HDR_REQUIRED.issubset(found.keys()):
-            return r, found
+def _header_map(values: tuple) -> dict[str, int] | None:
+    normed = [_norm(_cell_str(v)) for v in values[:_HDR_MAX_COL]]
 
-    raise HTTPException(
-        status_code=400,
-        detail="Header PPD introuvable. Je cherche: Commande, Relevé, Montant brut, Montant majoré.",
-    )
+    found: dict[str, int] = {}
+    for key, aliases in _HDR_ALIASES.items():
+        for idx, name in enumerate(normed, start=1):
+            if name in aliases:
+                found[key] = idx
+                break
 
+    return found if _HDR_REQUIRED.issubset(found.keys()) else None
 
-def _extract_ppd_meta(ws) -> tuple[str | None, str | None]:
-    ppd_num = None
-    objet = None
 
-    max_r = min(ws.max_row or 0, 60)
-    max_c = min(ws.max_column or 0, 40)
+def _meta_line(values: tuple) -> str | None:
+    row_vals = [v for v in (_cell_str(x) for x in values[:_META_MAX_COL]) if v]
+    return " ".join(row_vals) if row_vals else None
 
-    lines: list[str] = []
-    for r in range(1, max_r + 1):
-        row_vals = []
-        for c in range(1, max_c + 1):
-            v = _cell_str(ws.cell(row=r, column=c).value)
-            if v:
-                row_vals.append(v)
-        if row_vals:
-            lines.append(" ".join(row_vals))
+
+def _extract_ppd_meta(lines: list[str]) -> tuple[str | None, str | None]:
+    ppd_num = None
+    objet = None
 
     blob = "\n".join(lines)
 
@@ -172,6 +178,100 @@ def _extract_ppd_meta(ws) -> tuple[str | None, str | None]:
     return ppd_num, objet
 
 
+def _at(values: tuple, col: dict[str, int], key: str) -> str:
+    idx = col.get(key)
+    if idx is None or idx > len(values):
+        return ""
+    return _cell_str(values[idx - 1])
+
+
+def _iter_excel_ppd_rows(rows, import_id: str, sheet_name: str, info: dict[str, Any]) -> Iterator[tuple]:
+    """
+    Un seul passage sur les lignes (read_only / values_only):
+    - lignes 1..60: texte pour PPD n° / Objet
+    - lignes 1..150: recherche de l'en-tête
+    - ensuite: lignes de données, arrêt après 15 lignes vides consécutives
+    Les lignes lues avant la fin de la zone méta sont retenues (<= 60) puis émises
+    avec ppd_num / objet.
+    """
+    meta_lines: list[str] = []
+    meta: tuple[str | None, str | None] | None = None
+    pending: list[tuple] = []
+    col: dict[str, int] | None = None
+    empty_streak = 0
+    done = False
+
+    def _with_meta(rec: tuple) -> tuple:
+        return (rec[0], rec[1], meta[0], meta[1], *rec[2:])
+
+    for r, values in enumerate(rows, start=1):
+        if r <= _META_MAX_ROW:
+            line = _meta_line(values)
+            if line:
+                meta_lines.append(line)
+        elif meta is None:
+            meta = _extract_ppd_meta(meta_lines)
+            info["ppd_num"], info["objet"] = meta
+            for rec in pending:
+                yield _with_meta(rec)
+            pending.clear()
+
+        if done:
+            if meta is not None:
+                break
+            continue
+
+        if col is None:
+            if r > _HDR_MAX_ROW:
+                break
+            col = _header_map(values)
+            if col is not None:
+                info["header_row"] = r
+            continue
+
+        commande = _at(values, col, "commande")
+        releve = _at(values, col, "releve")
+        mb = _parse_decimal(_at(values, col, "montant_brut"))
+        mm = _parse_decimal(_at(values, col, "montant_majore"))
+
+        if _stop_line(commande, releve, mb, mm):
+            empty_streak += 1
+            if empty_streak >= _EMPTY_STREAK_STOP:
+                done = True
+            continue
+        empty_streak = 0
+
+        rec = (
+            f"{import_id}:{r}",
+            import_id,
+            commande or None,
+            (_at(values, col, "gdf") or None) if "gdf" in col else None,
+            releve or None,
+            (_at(values, col, "attachement") or None) if "attachement" in col else None,
+            (_at(values, col, "debut_trvx") or None) if "debut_trvx" in col else None,
+            (_at(values, col, "fin_trvx") or None) if "fin_trvx" in col else None,
+            mb,
+            mm,
+            sheet_name,
+        )
+        if meta is None:
+            pending.append(rec)
+        else:
+            yield _with_meta(rec)
+
+    if col is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Header PPD introuvable. Je cherche: Commande, Relevé, Montant brut, Montant majoré.",
+        )
+
+    if meta is None:
+        meta = _extract_ppd_meta(meta_lines)
+        info["ppd_num"], info["objet"] = meta
+        for rec in pending:
+            yield _with_meta(rec)
+
+
 def _stop_line(cmd: str, rel: str, mb: Decimal | None, mm: Decimal | None) -> bool:
     return (cmd.strip() == "") and (rel.strip() == "") and mb is None and mm is None
 
@@ -185,20 +285,132 @@ def _is_xlsx(filename: str | None, content: bytes) -> bool:
 # --------------------
 # CSV import (phase 1)
 # --------------------
+ORANGE_PPD_ROW_FIELDS: dict[str, tuple[str, ...]] = {
+    "contrat": ("contrat",),
+    "numero_flux_pidi": ("n_de_flux_pidi", "numero_flux_pidi", "flux_pidi"),
+    "type_pidi": ("type",),
+    "statut": ("statut",),
+    "nd": ("nd",),
+    "code_secteur": ("code_secteur",),
+    "numero_ot": ("n_ot", "numero_ot", "num_ot", "ot", "ot_key", "num_ot_orange"),
+    "numero_att": ("n_att", "numero_att", "n_att_"),
+    "oeie": ("oeie",),
+    "code_gestion_chantier": ("code_gestion_chantier",),
+    "agence": ("agence",),
+    "code_postal": ("code_postal",),
+    "code_insee": ("code_insee",),
+    "entreprise": ("entreprise",),
+    "code_gpc": ("code_gpc",),
+    "code_etr": ("code_etr",),
+    "chef_equipe": ("chef_d_equipe", "chef_dequipe"),
+    "ui": ("ui",),
+    "numero_ppd": ("n_ppd", "numero_ppd", "ppd"),
+    "act_prod": ("act_prod",),
+    "numero_as": ("n_as", "numero_as"),
+    "centre": ("centre",),
+    "date_debut": ("date_debut",),
+    "date_fin": ("date_fin",),
+    "numero_cac": ("n_cac", "numero_cac"),
+    "commentaire_interne": ("commentaire_interne",),
+    "commentaire_oeie": ("commentaire_oeie",),
+    "commentaire_attelem": ("commentaire_attelem",),
+    "motif_facturation_degradee": ("motif_facturation_degradee", "motif_de_facturation_degradee"),
+    "categorie": ("categorie",),
+    "charge_affaire": ("charge_affaire", "charge_d_affaire"),
+    "cause_acqui_rejet": ("cause_acqui_rejet",),
+    "commentaire_acqui_rejet": ("comment_acqui_rejet", "commentaire_acqui_rejet"),
+    "attachement_cree": ("attachement_cree",),
+    "derniere_saisie": ("derniere_saisie",),
+    "attachement_definitif": ("attachement_definitif",),
+    "attachement_valide": ("attachement_valide",),
+    "pointe_ppd": ("pointe_ppd",),
+    "planification_ot": ("planification_ot",),
+    "validation_interventions": ("validation_interventions", "validation_des_interventions"),
+    "bordereau": ("bordereau",),
+    "ht": ("ht", "total_ht"),
+    "bordereau_sst": ("bordereau_sst",),
+    "ht_sst": ("ht_sst",),
+    "marge": ("marge",),
+    "coeff": ("coeff",),
+    "kyntus": ("kyntus",),
+    "liste_articles": ("liste_articles", "liste_des_articles"),
+    "encours": ("encours",),
+}
+
+ORANGE_PPD_PIVOT_FIELDS: dict[str, tuple[str, ...]] = {
+    "etiquette_lignes": ("etiquettes_de_lignes", "etiquettes_de_ligne", "etiquettes", "etiquette_lignes"),
+    "somme_kyntus": ("somme_de_kyntus", "somme_kyntus", "total_kyntus"),
+}
+
+# colonnes COPY (imported_at: server_default)
+ORANGE_PPD_ROW_COLUMNS = ("row_id", "import_id", *ORANGE_PPD_ROW_FIELDS.keys())
+ORANGE_PPD_PIVOT_COLUMNS = ("row_id", "import_id", *ORANGE_PPD_PIVOT_FIELDS.keys())
+
+_ORANGE_PPD_DECIMAL_FIELDS = {"ht", "ht_sst"}
+
+
+def _iter_csv_ppd_rows(reader, plan: dict[str, tuple[int, ...]], import_id: str, pivots: list[tuple]):
+    """
+    Lignes OT en flux (tuples prêts pour COPY). Les lignes pivot (bloc de
+    totaux "Étiquettes de lignes", quelques dizaines de lignes) sont mises de
+    côté dans `pivots` pour un second COPY.
+    """
+    etiquette_cols = plan["etiquette_lignes"]
+    somme_cols = plan["somme_kyntus"]
+    ot_cols = plan["numero_ot"]
+    fields = [
+        (name, plan[name], name in _ORANGE_PPD_DECIMAL_FIELDS)
+        for name in ORANGE_PPD_ROW_FIELDS
+        if name != "numero_ot"
+    ]
+
+    idx = 0
+    for raw in reader:
+        if not raw:
+            continue  # comme csv.DictReader: lignes vides ignorées, non numérotées
+        idx += 1
+
+        etiquette = _pick(raw, etiquette_cols)
+        somme_kyntus = _parse_decimal(_pick(raw, somme_cols))
+        numero_ot = _norm_ot(_pick(raw, ot_cols))
+
+        row_id = f"{import_id}:{idx}"
+
+        if not numero_ot and (etiquette or somme_kyntus is not None):
+            pivots.append((row_id, import_id, etiquette, somme_kyntus))
+            continue
+
+        if not numero_ot:
+            continue
+
+        values = {
+            name: (_parse_decimal(_pick(raw, cols)) if is_dec else _pick(raw, cols))
+            for name, cols, is_dec in fields
+        }
+        values["numero_ot"] = numero_ot
+        yield (row_id, import_id, *(values[name] for name in ORANGE_PPD_ROW_FIELDS))
+
+
 def _import_csv_ppd(db: Session, file: UploadFile, content: bytes, imported_by: str | None):
-    txt = content.decode("utf-8-sig", errors="ignore")
-    if not txt.strip():
+    t0 = time.perf_counter()
+
+    # décodage en flux: ni copie str du fichier entier, ni liste de ses lignes
+    stream = io.TextIOWrapper(io.BytesIO(content), encoding="utf-8-sig", errors="ignore", newline="")
+    first = stream.readline()
+    if not first.strip() and not any(line.strip() for line in stream):
         raise HTTPException(status_code=400, detail="Fichier vide")
+    stream.seek(0)
 
-    first = txt.splitlines()[0] if txt.splitlines() else ""
     delimiter = ";" if first.count(";") >= first.count(",") else ","
 
-    reader = csv.DictReader(io.StringIO(txt), delimiter=delimiter)
-    if not reader.fieldnames:
+    reader = csv.reader(stream, delimiter=delimiter)
+    raw_headers = next(reader, None)
+    if not raw_headers:
         raise HTTPException(status_code=400, detail="En-têtes CSV introuvables")
 
-    new_import_id = str(uuid.uuid4())
+    plan = _header_plan(raw_headers, {**ORANGE_PPD_ROW_FIELDS, **ORANGE_PPD_PIVOT_FIELDS})
 
+    new_import_id = str(uuid.uuid4())
     imp = RawOrangePpdImport(
         import_id=new_import_id,
         filename=file.filename,
@@ -208,110 +420,35 @@ def _import_csv_ppd(db: Session, file: UploadFile, content: bytes, imported_by:
     db.add(imp)
     db.flush()
 
-    rows: list[RawOrangePpdRow] = []
-    pivots: list[RawOrangePpdPivotRow] = []
-
-    for idx, raw in enumerate(reader, start=1):
-        h = _normalize_row(raw)
-
-        etiquette = _pick(h, "etiquettes_de_lignes", "etiquettes_de_ligne", "etiquettes", "etiquette_lignes")
-        somme_kyntus = _parse_decimal(_pick(h, "somme_de_kyntus", "somme_kyntus", "total_kyntus"))
-
-        numero_ot_raw = _pick(h, "n_ot", "numero_ot", "num_ot", "ot", "ot_key", "num_ot_orange")
-        numero_ot = _norm_ot(numero_ot_raw)
-
-        row_id = f"{new_import_id}:{idx}"
-
-        if not numero_ot and (etiquette or somme_kyntus is not None):
-            pivots.append(
-                RawOrangePpdPivotRow(
-                    row_id=row_id,
-                    import_id=new_import_id,
-                    etiquette_lignes=etiquette,
-                    somme_kyntus=somme_kyntus,
-                )
-            )
-            continue
-
-        if not numero_ot:
-            continue
-
-        numero_ppd = _pick(h, "n_ppd", "numero_ppd", "ppd")
-
-        rows.append(
-            RawOrangePpdRow(
-                row_id=row_id,
-                import_id=new_import_id,
-                contrat=_pick(h, "contrat"),
-                numero_flux_pidi=_pick(h, "n_de_flux_pidi", "numero_flux_pidi", "flux_pidi"),
-                type_pidi=_pick(h, "type"),
-                statut=_pick(h, "statut"),
-                nd=_pick(h, "nd"),
-                code_secteur=_pick(h, "code_secteur"),
-                numero_ot=numero_ot,
-                numero_att=_pick(h, "n_att", "numero_att", "n_att_"),
-                oeie=_pick(h, "oeie"),
-                code_gestion_chantier=_pick(h, "code_gestion_chantier"),
-                agence=_pick(h, "agence"),
-                code_postal=_pick(h, "code_postal"),
-                code_insee=_pick(h, "code_insee"),
-                entreprise=_pick(h, "entreprise"),
-                code_gpc=_pick(h, "code_gpc"),
-                code_etr=_pick(h, "code_etr"),
-                chef_equipe=_pick(h, "chef_d_equipe", "chef_dequipe"),
-                ui=_pick(h, "ui"),
-                numero_ppd=numero_ppd,
-                act_prod=_pick(h, "act_prod"),
-                numero_as=_pick(h, "n_as", "numero_as"),
-                centre=_pick(h, "centre"),
-                date_debut=_pick(h, "date_debut"),
-                date_fin=_pick(h, "date_fin"),
-                numero_cac=_pick(h, "n_cac", "numero_cac"),
-                commentaire_interne=_pick(h, "commentaire_interne"),
-                commentaire_oeie=_pick(h, "commentaire_oeie"),
-                commentaire_attelem=_pick(h, "commentaire_attelem"),
-                motif_facturation_degradee=_pick(h, "motif_facturation_degradee", "motif_de_facturation_degradee"),
-                categorie=_pick(h, "categorie"),
-                charge_affaire=_pick(h, "charge_affaire", "charge_d_affaire"),
-                cause_acqui_rejet=_pick(h, "cause_acqui_rejet"),
-                commentaire_acqui_rejet=_pick(h, "comment_acqui_rejet", "commentaire_acqui_rejet"),
-                attachement_cree=_pick(h, "attachement_cree"),
-                derniere_saisie=_pick(h, "derniere_saisie"),
-                attachement_definitif=_pick(h, "attachement_definitif"),
-                attachement_valide=_pick(h, "attachement_valide"),
-                pointe_ppd=_pick(h, "pointe_ppd"),
-                planification_ot=_pick(h, "planification_ot"),
-                validation_interventions=_pick(h, "validation_interventions", "validation_des_interventions"),
-                bordereau=_pick(h, "bordereau"),
-                ht=_parse_decimal(_pick(h, "ht", "total_ht")),
-                bordereau_sst=_pick(h, "bordereau_sst"),
-                ht_sst=_parse_decimal(_pick(h, "ht_sst")),
-                marge=_pick(h, "marge"),
-                coeff=_pick(h, "coeff"),
-                kyntus=_pick(h, "kyntus"),
-                liste_articles=_pick(h, "liste_articles", "liste_des_articles"),
-                encours=_pick(h, "encours"),
-            )
-        )
+    # COPY direct (pas d'ORM par ligne), lignes lues et envoyées par paquets
+    pivots: list[tuple] = []
+    n_rows = copy_rows(
+        db,
+        "canonique.orange_ppd_rows",
+        ORANGE_PPD_ROW_COLUMNS,
+        _iter_csv_ppd_rows(reader, plan, new_import_id, pivots),
+    )
+    n_pivots = copy_rows(db, "canonique.orange_ppd_pivot_rows", ORANGE_PPD_PIVOT_COLUMNS, pivots)
 
-    if not rows and not pivots:
+    # rollback par l'appelant
+    if not n_rows and not n_pivots:
         raise HTTPException(status_code=400, detail="Aucune ligne exploitable")
 
-    imp.row_count = len(rows)
+    imp.row_count = n_rows
 
-    if rows:
-        db.bulk_save_objects(rows)
-    if pivots:
-        db.bulk_save_objects(pivots)
+    elapsed = time.perf_counter() - t0
+    total = n_rows + n_pivots
 
     return {
         "ok": True,
-        "rows": len(rows),
-        "pivots": len(pivots),
-        "count": len(rows),
+        "rows": n_rows,
+        "pivots": n_pivots,
+        "count": n_rows,
         "message": "Import Orange PPD (CSV) terminé",
         "importId": new_import_id,
         "import_id": new_import_id,
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_s": round(total / elapsed, 1) if elapsed > 0 else None,
     }
 
 
@@ -324,104 +461,49 @@ def _import_excel_ppd(db: Session, file: UploadFile, content: bytes, imported_by
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"openpyxl manquant: {e}")
 
-    wb = load_workbook(io.BytesIO(content), data_only=True)
-
-    if sheet and sheet in wb.sheetnames:
-        ws = wb[sheet]
-    elif "PPDATEL" in wb.sheetnames:
-        ws = wb["PPDATEL"]
-    else:
-        ws = wb[wb.sheetnames[0]]
-
-    sheet_name = ws.title
-    header_row, col = _find_header_row_and_map(ws)
-    ppd_num, objet = _extract_ppd_meta(ws)
-
-    new_import_id = str(uuid.uuid4())
-
-    db.execute(
-        text("""
-            INSERT INTO canonique.orange_ppd_excel_imports(import_id, filename, sheet_name, imported_by, row_count)
-            VALUES (:import_id, :filename, :sheet_name, :imported_by, 0)
-        """),
-        {
-            "import_id": new_import_id,
-            "filename": file.filename,
-            "sheet_name": sheet_name,
-            "imported_by": imported_by,
-        },
-    )
+    # read_only: lecture en flux du XML de la feuille, sans construire les cellules
+    wb = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        if sheet and sheet in wb.sheetnames:
+            ws = wb[sheet]
+        elif "PPDATEL" in wb.sheetnames:
+            ws = wb["PPDATEL"]
+        else:
+            ws = wb[wb.sheetnames[0]]
 
-    data_start = header_row + 1
-    max_row = ws.max_row or data_start
+        sheet_name = ws.title
+        # la dimension déclarée par certains générateurs est fausse: on lit tout
+        ws.reset_dimensions()
 
-    batch: list[dict[str, Any]] = []
-    empty_streak = 0
-    inserted = 0
+        new_import_id = str(uuid.uuid4())
 
-    def flush():
-        nonlocal inserted
-        if not batch:
-            return
         db.execute(
             text("""
-                INSERT INTO canonique.orange_ppd_excel_rows(
-                    row_id, import_id, ppd_num, objet, commande, gdf, releve, attachement,
-                    debut_trvx, fin_trvx, montant_brut, montant_majore, sheet_name
-                )
-                VALUES (
-                    :row_id, :import_id, :ppd_num, :objet, :commande, :gdf, :releve, :attachement,
-                    :debut_trvx, :fin_trvx, :montant_brut, :montant_majore, :sheet_name
-                )
-                ON CONFLICT (row_id) DO NOTHING
+                INSERT INTO canonique.orange_ppd_excel_imports(import_id, filename, sheet_name, imported_by, row_count)
+                VALUES (:import_id, :filename, :sheet_name, :imported_by, 0)
             """),
-            batch,
-        )
-        inserted += len(batch)
-        batch.clear()
-
-    for r in range(data_start, max_row + 1):
-        commande = _cell_str(ws.cell(row=r, column=col["commande"]).value)
-        releve = _cell_str(ws.cell(row=r, column=col["releve"]).value)
-
-        mb = _parse_decimal(_cell_str(ws.cell(row=r, column=col["montant_brut"]).value))
-        mm = _parse_decimal(_cell_str(ws.cell(row=r, column=col["montant_majore"]).value))
-
-        if _stop_line(commande, releve, mb, mm):
-            empty_streak += 1
-            if empty_streak >= 15:
-                break
-            continue
-        empty_streak = 0
-
-        gdf = _cell_str(ws.cell(row=r, column=col["gdf"]).value) if "gdf" in col else None
-        att = _cell_str(ws.cell(row=r, column=col["attachement"]).value) if "attachement" in col else None
-        d1 = _cell_str(ws.cell(row=r, column=col["debut_trvx"]).value) if "debut_trvx" in col else None
-        d2 = _cell_str(ws.cell(row=r, column=col["fin_trvx"]).value) if "fin_trvx" in col else None
-
-        row_id = f"{new_import_id}:{r}"
-        batch.append(
             {
-                "row_id": row_id,
                 "import_id": new_import_id,
-                "ppd_num": ppd_num,
-                "objet": objet,
-                "commande": commande or None,
-                "gdf": gdf or None,
-                "releve": releve or None,
-                "attachement": att or None,
-                "debut_trvx": d1 or None,
-                "fin_trvx": d2 or None,
-                "montant_brut": mb,
-                "montant_majore": mm,
+                "filename": file.filename,
                 "sheet_name": sheet_name,
-            }
+                "imported_by": imported_by,
+            },
         )
 
-        if len(batch) >= 2000:
-            flush()
+        info: dict[str, Any] = {}
+        rows = ws.iter_rows(min_row=1, min_col=1, values_only=True)
+        inserted = copy_rows(
+            db,
+            "canonique.orange_ppd_excel_rows",
+            EXCEL_ROW_COLUMNS,
+            _iter_excel_ppd_rows(rows, new_import_id, sheet_name, info),
+        )
+    finally:
+        wb.close()
 
-    flush()
+    header_row = info.get("header_row")
+    ppd_num = info.get("ppd_num")
+    objet = info.get("objet")
 
     db.execute(
         text("UPDATE canonique.orange_ppd_excel_imports SET row_count=:n WHERE import_id=:import_id"),
@@ -465,6 +547,7 @@ async def import_orange_ppd(
         )
 
         db.commit()
+        compare_summary_cache.invalidate(payload.get("import_id"))
         return payload
 
     except HTTPException:
@@ -697,8 +780,7 @@ def compare_orange_ppd(
 
             LEFT JOIN canonique.orange_ppd_rows r
               ON  r.import_id = v.import_id
-              AND UPPER(regexp_replace(BTRIM(r.numero_ot), '\\s+', '', 'g'))
-                = UPPER(regexp_replace(BTRIM(v.num_ot),   '\\s+', '', 'g'))
+              AND r.ot_key_norm = v.num_ot
 
             WHERE (:import_id IS NULL OR v.import_id = :import_id)
               AND (:ppd IS NULL OR v.numero_ppd_orange = :ppd)
@@ -723,6 +805,13 @@ def compare_orange_ppd(
 # --------------------
 # Compare summary
 # --------------------
+_EMPTY_SUMMARY = {
+    "orange_total_ht": 0, "orange_total_ttc": 0,
+    "kyntus_total_ht": 0, "kyntus_total_ttc": 0,
+    "ecart_ht": 0, "ecart_ttc": 0,
+}
+
+
 @router.get("/compare-summary")
 def compare_orange_ppd_summary(
     import_id: str | None = Query(default=None),
@@ -730,12 +819,19 @@ def compare_orange_ppd_summary(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin),  # <-- NOUVEAU: Protection admin
 ):
-    _empty = {
-        "orange_total_ht": 0, "orange_total_ttc": 0,
-        "kyntus_total_ht": 0, "kyntus_total_ttc": 0,
-        "ecart_ht": 0, "ecart_ttc": 0,
-    }
+    # invalidé par les imports Orange PPD / PIDI et /save-pidi (core/summary_cache)
+    key = summary_key(import_id, ppd, current_user.id)
+    cached = compare_summary_cache.get(key)
+    if cached is not None:
+        return cached
 
+    generation = compare_summary_cache.generation()
+    summary = _compute_summary(db, import_id, ppd)
+    compare_summary_cache.put(key, summary, generation)
+    return summary
+
+
+def _compute_summary(db: Session, import_id: str | None, ppd: str | None) -> dict[str, Any]:
     # ------------------------------------------------------------------ XLSX
     if _is_xlsx_import(db, import_id):
         sql = """
@@ -750,18 +846,18 @@ def compare_orange_ppd_summary(
         ),
         o AS (
           SELECT
-            UPPER(regexp_replace(BTRIM(tok), '\\s+', '', 'g')) AS cac_key,
+            NULLIF(UPPER(regexp_replace(tok, '[^0-9A-Za-z]', '', 'g')), '') AS cac_key,
             SUM(b.orange_ht)::numeric(12,2)  AS orange_ht,
             SUM(b.orange_ttc)::numeric(12,2) AS orange_ttc
           FROM base b
           CROSS JOIN LATERAL
             regexp_split_to_table(COALESCE(b.commande_raw, ''), '[,;|\\n\\r\\t ]+') AS tok
-          WHERE NULLIF(BTRIM(tok), '') IS NOT NULL
+          WHERE NULLIF(regexp_replace(tok, '[^0-9A-Za-z]', '', 'g'), '') IS NOT NULL
           GROUP BY 1
         ),
         p AS (
           SELECT
-            UPPER(regexp_replace(BTRIM(p.n_cac), '\\s+', '', 'g')) AS cac_key,
+            p.cac_key,
             SUM(COALESCE(p.ht, 0))::numeric(12,2) AS pidi_ht,
             SUM(
               COALESCE(
@@ -773,7 +869,7 @@ def compare_orange_ppd_summary(
               )
             )::numeric(12,2) AS pidi_bordereau
           FROM raw.pidi p
-          WHERE NULLIF(BTRIM(p.n_cac), '') IS NOT NULL
+          WHERE p.cac_key IN (SELECT cac_key FROM o)
           GROUP BY 1
         )
         SELECT
@@ -787,7 +883,7 @@ def compare_orange_ppd_summary(
         LEFT JOIN p ON p.cac_key = o.cac_key
         """
         row = db.execute(text(sql), {"import_id": import_id, "ppd": ppd}).mappings().first()
-        return dict(row) if row else _empty
+        return dict(row) if row else dict(_EMPTY_SUMMARY)
 
     # ------------------------------------------------------------------ CSV
     row = db.execute(
@@ -807,7 +903,114 @@ def compare_orange_ppd_summary(
         """),
         {"import_id": import_id, "ppd": ppd},
     ).mappings().first()
-    return dict(row) if row else _empty
+    return dict(row) if row else dict(_EMPTY_SUMMARY)
+
+# Arbre CAC -> Relevé -> ND construit en une requête (jsonb imbriqué).
+# Seuls les CAC de l'import sont lus dans raw.pidi. Clés de jointure:
+# CAC sans blancs en majuscules, relevé sans zéros de tête ni caractères non
+# alphanumériques (mêmes règles que routes.praxedo_scraper).
+# TTC Kyntus = somme(bordereau parsé) [Option A].
+COMPARE_TREE_SQL = r"""
+WITH base AS (
+  SELECT
+    btrim(v.n_cac) AS num_ot,
+    NULLIF(btrim(v.releve), '') AS releve,
+    v.numero_ppd_orange,
+    v.facturation_orange_ht,
+    v.facturation_orange_ttc,
+    v.facturation_kyntus_ht,
+    v.facturation_kyntus_ttc,
+    v.diff_ht,
+    v.diff_ttc,
+    COALESCE(v.a_verifier, false) AS a_verifier,
+    v.reason,
+    v.nds,
+    upper(regexp_replace(v.n_cac, '[^0-9A-Za-z]', '', 'g')) AS cac_key,
+    upper(regexp_replace(ltrim(v.releve, '0'), '[^0-9A-Za-z]', '', 'g')) AS releve_key
+  FROM canonique.v_orange_ppd_excel_compare_releve v
+  WHERE v.import_id = :import_id
+    AND (:ppd IS NULL OR v.numero_ppd_orange = :ppd)
+    AND (:only_mismatch = FALSE OR v.a_verifier = TRUE)
+    AND NULLIF(btrim(v.n_cac), '') IS NOT NULL
+),
+pidi AS (
+  SELECT
+    p.cac_key,
+    p.releve_key,
+    NULLIF(btrim(p.nd), '') AS nd,
+    coalesce(p.ht, 0) AS ht,
+    coalesce(
+      nullif(replace(regexp_replace(btrim(p.bordereau), '[^0-9,.\-]', '', 'g'), ',', '.'), '')::numeric,
+      0
+    ) AS ttc
+  FROM raw.pidi p
+  WHERE p.cac_key IN (SELECT cac_key FROM base)
+    AND p.releve_key IS NOT NULL
+),
+nd AS (
+  SELECT
+    cac_key,
+    releve_key,
+    jsonb_agg(
+      jsonb_build_object(
+        'nd', nd,
+        'facturation_kyntus_ht', pidi_ht,
+        'facturation_kyntus_ttc', pidi_ttc
+      ) ORDER BY nd
+    ) AS children
+  FROM (
+    SELECT cac_key, releve_key, nd,
+           sum(ht)::numeric(12,2) AS pidi_ht,
+           sum(ttc)::numeric(12,2) AS pidi_ttc
+    FROM pidi
+    GROUP BY 1, 2, 3
+  ) g
+  GROUP BY 1, 2
+),
+releve_nodes AS (
+  SELECT
+    b.*,
+    jsonb_build_object(
+      'releve', b.releve,
+      'numero_ppd_orange', b.numero_ppd_orange,
+      'facturation_orange_ht', coalesce(b.facturation_orange_ht, 0),
+      'facturation_orange_ttc', coalesce(b.facturation_orange_ttc, 0),
+      'facturation_kyntus_ht', coalesce(b.facturation_kyntus_ht, 0),
+      'facturation_kyntus_ttc', coalesce(b.facturation_kyntus_ttc, 0),
+      'diff_ht', coalesce(b.diff_ht, 0),
+      'diff_ttc', coalesce(b.diff_ttc, 0),
+      'a_verifier', b.a_verifier,
+      'reason', b.reason,
+      'nds', to_jsonb(b.nds),
+      'children', coalesce(nd.children, '[]'::jsonb)
+    ) AS node
+  FROM base b
+  LEFT JOIN nd
+    ON nd.cac_key = b.cac_key
+   AND nd.releve_key = b.releve_key
+),
+cac_nodes AS (
+  SELECT
+    num_ot,
+    jsonb_build_object(
+      'num_ot', num_ot,
+      'numero_ppd_orange', (array_agg(numero_ppd_orange ORDER BY releve))[1],
+      'facturation_orange_ht', coalesce(sum(facturation_orange_ht), 0),
+      'facturation_orange_ttc', coalesce(sum(facturation_orange_ttc), 0),
+      'facturation_kyntus_ht', coalesce(sum(facturation_kyntus_ht), 0),
+      'facturation_kyntus_ttc', coalesce(sum(facturation_kyntus_ttc), 0),
+      'diff_ht', coalesce(sum(diff_ht), 0),
+      'diff_ttc', coalesce(sum(diff_ttc), 0),
+      'a_verifier', bool_or(a_verifier),
+      'children', jsonb_agg(node ORDER BY releve)
+    ) AS node
+  FROM releve_nodes
+  GROUP BY num_ot
+)
+SELECT coalesce(jsonb_agg(node ORDER BY num_ot COLLATE "C"), '[]'::jsonb)::text
+FROM cac_nodes
+"""
+
 
 @router.get("/compare-tree")
 def compare_orange_ppd_tree(
@@ -824,168 +1027,14 @@ def compare_orange_ppd_tree(
     Ne touche pas aux vues existantes, ne casse pas /compare.
     """
 
-    # -------------------- helpers local
-    def _clean_key(s: str | None) -> str | None:
-        if not s:
-            return None
-        return re.sub(r"\s+", "", str(s).strip()).upper() or None
-
-    def _norm_releve_key(s: str | None) -> str | None:
-        # même logique que ta vue: trim + ltrim 0 + enlever non alnum + upper
-        if not s:
-            return None
-        x = str(s).strip()
-        x = x.lstrip("0")
-        x = re.sub(r"[^0-9A-Za-z]", "", x)
-        x = x.upper()
-        return x or None
-
     # -------------------- XLSX ONLY (ton besoin actuel correspond à l'Excel)
     if not _is_xlsx_import(db, import_id):
         raise HTTPException(status_code=400, detail="compare-tree est prévu pour les imports XLSX (Excel).")
 
-    # 1) Niveau CAC+Relevé depuis la vue existante (déjà comparée)
-    base_rows = db.execute(
-        text("""
-            SELECT
-              import_id,
-              n_cac        AS num_ot,
-              releve,
-              numero_ppd_orange,
-              facturation_orange_ht,
-              facturation_orange_ttc,
-              facturation_kyntus_ht,
-              facturation_kyntus_ttc,
-              diff_ht,
-              diff_ttc,
-              a_verifier,
-              reason,
-              nds
-            FROM canonique.v_orange_ppd_excel_compare_releve
-            WHERE import_id = :import_id
-              AND (:ppd IS NULL OR numero_ppd_orange = :ppd)
-              AND (:only_mismatch = FALSE OR a_verifier = TRUE)
-            ORDER BY n_cac, releve
-        """),
+    tree = db.execute(
+        text(COMPARE_TREE_SQL),
         {"import_id": import_id, "ppd": ppd, "only_mismatch": only_mismatch},
-    ).mappings().all()
-
-    if not base_rows:
-        return []
-
-    # 2) Détails ND depuis PIDI: group by CAC+Relevé+ND
-    #    TTC Kyntus = somme(bordereau parsé) (Option A)
-    nd_rows = db.execute(
-        text(r"""
-            SELECT
-              upper(regexp_replace(btrim(p.n_cac), '\s+', '', 'g')) AS cac_key,
-              upper(regexp_replace(ltrim(NULLIF(btrim(p.comment_acqui_rejet), ''), '0'), '[^0-9A-Za-z]', '', 'g')) AS releve_key,
-              NULLIF(btrim(p.n_cac), '') AS n_cac,
-              NULLIF(btrim(p.comment_acqui_rejet), '') AS releve,
-              NULLIF(btrim(p.nd), '') AS nd,
-
-              sum(coalesce(p.ht, 0))::numeric(12,2) AS pidi_ht,
-
-              sum(
-                coalesce(
-                  nullif(
-                    replace(regexp_replace(btrim(p.bordereau), '[^0-9,.\-]', '', 'g'), ',', '.'),
-                    ''
-                  )::numeric,
-                  0
-                )
-              )::numeric(12,2) AS pidi_ttc
-
-            FROM raw.pidi p
-            WHERE NULLIF(btrim(p.n_cac), '') IS NOT NULL
-              AND NULLIF(btrim(p.comment_acqui_rejet), '') IS NOT NULL
-            GROUP BY 1,2,3,4,5
-        """)
-    ).mappings().all()
-
-    # index: (cac_key, releve_key) -> list(nd items)
-    nd_index: dict[tuple[str, str], list[dict[str, Any]]] = {}
-    for r in nd_rows:
-        ck = _clean_key(r["n_cac"]) or (r["cac_key"] or "")
-        rk = _norm_releve_key(r["releve"]) or (r["releve_key"] or "")
-        if not ck or not rk:
-            continue
-        nd_index.setdefault((ck, rk), []).append(
-            {
-                "nd": r["nd"],
-                "facturation_kyntus_ht": float(r["pidi_ht"] or 0),
-                "facturation_kyntus_ttc": float(r["pidi_ttc"] or 0),
-            }
-        )
-
-    # 3) Build tree: CAC -> Relevé -> ND
-    #    On agrège aussi un total CAC à partir des enfants (Orange/Kyntus/diff)
-    cac_tree: dict[str, dict[str, Any]] = {}
-
-    for r in base_rows:
-        cac = str(r["num_ot"] or "").strip()
-        releve = str(r["releve"] or "").strip()
-        if not cac:
-            continue
-
-        cac_key = _clean_key(cac) or ""
-        releve_key = _norm_releve_key(releve) or ""
-
-        # init CAC node
-        node = cac_tree.get(cac)
-        if not node:
-            node = {
-                "num_ot": cac,
-                "numero_ppd_orange": r.get("numero_ppd_orange"),
-                "facturation_orange_ht": 0.0,
-                "facturation_orange_ttc": 0.0,
-                "facturation_kyntus_ht": 0.0,
-                "facturation_kyntus_ttc": 0.0,
-                "diff_ht": 0.0,
-                "diff_ttc": 0.0,
-                "a_verifier": False,
-                "children": [],
-            }
-            cac_tree[cac] = node
-
-        orange_ht = float(r.get("facturation_orange_ht") or 0)
-        orange_ttc = float(r.get("facturation_orange_ttc") or 0)
-        kyntus_ht = float(r.get("facturation_kyntus_ht") or 0)
-        kyntus_ttc = float(r.get("facturation_kyntus_ttc") or 0)
-        diff_ht = float(r.get("diff_ht") or 0)
-        diff_ttc = float(r.get("diff_ttc") or 0)
-        a_verif = bool(r.get("a_verifier") or False)
-
-        # children ND list for this CAC+Relevé
-        nd_children = nd_index.get((cac_key, releve_key), [])
-
-        releve_node = {
-            "releve": releve or None,
-            "numero_ppd_orange": r.get("numero_ppd_orange"),
-            "facturation_orange_ht": orange_ht,
-            "facturation_orange_ttc": orange_ttc,
-            "facturation_kyntus_ht": kyntus_ht,
-            "facturation_kyntus_ttc": kyntus_ttc,
-            "diff_ht": diff_ht,
-            "diff_ttc": diff_ttc,
-            "a_verifier": a_verif,
-            "reason": r.get("reason"),
-            "nds": r.get("nds"),
-            "children": nd_children,
-        }
+    ).scalar()
 
-        node["children"].append(releve_node)
-
-        # roll-up totals at CAC level
-        node["facturation_orange_ht"] += orange_ht
-        node["facturation_orange_ttc"] += orange_ttc
-        node["facturation_kyntus_ht"] += kyntus_ht
-        node["facturation_kyntus_ttc"] += kyntus_ttc
-        node["diff_ht"] += diff_ht
-        node["diff_ttc"] += diff_ttc
-        node["a_verifier"] = node["a_verifier"] or a_verif
-
-    # 4) return list sorted
-    out = list(cac_tree.values())
-    out.sort(key=lambda x: (x.get("num_ot") or ""))
-    return out
\ No newline at end of file
+    # arbre déjà sérialisé par Postgres
+    return Response(content=tree or "[]", media_type="application/json")
@@ -7,14 +7,16 @@ import time
 import json
 import random
 import platform
+import threading
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
 from typing import List, Dict, Any, Optional
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
+from sqlalchemy import literal_column
 from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
@@ -27,14 +29,22 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, WebDriverException
 
 from core.config import get_settings
-from database.connection import get_db
+from core.browser_sessions import BrowserSessionPool
+from core.scrape_jobs import is_active, request_cancel, submit_scrape_job
+from core.scrape_pool import run_sessions
+from core.summary_cache import compare_summary_cache
+from database.connection import SessionLocal, get_db
 
 from models.raw_praxedo_cr10 import RawPraxedoCr10
 from models.raw_pidi import RawPidi
 from models.raw_pidi_scrape_full import RawPidiScrapeFull
+from models.scrape_job import ScrapeJob
+from repositories import scrape_job_repo
+from repositories.dossier_projection_repo import dossier_keys, refresh_user_after_write
+from repositories.scrape_cache_repo import CacheKey, find_cached_rows
 from routes.imports import _extract_palier_from_evenements
 
-from routes.auth import get_current_user
+from routes.auth import get_current_user, require_admin
 from models.user import User
 
 
@@ -53,6 +63,10 @@ class MissingPidiItem(BaseModel):
 
 class ScrapeRequest(BaseModel):
     items: List[MissingPidiItem]
+    # nombre de navigateurs en parallèle (défaut: SCRAPER_SESSIONS, borné par SCRAPER_MAX_SESSIONS)
+    sessions: int | None = Field(default=None, ge=1)
+    # ignore le cache raw.pidi_scrape_full et repasse tout par Praxedo
+    force_refresh: bool = False
 
 
 class ScrapedItem(BaseModel):
@@ -170,23 +184,67 @@ def _choose_best_candidate(
     return scored[0] if scored else None
 
 
-def _td_text_smart(td) -> str:
+# Cellules de plusieurs lignes de résultat en un seul appel WebDriver.
+# Texte visible, sinon textContent, sinon title (cellules icône / lien).
+_ROWS_CELLS_JS = r"""
+return arguments[0].map((tr) => {
+    const table = tr.closest('table');
+    const headers = table ? Array.from(table.querySelectorAll('thead th')).map((th) => th.innerText || '') : [];
+    const cells = Array.from(tr.querySelectorAll('td')).map((td) => (
+        (td.innerText || '').trim() || (td.textContent || '').trim() || (td.getAttribute('title') || '').trim()
+    ).replace(/\n/g, ' '));
+    return {headers: headers, cells: cells};
+});
+"""
+
+
+def _read_rows_cells(driver, rows) -> List[Dict[str, str]]:
+    """{en-tête normalisé (ou COL_i): texte} pour chaque ligne, dans l'ordre de `rows`."""
+    try:
+        raw = driver.execute_script(_ROWS_CELLS_JS, rows) or []
+    except WebDriverException:
+        raw = []
+
+    out: List[Dict[str, str]] = []
+    for i in range(len(rows)):
+        item = raw[i] if i < len(raw) and isinstance(raw[i], dict) else {}
+        headers = [(_norm_key(h) or f"COL_{idx}") for idx, h in enumerate(item.get("headers") or [])]
+        row_map: Dict[str, str] = {}
+        for idx, val in enumerate(item.get("cells") or []):
+            key = headers[idx] if idx < len(headers) else f"COL_{idx}"
+            if val:
+                row_map[key] = val
+        out.append(row_map)
+    return out
+
+
+def _rank_candidates(
+    cell_maps: List[Dict[str, str]],
+    expected_cac: str | None,
+    expected_releve: str | None,
+) -> List[int]:
     """
-    td.text parfois vide (icône/lien). On tente aussi textContent/title.
+    Positions des lignes, de la plus probable à la moins probable, d'après les
+    seules cellules du tableau (même priorité que _choose_best_candidate:
+    CAC, puis relevé, puis richesse). À égalité l'ordre du tableau est conservé.
     """
-    try:
-        t = (td.text or "").strip()
-        if t:
-            return t.replace("\n", " ")
-        t = (td.get_attribute("textContent") or "").strip()
-        if t:
-            return t.replace("\n", " ")
-        t = (td.get_attribute("title") or "").strip()
-        if t:
-            return t.replace("\n", " ")
-    except Exception:
-        pass
-    return ""
+    expected_cac = _normalize_cac(expected_cac)
+    expected_releve_key = _normalize_releve_key(expected_releve)
+
+    def score(m: Dict[str, str]) -> tuple:
+        values = list(m.values())
+        row_cac = _normalize_cac(_first(m, "NUM_CAC", "N_CAC", "CAC", "COMMANDE", "COL_0"))
+        if expected_cac and row_cac == expected_cac:
+            cac_hit = 2
+        elif expected_cac and any(_normalize_cac(v) == expected_cac for v in values):
+            cac_hit = 1
+        else:
+            cac_hit = 0
+        releve_hit = 1 if expected_releve_key and any(_normalize_releve_key(v) == expected_releve_key for v in values) else 0
+        richness = sum(1 for k in ("N_FLUX_PIDI", "NUM_CAC", "HT", "BORDEREAU") if m.get(k))
+        return (cac_hit, releve_hit, richness)
+
+    return sorted(range(len(cell_maps)), key=lambda i: score(cell_maps[i]), reverse=True)
 
 
 def _extract_from_detail_text(detail_text: str) -> Dict[str, str]:
@@ -270,6 +328,115 @@ def _extract_from_detail_text(detail_text: str) -> Dict[str, str]:
     return out
 
 
+# ───────────────────────────────────────────────────────────────────────────────
+# Attentes pilotées par le DOM
+# ───────────────────────────────────────────────────────────────────────────────
+
+# Installé dans chaque document (idempotent): horodatage de la dernière mutation
+# DOM + nombre de requêtes XHR/fetch en vol.
+_DOM_WATCH_JS = r"""
+if (!window.__kyWatch) {
+    const w = window.__kyWatch = {last: performance.now(), pending: 0};
+    const touch = () => { w.last = performance.now(); };
+    new MutationObserver(touch).observe(document.documentElement, {
+        subtree: true, childList: true, attributes: true, characterData: true
+    });
+    const send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        w.pending++;
+        this.addEventListener('loadend', () => { w.pending = Math.max(0, w.pending - 1); touch(); });
+        return send.apply(this, arguments);
+    };
+    if (window.fetch) {
+        const f = window.fetch;
+        window.fetch = function () {
+            w.pending++;
+            return f.apply(this, arguments).finally(() => { w.pending = Math.max(0, w.pending - 1); touch(); });
+        };
+    }
+}
+"""
+
+# Résout dès que predicate(arg, busy) renvoie une valeur (ou, sans prédicat, dès que
+# la page est au repos: document chargé, aucun XHR, aucun loader visible, pas de
+# mutation depuis quietMs). Réévalué à chaque mutation DOM + battement de 50 ms.
+_WAIT_JS = _DOM_WATCH_JS + r"""
+const [predSrc, arg, quietMs, timeoutMs] = arguments;
+const done = arguments[arguments.length - 1];
+const w = window.__kyWatch;
+const LOADERS = '.loading, .spinner, .ui-loader, .blockUI, .datatable-loading';
+const visible = (e) => e.getClientRects().length > 0 && getComputedStyle(e).visibility !== 'hidden';
+const busy = () => document.readyState !== 'complete' || w.pending > 0
+    || Array.from(document.querySelectorAll(LOADERS)).some(visible);
+const pred = predSrc ? new Function('arg', 'busy', predSrc) : null;
+const t0 = performance.now();
+let finished = false;
+let obs = null;
+let timer = null;
+const finish = (res) => {
+    if (finished) return;
+    finished = true;
+    if (obs) obs.disconnect();
+    clearInterval(timer);
+    res.ms = Math.round(performance.now() - t0);
+    done(res);
+};
+const check = () => {
+    try {
+        if (pred) {
+            const v = pred(arg, busy);
+            if (v) return finish({ok: true, value: v});
+        } else if (!busy() && performance.now() - w.last >= quietMs) {
+            return finish({ok: true});
+        }
+    } catch (e) {}
+    if (performance.now() - t0 >= timeoutMs) finish({ok: false});
+};
+obs = new MutationObserver(check);
+obs.observe(document.documentElement, {subtree: true, childList: true, attributes: true, characterData: true});
+timer = setInterval(check, 50);
+check();
+"""
+
+# Résultat de recherche facture: "empty" (Aucune facture), "releve" (ligne contenant
+# le relevé) ou "rows" (tableau stable avec de vraies lignes).
+_RESULTS_PREDICATE_JS = r"""
+const body = document.body ? document.body.innerText : '';
+if (body.includes('Aucune facture')) return 'empty';
+const rows = Array.from(document.querySelectorAll('tbody.pure-datatable-data tr, table tbody tr'))
+    .filter((tr) => tr.cells.length >= 4 && tr.innerText.trim());
+if (arg && rows.some((tr) => tr.innerText.includes(arg))) return 'releve';
+if (rows.length && !busy()) return 'rows';
+return null;
+"""
+
+_QUIET_MS = 150
+
+
+def _wait_js(driver, predicate: str | None = None, arg: Any = None, timeout: float = 30, quiet_ms: int = _QUIET_MS) -> Dict[str, Any]:
+    """
+    Attente côté navigateur (un seul aller-retour WebDriver par document).
+    Une navigation pendant l'attente interrompt le script: on réinstalle sur le
+    nouveau document jusqu'à l'échéance.
+    Retourne {"ok": bool, "value": ..., "ms": int}.
+    """
+    t0 = time.perf_counter()
+    deadline = t0 + timeout
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return {"ok": False, "ms": int((time.perf_counter() - t0) * 1000)}
+        try:
+            driver.set_script_timeout(remaining + 2)
+            res = driver.execute_async_script(_WAIT_JS, predicate, arg, quiet_ms, int(remaining * 1000))
+            if isinstance(res, dict):
+                res["ms"] = int((time.perf_counter() - t0) * 1000)
+                return res
+        except WebDriverException:
+            # document remplacé pendant l'attente (navigation / submit)
+            time.sleep(0.05)
+
+
 def _open_row_detail(driver, row) -> bool:
     """
     Ouvre strictement le détail de la première vraie ligne résultat.
@@ -291,37 +458,30 @@ def _open_row_detail(driver, row) -> bool:
         pass
 
     try:
-        if clickable is not None:
-            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", clickable)
-            time.sleep(0.2)
-            driver.execute_script("arguments[0].click();", clickable)
-        else:
-            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", row)
-            time.sleep(0.2)
-            driver.execute_script("arguments[0].click();", row)
+        driver.execute_script(
+            "arguments[0].scrollIntoView({block:'center'}); arguments[0].click();",
+            clickable if clickable is not None else row,
+        )
     except Exception:
         return False
 
-    end = time.time() + 20
-    while time.time() < end:
-        try:
-            now_handles = set(driver.window_handles)
-            if len(now_handles) > len(before_handles):
-                new_handle = list(now_handles - before_handles)[0]
-                driver.switch_to.window(new_handle)
-                return True
-
-            if driver.current_url != before_url:
-                return True
-
-            body = (driver.find_element(By.TAG_NAME, "body").text or "").strip()
-            if "Détail de l'attachement" in body or "N° de flux PIDI" in body or "N° CAC" in body:
-                return True
-        except Exception:
-            pass
-        time.sleep(0.3)
+    def _detail_ready(d):
+        now_handles = set(d.window_handles)
+        if len(now_handles) > len(before_handles):
+            d.switch_to.window(list(now_handles - before_handles)[0])
+            return True
+        if d.current_url != before_url:
+            return True
+        return d.execute_script(
+            "const t = document.body ? document.body.innerText : '';"
+            "return t.includes(\"Détail de l'attachement\") || t.includes('N° de flux PIDI') || t.includes('N° CAC');"
+        )
 
-    return False
+    try:
+        WebDriverWait(driver, 20, poll_frequency=0.05, ignored_exceptions=(WebDriverException,)).until(_detail_ready)
+        return True
+    except TimeoutException:
+        return False
 
 
 def _close_detail_and_back(driver, base_handle):
@@ -340,26 +500,10 @@ def _close_detail_and_back(driver, base_handle):
 
 def _wait_ajax_done(driver, timeout=45):
     """
-    Attend la fin des chargements AJAX (loaders + DOM stable).
+    Attend la fin des chargements AJAX (document chargé, aucun XHR en vol,
+    loaders masqués, DOM stable depuis _QUIET_MS).
     """
-    end = time.time() + timeout
-    while time.time() < end:
-        try:
-            loaders = driver.find_elements(By.CSS_SELECTOR, ".loading, .spinner, .ui-loader, .blockUI, .datatable-loading")
-            visible = any(l.is_displayed() for l in loaders)
-            if visible:
-                time.sleep(0.4)
-                continue
-
-            ready = driver.execute_script("return document.readyState")
-            if ready != "complete":
-                time.sleep(0.4)
-                continue
-
-            return True
-        except Exception:
-            time.sleep(0.4)
-    return False
+    return _wait_js(driver, timeout=timeout)["ok"]
 
 
 def _find_result_rows(driver):
@@ -406,41 +550,31 @@ def _wait_results_or_empty(driver, releve: str, timeout: int = 30) -> tuple[list
     - ou le message 'Aucune facture'
     Retourne (rows, error_message_or_none)
     """
-    end = time.time() + timeout
     releve = (releve or "").strip()
 
-    while time.time() < end:
-        try:
-            _wait_ajax_done(driver, timeout=3)
-
-            body_text = ""
-            try:
-                body_text = driver.find_element(By.TAG_NAME, "body").text or ""
-            except Exception:
-                pass
-
-            if "Aucune facture" in body_text:
-                return [], "Aucune facture."
-
-            # 1) priorité: ligne contenant explicitement le relevé
-            if releve:
-                xpath_rows = driver.find_elements(
-                    By.XPATH,
-                    f"//tr[td[contains(normalize-space(.), '{releve}')]]"
-                )
-                xpath_rows = [r for r in xpath_rows if (r.text or "").strip()]
-                if xpath_rows:
-                    return xpath_rows, None
-
-            # 2) fallback: toute vraie ligne de tableau
-            rows, _ = _find_result_rows(driver)
-            if rows:
-                return rows, None
+    res = _wait_js(driver, _RESULTS_PREDICATE_JS, releve, timeout=timeout)
+    if not res["ok"]:
+        return [], "Aucun tableau détecté."
+    if res.get("value") == "empty":
+        return [], "Aucune facture."
 
+    # 1) priorité: ligne contenant explicitement le relevé
+    if releve:
+        try:
+            xpath_rows = driver.find_elements(
+                By.XPATH,
+                f"//tr[td[contains(normalize-space(.), '{releve}')]]"
+            )
+            xpath_rows = [r for r in xpath_rows if (r.text or "").strip()]
+            if xpath_rows:
+                return xpath_rows, None
         except Exception:
             pass
 
-        time.sleep(0.5)
+    # 2) fallback: toute vraie ligne de tableau
+    rows, _ = _find_result_rows(driver)
+    if rows:
+        return rows, None
 
     return [], "Aucun tableau détecté."
 
@@ -449,6 +583,9 @@ def _wait_results_or_empty(driver, releve: str, timeout: int = 30) -> tuple[list
 # Selenium Helpers
 # ───────────────────────────────────────────────────────────────────────────────
 
+INVOICE_SEARCH_URL = "https://eu5.praxedo.com/eTech/displayInvoiceSearch.do"
+
+
 def _open_invoice_search_page(driver, wait):
     """
     Ouvre/revient sur l'écran de recherche facture et attend que le formulaire soit prêt.
@@ -459,7 +596,7 @@ def _open_invoice_search_page(driver, wait):
         )
         driver.execute_script("arguments[0].click();", link)
     except Exception:
-        driver.get("https://eu5.praxedo.com/eTech/displayInvoiceSearch.do")
+        driver.get(INVOICE_SEARCH_URL)
 
     _wait_ajax_done(driver, timeout=30)
 
@@ -469,9 +606,14 @@ def _open_invoice_search_page(driver, wait):
 
 
 def human_typing(element, text: str):
+    """Saisie en un seul envoi, sauf si SCRAPER_TYPING_DELAY_MS impose une frappe caractère par caractère."""
+    delay_ms = get_settings().SCRAPER_TYPING_DELAY_MS
+    if delay_ms <= 0:
+        element.send_keys(text or "")
+        return
     for char in (text or ""):
         element.send_keys(char)
-        time.sleep(random.uniform(0.01, 0.04))
+        time.sleep(random.uniform(0.5, 1.5) * delay_ms / 1000)
 
 
 def _build_driver() -> webdriver.Remote:
@@ -500,258 +642,425 @@ def _build_driver() -> webdriver.Remote:
 # Stream Scraper
 # ───────────────────────────────────────────────────────────────────────────────
 
-def scrape_generator(items: List[Dict[str, str]], user: str, password: str):
-    LOGIN_URL = (
-        "https://auth.praxedo.com/oauth2/default/v1/authorize?"
-        "response_type=code&client_id=0oa81c5o3hBGZtAPF417"
-        "&scope=openid%20profile%20etech&state=Y04QT2yAPF9AUn3hmp2a-EioA_Ddw-WYupohnb2vsxQ%3D"
-        "&redirect_uri=https://eu5.praxedo.com/eTech/login/oauth2/code/okta"
-        "&nonce=Ae4aI3FPlBAE0MiCYIQKreokC6z01IxrKPvW3istXr4"
-    )
+LOGIN_URL = (
+    "https://auth.praxedo.com/oauth2/default/v1/authorize?"
+    "response_type=code&client_id=0oa81c5o3hBGZtAPF417"
+    "&scope=openid%20profile%20etech&state=Y04QT2yAPF9AUn3hmp2a-EioA_Ddw-WYupohnb2vsxQ%3D"
+    "&redirect_uri=https://eu5.praxedo.com/eTech/login/oauth2/code/okta"
+    "&nonce=Ae4aI3FPlBAE0MiCYIQKreokC6z01IxrKPvW3istXr4"
+)
+
+
+def _info(message: str, **extra: Any) -> Dict[str, Any]:
+    return {"status": "info", "message": message, **extra}
+
+
+class _StepTimer:
+    """Durées par étape d'un relevé, publiées dans les événements info."""
+
+    def __init__(self) -> None:
+        self.t0 = self.t = time.perf_counter()
+        self.steps: Dict[str, int] = {}
+
+    def lap(self, step: str) -> Dict[str, Any]:
+        """Clôt l'étape `step` (temps écoulé depuis le lap précédent)."""
+        now = time.perf_counter()
+        ms = int((now - self.t) * 1000)
+        self.t = now
+        self.steps[step] = self.steps.get(step, 0) + ms
+        return {"step": step, "step_ms": ms, "t_ms": int((now - self.t0) * 1000)}
+
+    def summary(self) -> Dict[str, int]:
+        return {**self.steps, "total": int((time.perf_counter() - self.t0) * 1000)}
+
+
+# vide / remplit un champ et déclenche input + change (un seul aller-retour)
+_SET_FIELD_JS = """
+arguments[0].value = arguments[1];
+arguments[0].dispatchEvent(new Event('input', { bubbles: true }));
+arguments[0].dispatchEvent(new Event('change', { bubbles: true }));
+return arguments[0].value;
+"""
+
+
+def _login_praxedo(driver, wait, user: str, password: str):
+    """Login Okta puis ouverture de l'écran de recherche facture (événements info)."""
+    yield _info("Avant ouverture URL login...")
+    driver.get(LOGIN_URL)
+    yield _info(f"URL login ouverte: {driver.current_url}")
+
+    yield _info("Recherche champ identifiant...")
+    user_input = wait.until(EC.visibility_of_element_located((By.NAME, "identifier")))
+    yield _info("Champ identifiant trouvé.")
+
+    human_typing(user_input, user)
+    user_input.send_keys(Keys.RETURN)
+
+    yield _info("Recherche champ mot de passe...")
+    pwd_input = wait.until(EC.visibility_of_element_located((By.NAME, "credentials.passcode")))
+    yield _info("Champ mot de passe trouvé.")
+
+    human_typing(pwd_input, password)
+    pwd_input.send_keys(Keys.RETURN)
+
+    yield _info("Login en cours... attente redirection.")
+    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='AdvancedSearchWorkOrder.do']")))
+    yield _info("Redirection effectuée, lien AdvancedSearchWorkOrder trouvé.")
+
+    yield _info("Clic sur AdvancedSearchWorkOrder...")
+    wait.until(
+        EC.element_to_be_clickable((By.CSS_SELECTOR, "a[href*='AdvancedSearchWorkOrder.do']"))
+    ).click()
+    yield _info("Clic effectué sur AdvancedSearchWorkOrder.")
+
+    yield _info("Ouverture page recherche facture...")
+    _open_invoice_search_page(driver, wait)
+    yield _info("Page recherche facture ouverte.")
+
+
+def _scrape_releve(driver, wait, item: Dict[str, str], i: int, total: int):
+    """Recherche d'un relevé sur une session déjà connectée (événements NDJSON)."""
+    releve = (item.get("releve") or "").strip()
+    expected_cac = _normalize_cac(item.get("n_cac"))
+    expected_ppd = (item.get("numero_ppd_orange") or "").strip() or None
+
+    if not releve:
+        return
+
+    timer = _StepTimer()
+    yield {
+        "status": "progress",
+        "releve": releve,
+        "message": f"[{i+1}/{total}] Traitement: relevé={releve} / CAC attendu={expected_cac or '—'} ..."
+    }
 
-    driver = None
     try:
-        yield json.dumps({"status": "info", "message": "Connexion à Selenium (Remote Chrome)..."}) + "\n"
-        driver = _build_driver()
-        yield json.dumps({"status": "info", "message": "Session Selenium créée."}) + "\n"
-        
-        wait = WebDriverWait(driver, 25)
-        yield json.dumps({"status": "info", "message": "Avant ouverture URL login..."}) + "\n"
-        
-        driver.get(LOGIN_URL)
-        yield json.dumps({"status": "info", "message": f"URL login ouverte: {driver.current_url}"}) + "\n"
-
-        yield json.dumps({"status": "info", "message": "Recherche champ identifiant..."}) + "\n"
-        user_input = wait.until(EC.visibility_of_element_located((By.NAME, "identifier")))
-        yield json.dumps({"status": "info", "message": "Champ identifiant trouvé."}) + "\n"
-        
-        human_typing(user_input, user)
-        user_input.send_keys(Keys.RETURN)
-
-        yield json.dumps({"status": "info", "message": "Recherche champ mot de passe..."}) + "\n"
-        pwd_input = wait.until(EC.visibility_of_element_located((By.NAME, "credentials.passcode")))
-        yield json.dumps({"status": "info", "message": "Champ mot de passe trouvé."}) + "\n"
-        
-        human_typing(pwd_input, password)
-        pwd_input.send_keys(Keys.RETURN)
-
-        yield json.dumps({"status": "info", "message": "Login en cours... attente redirection."}) + "\n"
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='AdvancedSearchWorkOrder.do']")))
-        yield json.dumps({"status": "info", "message": "Redirection effectuée, lien AdvancedSearchWorkOrder trouvé."}) + "\n"
-
-        yield json.dumps({"status": "info", "message": "Clic sur AdvancedSearchWorkOrder..."}) + "\n"
-        wait.until(
-            EC.element_to_be_clickable((By.CSS_SELECTOR, "a[href*='AdvancedSearchWorkOrder.do']"))
-        ).click()
-        yield json.dumps({"status": "info", "message": "Clic effectué sur AdvancedSearchWorkOrder."}) + "\n"
-
-        yield json.dumps({"status": "info", "message": "Ouverture page recherche facture..."}) + "\n"
+        yield _info(f"Ouverture formulaire recherche pour {releve}...")
         _open_invoice_search_page(driver, wait)
-        yield json.dumps({"status": "info", "message": "Page recherche facture ouverte."}) + "\n"
+        yield _info("Formulaire de recherche prêt.", **timer.lap("open_form"))
 
-        yield json.dumps({"status": "info", "message": "Début du traitement..."}) + "\n"
+        # reset rapide des champs
+        date_input = wait.until(EC.presence_of_element_located((By.NAME, "minCreationDateStr")))
+        driver.execute_script(_SET_FIELD_JS, date_input, "")
 
-        for i, item in enumerate(items):
-            releve = (item.get("releve") or "").strip()
-            expected_cac = _normalize_cac(item.get("n_cac"))
-            expected_ppd = (item.get("numero_ppd_orange") or "").strip() or None
+        textarea = wait.until(EC.presence_of_element_located((By.NAME, "commentaireNotification")))
+        driver.execute_script(_SET_FIELD_JS, textarea, "")
 
-            if not releve:
-                continue
+        # saisie + vérification
+        saisie = driver.execute_script(_SET_FIELD_JS, textarea, releve)
+        yield _info(f"Relevé {releve} saisi.", **timer.lap("fill_form"))
+        if saisie != releve:
+            yield {
+                "status": "warning",
+                "releve": releve,
+                "message": f"La saisie du relevé a échoué (attendu='{releve}', obtenu='{saisie}')"
+            }
+
+        yield _info(f"Lancement recherche pour {releve}...")
+        search_btn = wait.until(EC.element_to_be_clickable((By.ID, "searchBottom")))
+        driver.execute_script("arguments[0].click();", search_btn)
 
-            yield json.dumps({
-                "status": "progress",
+        rows_check, wait_error = _wait_results_or_empty(driver, releve=releve, timeout=20)
+
+        if wait_error and not rows_check:
+            yield {
+                "status": "error",
                 "releve": releve,
-                "message": f"[{i+1}/{len(items)}] Traitement: relevé={releve} / CAC attendu={expected_cac or '—'} ..."
-            }) + "\n"
+                "message": f"{wait_error} URL={driver.current_url}",
+                **timer.lap("search"),
+            }
+            return
+
+        yield _info(f"{len(rows_check)} ligne(s) trouvée(s)", **timer.lap("search"))
+
+        rows = rows_check
+        base_handle = driver.current_window_handle
+
+        # pré-filtre: cellules de toutes les lignes en un seul appel, classement
+        # CAC / relevé, puis détail ouvert uniquement pour les mieux classées
+        cell_maps = _read_rows_cells(driver, rows)
+        order = _rank_candidates(cell_maps, expected_cac, releve)
+        max_details = 1 if len(order) == 1 else max(1, get_settings().SCRAPER_MAX_DETAILS)
+        yield _info(
+            f"{len(order)} ligne(s) classée(s), {min(len(order), max_details)} détail(s) au plus à ouvrir.",
+            **timer.lap("rank"),
+        )
 
+        candidates: List[Dict[str, str]] = []
+
+        for attempt, pos in enumerate(order[:max_details], start=1):
+            row_map: Dict[str, str] = {
+                "RELEVE_INPUT": releve,
+                "EXPECTED_RELEVE": releve,
+                "EXPECTED_CAC": expected_cac or "",
+            }
+            if expected_ppd:
+                row_map["EXPECTED_PPD"] = expected_ppd
+            row_map.update(cell_maps[pos])
+
+            if attempt > 1:
+                # retour arrière dans le même onglet: les lignes ont été recréées
+                fresh, _ = _wait_results_or_empty(driver, releve=releve, timeout=8)
+                if len(fresh) == len(rows):
+                    rows = fresh
+
+            opened = _open_row_detail(driver, rows[pos])
+            if not opened:
+                yield _info(f"Détail ligne {pos + 1} non ouvert.", **timer.lap("detail"))
+                continue
+
+            _wait_ajax_done(driver, timeout=10)
+
+            body_text = ""
             try:
-                yield json.dumps({"status": "info", "message": f"Ouverture formulaire recherche pour {releve}..."}) + "\n"
-                _open_invoice_search_page(driver, wait)
-
-                # reset rapide des champs
-                yield json.dumps({"status": "info", "message": "Reset champ date..."}) + "\n"
-                date_input = wait.until(EC.presence_of_element_located((By.NAME, "minCreationDateStr")))
-                driver.execute_script("arguments[0].value = '';", date_input)
-                driver.execute_script("arguments[0].dispatchEvent(new Event('input', { bubbles: true }));", date_input)
-                driver.execute_script("arguments[0].dispatchEvent(new Event('change', { bubbles: true }));", date_input)
-
-                yield json.dumps({"status": "info", "message": "Reset champ commentaire..."}) + "\n"
-                textarea = wait.until(EC.presence_of_element_located((By.NAME, "commentaireNotification")))
-                driver.execute_script("arguments[0].value = '';", textarea)
-                driver.execute_script("arguments[0].dispatchEvent(new Event('input', { bubbles: true }));", textarea)
-                driver.execute_script("arguments[0].dispatchEvent(new Event('change', { bubbles: true }));", textarea)
-
-                yield json.dumps({"status": "info", "message": f"Saisie relevé {releve}..."}) + "\n"
-                driver.execute_script("arguments[0].value = arguments[1];", textarea, releve)
-                driver.execute_script("arguments[0].dispatchEvent(new Event('input', { bubbles: true }));", textarea)
-                driver.execute_script("arguments[0].dispatchEvent(new Event('change', { bubbles: true }));", textarea)
-
-                # Vérification de la saisie
-                saisie = driver.execute_script("return arguments[0].value;", textarea)
-                if saisie != releve:
-                    yield json.dumps({
-                        "status": "warning", 
-                        "releve": releve, 
-                        "message": f"La saisie du relevé a échoué (attendu='{releve}', obtenu='{saisie}')"
-                    }) + "\n"
-
-                yield json.dumps({"status": "info", "message": f"Lancement recherche pour {releve}..."}) + "\n"
-                yield json.dumps({"status": "info", "message": "Recherche bouton searchBottom..."}) + "\n"
-                search_btn = wait.until(EC.element_to_be_clickable((By.ID, "searchBottom")))
-                yield json.dumps({"status": "info", "message": "Bouton searchBottom trouvé, clic..."}) + "\n"
-                driver.execute_script("arguments[0].click();", search_btn)
-
-                yield json.dumps({"status": "info", "message": "Attente des résultats..."}) + "\n"
-                rows_check, wait_error = _wait_results_or_empty(driver, releve=releve, timeout=20)
-
-                if wait_error and not rows_check:
-                    yield json.dumps({
-                        "status": "error",
-                        "releve": releve,
-                        "message": f"{wait_error} URL={driver.current_url}"
-                    }) + "\n"
-                    continue
+                body_text = driver.find_element(By.TAG_NAME, "body").text or ""
+            except Exception:
+                pass
 
-                yield json.dumps({"status": "info", "message": f"{len(rows_check)} ligne(s) trouvée(s)"}) + "\n"
+            detail = _extract_from_detail_text(body_text)
+            for k, v in detail.items():
+                if v:
+                    row_map[k] = v
 
-                tbody = None
-                try:
-                    tbody = driver.find_element(By.CSS_SELECTOR, "tbody.pure-datatable-data")
-                except Exception:
-                    try:
-                        tbody = driver.find_element(By.CSS_SELECTOR, "table tbody")
-                    except Exception:
-                        tbody = None
+            _close_detail_and_back(driver, base_handle)
+            _wait_ajax_done(driver, timeout=8)
+            yield _info(f"Détail ligne {pos + 1} lu.", **timer.lap("detail"))
 
-                rows = rows_check
-                base_handle = driver.current_window_handle
+            cac = _normalize_cac(_first(row_map, "NUM_CAC", "N_CAC", "CAC", "COMMANDE", "COL_0"))
+            if cac:
+                row_map["NUM_CAC"] = cac
 
-                # Cas simple : une seule ligne -> comportement quasi inchangé
-                if len(rows) == 1:
-                    candidate_rows = [rows[0]]
-                else:
-                    # Cas multi-lignes : on analysera chaque détail pour choisir la bonne
-                    candidate_rows = rows
-
-                candidates: List[Dict[str, str]] = []
-
-                for row_idx, candidate_row in enumerate(candidate_rows, start=1):
-                    row_map: Dict[str, str] = {
-                        "RELEVE_INPUT": releve,
-                        "EXPECTED_RELEVE": releve,
-                        "EXPECTED_CAC": expected_cac or "",
-                    }
-                    if expected_ppd:
-                        row_map["EXPECTED_PPD"] = expected_ppd
-
-                    # lecture rapide des cellules visibles de la ligne
-                    try:
-                        tds = candidate_row.find_elements(By.TAG_NAME, "td")
-                        headers = []
-                        try:
-                            table = driver.execute_script(
-                                "return arguments[0].closest('table')",
-                                candidate_row
-                            )
-                            ths = table.find_elements(By.CSS_SELECTOR, "thead th") if table else []
-                            headers = [(_norm_key(th.text) or f"COL_{idx}") for idx, th in enumerate(ths)]
-                        except Exception:
-                            headers = []
-
-                        for idx, td in enumerate(tds):
-                            val = _td_text_smart(td)
-                            key = headers[idx] if idx < len(headers) and headers else f"COL_{idx}"
-                            if val:
-                                row_map[key] = val
-                    except Exception:
-                        pass
-
-                    opened = _open_row_detail(driver, candidate_row)
-                    if not opened:
-                        continue
-
-                    _wait_ajax_done(driver, timeout=10)
-
-                    body_text = ""
-                    try:
-                        body_text = driver.find_element(By.TAG_NAME, "body").text or ""
-                    except Exception:
-                        pass
-
-                    detail = _extract_from_detail_text(body_text)
-                    for k, v in detail.items():
-                        if v:
-                            row_map[k] = v
-
-                    _close_detail_and_back(driver, base_handle)
-                    _wait_ajax_done(driver, timeout=8)
-
-                    cac = _normalize_cac(_first(row_map, "NUM_CAC", "N_CAC", "CAC", "COMMANDE", "COL_0"))
-                    if cac:
-                        row_map["NUM_CAC"] = cac
-
-                    candidates.append(row_map)
-
-                    # si cas simple -> inutile d'aller plus loin
-                    if len(rows) == 1:
+            candidates.append(row_map)
+
+            # meilleure ligne confirmée par le détail -> inutile d'aller plus loin
+            if not expected_cac or cac == expected_cac:
+                break
+
+        best = _choose_best_candidate(candidates, expected_cac, releve)
+
+        if not best:
+            yield {
+                "status": "error",
+                "releve": releve,
+                "message": "Aucune ligne exploitable après analyse des résultats."
+            }
+            return
+
+        yield {
+            "status": "result",
+            "releve": releve,
+            "expected_cac": expected_cac,
+            "row": best
+        }
+
+        yield _info(
+            f"Trouvé ({len(candidates)} ligne(s) analysée(s), 1 retenue).",
+            timings=timer.summary(),
+        )
+
+    except TimeoutException:
+        yield {
+            "status": "error",
+            "releve": releve,
+            "message": f"Timeout. URL={driver.current_url}"
+        }
+    except Exception as e:
+        import traceback
+        yield {
+            "status": "error",
+            "releve": releve,
+            "message": f"Erreur: {str(e)} | TRACE: {traceback.format_exc()}"
+        }
+
+
+def _praxedo_health(driver) -> str:
+    """Contrôle avant réutilisation: "ok" (connecté, formulaire prêt), "expired" (retour Okta) ou "dead"."""
+    driver.get(INVOICE_SEARCH_URL)
+    try:
+        WebDriverWait(driver, 5).until(
+            lambda d: "auth.praxedo.com" in (d.current_url or "")
+            or d.find_elements(By.NAME, "commentaireNotification")
+        )
+    except TimeoutException:
+        return "dead"
+    if "auth.praxedo.com" in (driver.current_url or ""):
+        return "expired"
+    return "ok"
+
+
+_BROWSER_SESSIONS: BrowserSessionPool | None = None
+_BROWSER_SESSIONS_LOCK = threading.Lock()
+
+
+def _browser_sessions() -> BrowserSessionPool:
+    """Pool process-wide des navigateurs connectés au compte Praxedo configuré."""
+    global _BROWSER_SESSIONS
+    with _BROWSER_SESSIONS_LOCK:
+        if _BROWSER_SESSIONS is None:
+            settings = get_settings()
+
+            def login(driver, emit) -> None:
+                wait = WebDriverWait(driver, 25)
+                for ev in _login_praxedo(driver, wait, settings.PRAXEDO_USER, settings.PRAXEDO_PASSWORD):
+                    emit(ev)
+
+            _BROWSER_SESSIONS = BrowserSessionPool(
+                _build_driver,
+                login,
+                _praxedo_health,
+                max_idle=settings.SCRAPER_MAX_SESSIONS,
+                idle_timeout_s=settings.SCRAPER_SESSION_IDLE_S,
+                max_age_s=settings.SCRAPER_SESSION_MAX_AGE_S,
+            )
+        return _BROWSER_SESSIONS
+
+
+def shutdown_browser_sessions() -> None:
+    with _BROWSER_SESSIONS_LOCK:
+        pool = _BROWSER_SESSIONS
+    if pool is not None:
+        pool.shutdown()
+
+
+def _session_worker(total: int):
+    """Worker de core.scrape_pool: une session Praxedo (réutilisée si possible) qui dépile les relevés."""
+
+    def run(sid: int, next_item, emit, stop) -> None:
+        def publish(ev: Dict[str, Any]) -> None:
+            ev["session"] = sid
+            emit(ev)
+
+        pool = _browser_sessions()
+        session = None
+        healthy = True
+        try:
+            t0 = time.perf_counter()
+            session, reused = pool.acquire(publish)
+            publish({
+                "status": "info",
+                "browser_session": session.id,
+                "reused": reused,
+                "ready_ms": int((time.perf_counter() - t0) * 1000),
+                "message": f"Session {session.id} prête ({'réutilisée' if reused else 'nouvelle'}).",
+            })
+
+            driver = session.driver
+            wait = WebDriverWait(driver, 25)
+
+            publish(_info("Début du traitement..."))
+
+            while not stop.is_set():
+                nxt = next_item()
+                if nxt is None:
+                    break
+                i, item = nxt
+                for ev in _scrape_releve(driver, wait, item, i, total):
+                    ev["index"] = i
+                    publish(ev)
+                    if stop.is_set():
                         break
+        except Exception as e:
+            healthy = False
+            import traceback
+            publish({
+                "status": "fatal",
+                "message": f"Erreur critique: {str(e)} | TRACE: {traceback.format_exc()}"
+            })
+        finally:
+            # le navigateur reste connecté pour la prochaine requête (contrôlé à la reprise)
+            if session is not None:
+                pool.release(session, healthy=healthy)
+
+    return run
+
+
+def _resolve_sessions(requested: int | None, n_items: int) -> int:
+    settings = get_settings()
+    n = requested or settings.SCRAPER_SESSIONS
+    n = min(n, settings.SCRAPER_MAX_SESSIONS, max(1, n_items))
+    return max(1, n)
 
-                best = _choose_best_candidate(candidates, expected_cac, releve)
 
-                if not best:
-                    yield json.dumps({
-                        "status": "error",
-                        "releve": releve,
-                        "message": "Aucune ligne exploitable après analyse des résultats."
-                    }) + "\n"
-                    continue
+def _cache_key(item: Dict[str, str]) -> CacheKey:
+    return (
+        _normalize_releve_key(item.get("releve")),
+        _normalize_cac(item.get("n_cac")),
+        (item.get("numero_ppd_orange") or "").strip() or None,
+    )
 
-                yield json.dumps({
-                    "status": "result",
-                    "releve": releve,
-                    "expected_cac": expected_cac,
-                    "row": best
-                }) + "\n"
-
-                yield json.dumps({
-                    "status": "info",
-                    "message": f"Trouvé ({len(candidates)} ligne(s) analysée(s), 1 retenue)."
-                }) + "\n"
-
-            except TimeoutException:
-                yield json.dumps({
-                    "status": "error",
-                    "releve": releve,
-                    "message": f"Timeout. URL={driver.current_url}"
-                }) + "\n"
-                continue
-            except Exception as e:
-                import traceback
-                yield json.dumps({
-                    "status": "error",
-                    "releve": releve,
-                    "message": f"Erreur: {str(e)} | TRACE: {traceback.format_exc()}"
-                }) + "\n"
-                continue
 
+def _split_cached(
+    db: Session,
+    user_id: int,
+    items: List[Dict[str, str]],
+    force_refresh: bool,
+) -> tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+    """(événements result servis depuis le cache, items à scraper)."""
+    if force_refresh:
+        return [], items
+
+    hits = find_cached_rows(db, user_id, [_cache_key(x) for x in items], get_settings().SCRAPER_CACHE_TTL_S)
+
+    cached: List[Dict[str, Any]] = []
+    misses: List[Dict[str, str]] = []
+    for item in items:
+        hit = hits.get(_cache_key(item))
+        if hit is None:
+            misses.append(item)
+            continue
+        cached.append({
+            "status": "result",
+            "releve": item["releve"],
+            "expected_cac": _normalize_cac(item.get("n_cac")),
+            "row": hit["row"],
+            "cached": True,
+            "scraped_at": hit["scraped_at"].isoformat() if hit["scraped_at"] else None,
+        })
+    return cached, misses
+
+
+def scrape_generator(items: List[Dict[str, str]], sessions: int = 1, cached: List[Dict[str, Any]] | None = None):
+    """
+    Renvoie d'abord les relevés servis par le cache, puis répartit les autres sur
+    `sessions` navigateurs connectés en parallèle (core.scrape_pool) et émet les
+    événements NDJSON dans l'ordre d'arrivée.
+    Chaque événement navigateur porte `session` (et `index` pour ceux d'un relevé).
+    """
+    t0 = time.perf_counter()
+    cached = cached or []
+    try:
+        if cached:
+            yield json.dumps({"status": "info", "message": f"{len(cached)} relevé(s) servi(s) depuis le cache."}) + "\n"
+            for ev in cached:
+                yield json.dumps(ev) + "\n"
+
+        if items:
+            yield json.dumps({"status": "info", "message": f"Démarrage de {sessions} session(s) Praxedo en parallèle..."}) + "\n"
+            for ev in run_sessions(items, sessions, _session_worker(len(items))):
+                yield json.dumps(ev) + "\n"
     except Exception as e:
         import traceback
         yield json.dumps({
-            "status": "fatal", 
+            "status": "fatal",
             "message": f"Erreur critique: {str(e)} | TRACE: {traceback.format_exc()}"
         }) + "\n"
     finally:
-        yield json.dumps({"status": "done", "message": "Scraping terminé ! Navigateur fermé."}) + "\n"
-        try:
-            if driver:
-                driver.quit()
-        except Exception:
-            pass
+        yield json.dumps({
+            "status": "done",
+            "sessions": sessions if items else 0,
+            "cache_hits": len(cached),
+            "scraped": len(items),
+            "elapsed_s": round(time.perf_counter() - t0, 1),
+            "message": "Scraping terminé !"
+        }) + "\n"
 
 
 @router.post("")
-def run_scraper(req: ScrapeRequest, current_user: User = Depends(get_current_user)):
+def run_scraper(
+    req: ScrapeRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
     settings = get_settings()
     user = getattr(settings, "PRAXEDO_USER", None)
     pwd = getattr(settings, "PRAXEDO_PASSWORD", None)
@@ -769,12 +1078,266 @@ def run_scraper(req: ScrapeRequest, current_user: User = Depends(get_current_use
         if (x.releve or "").strip()
     ]
 
+    # lookup fait ici: la session db est fermée avant le corps du stream
+    cached, misses = _split_cached(db, current_user.id, items, req.force_refresh)
+
     return StreamingResponse(
-        scrape_generator(items, user, pwd),
+        scrape_generator(misses, sessions=_resolve_sessions(req.sessions, len(misses)), cached=cached),
         media_type="application/x-ndjson",
     )
 
 
+@router.get("/sessions")
+def browser_sessions_status(current_user: User = Depends(get_current_user)):
+    return _browser_sessions().stats()
+
+
+@router.delete("/sessions")
+def browser_sessions_close(current_user: User = Depends(require_admin)):
+    """Ferme les navigateurs inactifs (ex: après changement du mot de passe Praxedo)."""
+    return {"ok": True, "closed": _browser_sessions().close_all()}
+
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Jobs de scraping persistants (pilotage.scrape_job / scrape_job_item)
+# ───────────────────────────────────────────────────────────────────────────────
+
+# résultats passés à la logique /save-pidi par paquets pendant le run
+_JOB_SAVE_EVERY = 25
+_JOB_TAIL_POLL_S = 1.0
+
+
+def _save_job_results(db: Session, job_id: str, user_id: int) -> None:
+    pending = scrape_job_repo.unsaved_results(db, job_id)
+    if not pending:
+        return
+    res = _save_pidi_rows(db, user_id, [row for _, row in pending])
+    scrape_job_repo.mark_saved(db, job_id, [idx for idx, _ in pending], res)
+    db.commit()
+
+
+def _run_scrape_job(job_id: str, cancel: threading.Event) -> None:
+    """Runner core.scrape_jobs: traite les items pending, état écrit en base à chaque événement."""
+    db = SessionLocal()
+    try:
+        job = db.get(ScrapeJob, job_id)
+        if job is None:
+            return
+        if cancel.is_set() or job.status in ("cancelling", "cancelled"):
+            scrape_job_repo.set_status(db, job_id, "cancelled")
+            db.commit()
+            return
+
+        scrape_job_repo.set_status(db, job_id, "running")
+        items = scrape_job_repo.pending_items(db, job_id)
+        db.commit()
+
+        # 1) cache raw.pidi_scrape_full
+        misses = items
+        if not job.force_refresh and items:
+            hits = find_cached_rows(db, job.user_id, [_cache_key(x) for x in items], get_settings().SCRAPER_CACHE_TTL_S)
+            misses = []
+            for x in items:
+                hit = hits.get(_cache_key(x))
+                if hit is None:
+                    misses.append(x)
+                else:
+                    scrape_job_repo.mark_item(db, job_id, x["idx"], "ok", result=hit["row"], message="cache", cached=True)
+            db.commit()
+
+        # 2) navigateurs
+        ok_since_save = 0
+        if misses:
+            settings = get_settings()
+            if not settings.PRAXEDO_USER or not settings.PRAXEDO_PASSWORD:
+                raise RuntimeError("Identifiants Praxedo non configurés")
+
+            sessions = _resolve_sessions(job.sessions, len(misses))
+            events = run_sessions(misses, sessions, _session_worker(len(misses)))
+            try:
+                for ev in events:
+                    pos = ev.get("index")
+                    if pos is not None and ev.get("status") in ("progress", "result", "error"):
+                        idx = misses[pos]["idx"]
+                        if ev["status"] == "progress":
+                            scrape_job_repo.mark_item(db, job_id, idx, "running")
+                        elif ev["status"] == "result":
+                            scrape_job_repo.mark_item(db, job_id, idx, "ok", result=ev.get("row"))
+                            ok_since_save += 1
+                        else:
+                            scrape_job_repo.mark_item(db, job_id, idx, "error", message=ev.get("message"))
+                        db.commit()
+                    elif ev.get("status") == "fatal":
+                        scrape_job_repo.set_status(db, job_id, "running", error=ev.get("message"))
+                        db.commit()
+
+                    if ok_since_save >= _JOB_SAVE_EVERY:
+                        _save_job_results(db, job_id, job.user_id)
+                        ok_since_save = 0
+
+                    if cancel.is_set():
+                        break
+            finally:
+                # arrête les sessions (stop) si on sort avant la fin
+                events.close()
+
+        # 3) résultats -> /save-pidi
+        _save_job_results(db, job_id, job.user_id)
+
+        final = "cancelled" if cancel.is_set() else "done"
+        if final == "cancelled":
+            scrape_job_repo.pending_items(db, job_id)  # items 'running' -> pending (reprise)
+        scrape_job_repo.set_status(db, job_id, final)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        try:
+            scrape_job_repo.set_status(db, job_id, "error", error=str(e))
+            db.commit()
+        except Exception:
+            db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _get_job_or_404(db: Session, job_id: str, user_id: int) -> ScrapeJob:
+    job = scrape_job_repo.get_job(db, job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job de scraping introuvable")
+    return job
+
+
+@router.post("/jobs")
+def start_scrape_job(
+    req: ScrapeRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    items = [
+        {
+            "n_cac": (x.n_cac or "").strip(),
+            "releve": (x.releve or "").strip(),
+            "numero_ppd_orange": (x.numero_ppd_orange or "").strip() if x.numero_ppd_orange else None,
+        }
+        for x in req.items
+        if (x.releve or "").strip()
+    ]
+    if not items:
+        raise HTTPException(status_code=400, detail="Aucun relevé à scraper")
+
+    try:
+        job = scrape_job_repo.create_job(
+            db,
+            current_user.id,
+            items,
+            sessions=_resolve_sessions(req.sessions, len(items)),
+            force_refresh=req.force_refresh,
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Création du job impossible : {str(e)}")
+
+    submit_scrape_job(job.job_id, _run_scrape_job)
+    return scrape_job_repo.job_snapshot(db, job)
+
+
+@router.get("/jobs")
+def list_scrape_jobs(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return [scrape_job_repo.job_snapshot(db, j) for j in scrape_job_repo.list_jobs(db, current_user.id)]
+
+
+@router.get("/jobs/{job_id}")
+def get_scrape_job(job_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return scrape_job_repo.job_snapshot(db, _get_job_or_404(db, job_id, current_user.id))
+
+
+@router.post("/jobs/{job_id}/resume")
+def resume_scrape_job(
+    job_id: str,
+    retry_errors: bool = Query(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    job = _get_job_or_404(db, job_id, current_user.id)
+    if is_active(job_id):
+        raise HTTPException(status_code=409, detail="Job déjà en cours")
+
+    requeued = scrape_job_repo.requeue(db, job_id, retry_errors=retry_errors)
+    scrape_job_repo.set_status(db, job_id, "queued")
+    db.commit()
+
+    submit_scrape_job(job_id, _run_scrape_job)
+    db.refresh(job)
+    return {**scrape_job_repo.job_snapshot(db, job), "requeued_errors": requeued}
+
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_scrape_job(job_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    job = _get_job_or_404(db, job_id, current_user.id)
+    if job.status in scrape_job_repo.FINISHED:
+        return scrape_job_repo.job_snapshot(db, job)
+
+    # en cours ici -> le runner s'arrête au prochain événement; sinon job orphelin
+    scrape_job_repo.set_status(db, job_id, "cancelling" if request_cancel(job_id) else "cancelled")
+    db.commit()
+    db.refresh(job)
+    return scrape_job_repo.job_snapshot(db, job)
+
+
+def _tail_generator(job_id: str, after: int):
+    """Suit les changements d'état des items (seq croissant) jusqu'à la fin du job."""
+    db = SessionLocal()
+    try:
+        last = after
+        while True:
+            rows = scrape_job_repo.tail_items(db, job_id, last)
+            for r in rows:
+                last = r["seq"]
+                ev: Dict[str, Any] = {
+                    "status": {"ok": "result", "error": "error"}.get(r["status"], r["status"]),
+                    "seq": r["seq"],
+                    "index": r["idx"],
+                    "releve": r["releve"],
+                    "expected_cac": _normalize_cac(r["n_cac"]),
+                    "attempts": r["attempts"],
+                }
+                if r["result"] is not None and r["status"] == "ok":
+                    ev["row"] = r["result"]
+                    ev["cached"] = r["cached"]
+                if r["message"]:
+                    ev["message"] = r["message"]
+                yield json.dumps(ev, default=str) + "\n"
+
+            if rows:
+                db.commit()  # nouvelle transaction -> voit les écritures du runner
+                continue
+
+            status = scrape_job_repo.current_status(db, job_id)
+            db.commit()
+            if status is None or status in scrape_job_repo.FINISHED:
+                job = db.get(ScrapeJob, job_id, populate_existing=True)
+                snap = scrape_job_repo.job_snapshot(db, job) if job else {"job_id": job_id}
+                yield json.dumps({**snap, "status": "done", "job_status": status, "seq": last}, default=str) + "\n"
+                return
+
+            time.sleep(_JOB_TAIL_POLL_S)
+    finally:
+        db.close()
+
+
+@router.get("/jobs/{job_id}/stream")
+def tail_scrape_job(
+    job_id: str,
+    after: int = Query(0, ge=0, description="Dernier seq reçu (reprise du flux)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    _get_job_or_404(db, job_id, current_user.id)
+    return StreamingResponse(_tail_generator(job_id, after), media_type="application/x-ndjson")
+
+
 @router.post("/save")
 def save_scraped_data(
     items: List[ScrapedItem],
@@ -825,11 +1388,16 @@ def save_scraped_data(
         )
         db.execute(stmt)
         db.commit()
-        return {"ok": True, "saved": len(rows_list)}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Erreur lors de la sauvegarde : {str(e)}")
 
+    # raw.praxedo_cr10 alimente v_croisement -> projection des dossiers
+    projection = refresh_user_after_write(
+        db, current_user.id, "scrape_save_cr10", dossier_keys(r["id_externe"] for r in rows_list)
+    )
+    return {"ok": True, "saved": len(rows_list), "projection": projection}
+
 
 @router.post("/save-pidi")
 def save_scraped_pidi_rows(
@@ -844,12 +1412,58 @@ def save_scraped_pidi_rows(
     if not payload:
         return {"ok": True, "saved_full": 0, "inserted_pidi": 0}
 
+    return _save_pidi_rows(db, current_user.id, [item.data or {} for item in payload])
+
+
+# colonnes raw.pidi rafraîchies quand le flux existe déjà (les autres restent celles de l'import PIDI)
+_PIDI_UPDATE_COLUMNS = (
+    "contrat", "type_pidi", "statut", "nd", "code_secteur", "numero_ot", "numero_att", "agence",
+    "numero_ppd", "comment_acqui_rejet", "n_cac", "ht", "bordereau", "imported_at",
+)
+
+_UPSERT_CHUNK = 1000
+
+
+def _upsert_rows(
+    db: Session,
+    table,
+    rows: List[Dict[str, Any]],
+    key: tuple[str, ...],
+    update_columns: tuple[str, ...] | None = None,
+) -> tuple[int, int]:
+    """
+    INSERT ... ON CONFLICT (key) DO UPDATE par paquets, (insérées, mises à jour)
+    lues via RETURNING (xmax = 0). Doublons de clé dans le lot: la dernière ligne gagne.
+    """
+    dedup: Dict[tuple, Dict[str, Any]] = {}
+    for r in rows:
+        dedup[tuple(r[k] for k in key)] = r
+    rows = list(dedup.values())
+
+    inserted = 0
+    total = 0
+    for start in range(0, len(rows), _UPSERT_CHUNK):
+        chunk = rows[start:start + _UPSERT_CHUNK]
+        stmt = pg_insert(table).values(chunk)
+        cols = update_columns or tuple(c for c in chunk[0] if c not in key)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[k] for k in key],
+            set_={c: stmt.excluded[c] for c in cols},
+        ).returning(literal_column("(xmax = 0)"))
+        flags = db.execute(stmt).scalars().all()
+        inserted += sum(1 for f in flags if f)
+        total += len(flags)
+    return inserted, total - inserted
+
+
+def _save_pidi_rows(db: Session, user_id: int, payload: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Logique de /save-pidi (aussi appelée par les jobs de scraping). Commit."""
     now = datetime.utcnow()
-    full_rows: List[RawPidiScrapeFull] = []
+    full_rows: List[Dict[str, Any]] = []
     pidi_rows: List[Dict[str, Any]] = []
 
-    for item in payload:
-        raw = item.data or {}
+    for raw in payload:
+        raw = raw or {}
         r: Dict[str, str] = {_norm_key(str(k)): _clean(v) for k, v in raw.items()}
 
         flux = _first(r, "N_FLUX_PIDI", "FLUX_PIDI", "NUMERO_FLUX_PIDI", "N_DE_FLUX_PIDI")
@@ -881,6 +1495,8 @@ def save_scraped_pidi_rows(
         if expected_cac and not cac:
             continue
 
+        expected_ppd = _first(r, "EXPECTED_PPD")
+
         contrat = _first(r, "CONTRAT")
         nd = _first(r, "ND")
         secteur = _first(r, "CODE_SECTEUR", "SECTEUR")
@@ -902,7 +1518,7 @@ def save_scraped_pidi_rows(
         comment_for_match = comment_scraped or expected_releve or releve_input
 
         full_rows.append(
-            RawPidiScrapeFull(
+            dict(
                 flux_pidi=flux,
                 releve_input=expected_releve or releve_input,
                 contrat=contrat,
@@ -920,7 +1536,10 @@ def save_scraped_pidi_rows(
                 prix_majore=prix_majore,
                 raw_payload=json.dumps(raw, ensure_ascii=False),
                 imported_at=now,
-                user_id=current_user.id,
+                user_id=user_id,
+                releve_key=_normalize_releve_key(expected_releve or releve_input),
+                expected_cac=expected_cac or cac,
+                expected_ppd=expected_ppd,
             )
         )
 
@@ -941,57 +1560,29 @@ def save_scraped_pidi_rows(
                 "ht": ht,
                 "bordereau": bordereau,
                 "imported_at": now,
-                "user_id": current_user.id,
+                "user_id": user_id,
             }
         )
 
-    saved_full = 0
-    for x in full_rows:
-        db.merge(x)
-        saved_full += 1
-
-    # Traitement manuel de pidi_rows (remplace le on_conflict_do_update)
-    inserted = 0
-    updated = 0
-
-    for row in pidi_rows:
-        flux = (row.get("numero_flux_pidi") or "").strip()
+    try:
+        saved_full, _ = _upsert_rows(db, RawPidiScrapeFull.__table__, full_rows, ("flux_pidi", "user_id"))
+        inserted, updated = _upsert_rows(
+            db, RawPidi.__table__, pidi_rows, ("numero_flux_pidi", "user_id"), _PIDI_UPDATE_COLUMNS
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la sauvegarde PIDI : {str(e)}")
 
-        existing = None
-        if flux and flux != "-1":
-            existing = (
-                db.query(RawPidi)
-                .filter(RawPidi.numero_flux_pidi == flux)
-                .first()
-            )
+    compare_summary_cache.invalidate()
 
-        if existing:
-            # Mise à jour de l'enregistrement existant
-            existing.contrat = row.get("contrat")
-            existing.type_pidi = row.get("type_pidi")
-            existing.statut = row.get("statut")
-            existing.nd = row.get("nd")
-            existing.code_secteur = row.get("code_secteur")
-            existing.numero_ot = row.get("numero_ot")
-            existing.numero_att = row.get("numero_att")
-            existing.agence = row.get("agence")
-            existing.numero_ppd = row.get("numero_ppd")
-            existing.comment_acqui_rejet = row.get("comment_acqui_rejet")
-            existing.n_cac = row.get("n_cac")
-            existing.ht = row.get("ht")
-            existing.bordereau = row.get("bordereau")
-            existing.imported_at = row.get("imported_at")
-            existing.user_id = row.get("user_id")
-            updated += 1
-        else:
-            # Nouvel enregistrement
-            db.add(RawPidi(**row))
-            inserted += 1
+    keys = dossier_keys((r["numero_ot"] for r in pidi_rows), (r["nd"] for r in pidi_rows))
+    projection = refresh_user_after_write(db, user_id, "scrape_save_pidi", keys)
 
-    db.commit()
     return {
         "ok": True,
         "saved_full": saved_full,
         "inserted_pidi": inserted,
         "updated_pidi": updated,
+        "projection": projection,
     }
\ No newline at end of file
@@ -1,14 +1,32 @@
 from __future__ import annotations
 
+import dataclasses
+import logging
+import time
+from collections import Counter
 from datetime import datetime
+from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 
-from database.connection import get_db
+from core.regle_compiler import (
+    CompiledRule,
+    RuleSet,
+    compile_rule,
+    condition_fields,
+    prune_compiled,
+    statut_final,
+)
+from core.regle_index import IndexedRule, regle_index
+from database.connection import SessionLocal, get_db
 from models.regle_facturation import RegleFacturation
+from models.user import User
+from repositories.dossier_projection_repo import VIEW_COLUMNS, load_projection_rows, refresh_rules_after_write
+from routes.auth import get_current_user, require_admin
 from schemas.regle_facturation import (
+    RegleDryRunOverride,
+    RegleDryRunRequest,
     RegleFacturationOut,
     RegleFacturationCreate,
     RegleFacturationUpdate,
@@ -16,6 +34,17 @@ from schemas.regle_facturation import (
 
 router = APIRouter(prefix="/api/regles", tags=["regles"])
 
+log = logging.getLogger(__name__)
+
+
+def _refresh_projection(pairs: list[tuple[str | None, str | None]]) -> None:
+    # hors requête: recalcule seulement les dossiers des couples activité|produit touchés
+    db = SessionLocal()
+    try:
+        refresh_rules_after_write(db, pairs)
+    finally:
+        db.close()
+
 
 def _get_or_404(db: Session, regle_id: int) -> RegleFacturation:
     r = db.query(RegleFacturation).filter(RegleFacturation.id == regle_id).first()
@@ -24,15 +53,181 @@ def _get_or_404(db: Session, regle_id: int) -> RegleFacturation:
     return r
 
 
+def _commit_and_publish(db: Session) -> None:
+    # version incrémentée dans la transaction: les autres workers rechargent leur index
+    regle_index.bump_version(db)
+    db.commit()
+    try:
+        regle_index.publish(db)
+    except Exception:
+        # écriture déjà validée: l'index sera rechargé au prochain contrôle de version
+        log.exception("rechargement de l'index des règles échoué")
+
+
+# Lectures servies par l'index en mémoire (core/regle_index)
 @router.get("/count")
 def count_regles(
     include_inactive: bool = Query(False),
     db: Session = Depends(get_db),
 ):
-    q = db.query(RegleFacturation)
-    if not include_inactive:
-        q = q.filter(RegleFacturation.is_active.is_(True))
-    return {"count": int(q.count())}
+    snap = regle_index.current(db)
+    return {"count": len(snap.rules if include_inactive else snap.active)}
+
+
+@router.get("/index")
+def regles_index_stats(db: Session = Depends(get_db)):
+    regle_index.current(db)
+    return regle_index.stats()
+
+
+@router.get("/lookup", response_model=list[RegleFacturationOut])
+def lookup_regles(
+    code_activite: str = Query(...),
+    code_produit: str = Query(...),
+    plp_applicable: bool | None = Query(None),
+    db: Session = Depends(get_db),
+):
+    # règles actives du couple activité|produit (normalisé upper/trim, comme la vue);
+    # sans plp_applicable: toutes, quel que soit leur plp
+    return list(regle_index.current(db).lookup(code_activite, code_produit, plp_applicable))
+
+
+@router.get("/by-code/{code}", response_model=list[RegleFacturationOut])
+def get_regles_by_code(code: str, db: Session = Depends(get_db)):
+    return list(regle_index.current(db).by_code.get(code, ()))
+
+
+# colonnes toujours nécessaires pour choisir la règle et le statut (cf. v_dossier_facturable)
+_DRY_RUN_BASE_FIELDS = ("user_id", "key_match", "activite_code", "produit_code", "code_cloture_code", "statut_croisement")
+
+
+def _apply_overrides(rules: list[CompiledRule], overrides: list[RegleDryRunOverride]) -> list[CompiledRule]:
+    by_id: dict[int, IndexedRule] = {c.rule.id: c.rule for c in rules}
+    out = {c.rule.id: c for c in rules}
+    next_id = -1
+    for o in overrides:
+        changes = o.model_dump(exclude_unset=True, exclude={"id"})
+        if "codes_cloture_facturables" in changes and changes["codes_cloture_facturables"] is not None:
+            changes["codes_cloture_facturables"] = tuple(changes["codes_cloture_facturables"])
+        base = by_id.get(o.id) if o.id is not None else None
+        if base is None:
+            # règle ajoutée pour la simulation (id négatif)
+            base = IndexedRule(
+                id=o.id if o.id is not None else next_id,
+                code="", libelle=None, condition_sql=None, condition_json=None, statut_facturation=None,
+                code_activite=None, code_produit=None, plp_applicable=None, categorie=None,
+                codes_cloture_facturables=None, is_active=True, deleted_at=None, created_at=None,
+                updated_at=None, search_text="",
+            )
+            next_id -= 1
+        rule = dataclasses.replace(base, **changes)
+        if not rule.is_active:
+            out.pop(rule.id, None)
+            continue
+        # pas de mémoïsation: la règle simulée n'existe pas en base
+        out[rule.id] = compile_rule(rule, cache=False)
+    return list(out.values())
+
+
+@router.post("/dry-run")
+def dry_run_regles(
+    payload: RegleDryRunRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> dict[str, Any]:
+    """
+    Évalue en mémoire les règles actives (condition_json compilées) sur un lot de
+    dossiers et indique la règle retenue, sans toucher à la vue. Avec
+    rules_override: simulation d'un changement de règles et comptage des
+    dossiers dont la règle ou le statut change.
+
+    from_projection lit les dossiers de l'utilisateur courant; user_id
+    (autre utilisateur) est réservé aux administrateurs.
+    """
+    scope_user_id = current_user.id
+    if payload.from_projection and payload.user_id is not None and payload.user_id != current_user.id:
+        require_admin(current_user)
+        scope_user_id = payload.user_id
+
+    t0 = time.perf_counter()
+    snap = regle_index.current(db)
+    compiled = [compile_rule(r) for r in snap.active]
+    prune_compiled(snap.rules)
+    current = RuleSet(compiled)
+    simulated = RuleSet(_apply_overrides(compiled, payload.rules_override)) if payload.rules_override else None
+
+    fields = set(_DRY_RUN_BASE_FIELDS)
+    for c in compiled:
+        fields |= condition_fields(c.rule.condition_json)
+    for o in payload.rules_override or ():
+        fields |= condition_fields(o.condition_json)
+
+    unknown_fields: list[str] = []
+    if payload.from_projection:
+        dossiers = load_projection_rows(db, fields, scope_user_id, payload.limit)
+        unknown_fields = sorted(fields - set(VIEW_COLUMNS))
+    else:
+        dossiers = (payload.dossiers or [])[: payload.limit]
+    t_loaded = time.perf_counter()
+
+    by_rule: Counter[str] = Counter()
+    by_statut: Counter[str] = Counter()
+    sim_by_rule: Counter[str] = Counter()
+    sim_by_statut: Counter[str] = Counter()
+    changed = 0
+    sample: list[dict[str, Any]] = []
+
+    for d in dossiers:
+        hit = current.match(d)
+        statut = statut_final(d, hit)
+        by_rule[hit.rule.code if hit else "(aucune)"] += 1
+        by_statut[statut] += 1
+        res = {
+            "user_id": d.get("user_id"),
+            "key_match": d.get("key_match"),
+            "regle_id": hit.rule.id if hit else None,
+            "regle_code": hit.rule.code if hit else None,
+            "statut_final": statut,
+        }
+        if simulated is not None:
+            sim_hit = simulated.match(d)
+            sim_statut = statut_final(d, sim_hit)
+            sim_by_rule[sim_hit.rule.code if sim_hit else "(aucune)"] += 1
+            sim_by_statut[sim_statut] += 1
+            res.update(
+                sim_regle_id=sim_hit.rule.id if sim_hit else None,
+                sim_regle_code=sim_hit.rule.code if sim_hit else None,
+                sim_statut_final=sim_statut,
+            )
+            if res["sim_regle_id"] != res["regle_id"] or sim_statut != statut:
+                changed += 1
+                if len(sample) < payload.sample:
+                    sample.append(res)
+        elif len(sample) < payload.sample:
+            sample.append(res)
+
+    out: dict[str, Any] = {
+        "index_version": snap.version,
+        "rules": len(compiled),
+        "invalid_rules": [
+            {"id": c.rule.id, "code": c.rule.code, "error": c.error}
+            for c in {c.rule.id: c for c in current.invalid + (simulated.invalid if simulated else [])}.values()
+        ],
+        "dossiers": len(dossiers),
+        "unknown_fields": unknown_fields,
+        "by_rule": dict(by_rule.most_common()),
+        "by_statut": dict(by_statut),
+        "load_ms": int((t_loaded - t0) * 1000),
+        "eval_ms": int((time.perf_counter() - t_loaded) * 1000),
+        "results": sample,
+    }
+    if simulated is not None:
+        out.update(
+            changed=changed,
+            sim_by_rule=dict(sim_by_rule.most_common()),
+            sim_by_statut=dict(sim_by_statut),
+        )
+    return out
 
 
 @router.get("", response_model=list[RegleFacturationOut])
@@ -45,46 +240,34 @@ def list_regles(
     order: str = Query("desc", pattern="^(asc|desc)$"),
     db: Session = Depends(get_db),
 ):
-    query = db.query(RegleFacturation)
-
-    if not include_inactive:
-        query = query.filter(RegleFacturation.is_active.is_(True))
-
-    if q:
-        like = f"%{q}%"
-        query = query.filter(
-            or_(
-                RegleFacturation.code.ilike(like),
-                RegleFacturation.libelle.ilike(like),
-                RegleFacturation.condition_sql.ilike(like),
-            )
-        )
-
-    if action:
-        query = query.filter(RegleFacturation.statut_facturation == action)
-
-    if order == "asc":
-        query = query.order_by(RegleFacturation.id.asc())
-    else:
-        query = query.order_by(RegleFacturation.id.desc())
-
-    return query.offset(offset).limit(limit).all()
+    rules = regle_index.current(db).search(q=q or None, action=action or None, include_inactive=include_inactive)
+    if order == "desc":
+        rules = rules[::-1]
+    return list(rules[offset:offset + limit])
 
 
 @router.get("/{regle_id}", response_model=RegleFacturationOut)
 def get_regle(regle_id: int, db: Session = Depends(get_db)):
-    return _get_or_404(db, regle_id)
+    r = regle_index.current(db).by_id.get(regle_id)
+    if r is None:
+        raise HTTPException(status_code=404, detail="Règle introuvable")
+    return r
 
 
 @router.post("", response_model=RegleFacturationOut, status_code=status.HTTP_201_CREATED)
-def create_regle(payload: RegleFacturationCreate, db: Session = Depends(get_db)):
+def create_regle(
+    payload: RegleFacturationCreate,
+    background: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
     try:
         r = RegleFacturation(**payload.model_dump())
         r.is_active = True
         r.deleted_at = None
         db.add(r)
-        db.commit()
+        _commit_and_publish(db)
         db.refresh(r)
+        background.add_task(_refresh_projection, [(r.code_activite, r.code_produit)])
         return r
     except Exception as e:
         db.rollback()
@@ -92,13 +275,20 @@ def create_regle(payload: RegleFacturationCreate, db: Session = Depends(get_db))
 
 
 @router.patch("/{regle_id}", response_model=RegleFacturationOut)
-def patch_regle(regle_id: int, payload: RegleFacturationUpdate, db: Session = Depends(get_db)):
+def patch_regle(
+    regle_id: int,
+    payload: RegleFacturationUpdate,
+    background: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
     r = _get_or_404(db, regle_id)
 
     data = payload.model_dump(exclude_unset=True)
     if not data:
         return r
 
+    before = (r.code_activite, r.code_produit)
+
     try:
         # si on active/désactive via PATCH
         if "is_active" in data:
@@ -110,8 +300,9 @@ def patch_regle(regle_id: int, payload: RegleFacturationUpdate, db: Session = De
         for k, v in data.items():
             setattr(r, k, v)
 
-        db.commit()
+        _commit_and_publish(db)
         db.refresh(r)
+        background.add_task(_refresh_projection, [before, (r.code_activite, r.code_produit)])
         return r
     except Exception as e:
         db.rollback()
@@ -119,13 +310,14 @@ def patch_regle(regle_id: int, payload: RegleFacturationUpdate, db: Session = De
 
 
 @router.delete("/{regle_id}", status_code=status.HTTP_200_OK)
-def soft_delete_regle(regle_id: int, db: Session = Depends(get_db)):
+def soft_delete_regle(regle_id: int, background: BackgroundTasks, db: Session = Depends(get_db)):
     r = _get_or_404(db, regle_id)
 
     try:
         r.is_active = False
         r.deleted_at = datetime.utcnow()
-        db.commit()
+        _commit_and_publish(db)
+        background.add_task(_refresh_projection, [(r.code_activite, r.code_produit)])
         return {"ok": True}
     except Exception as e:
         db.rollback()
@@ -133,13 +325,14 @@ def soft_delete_regle(regle_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/{regle_id}/restore", response_model=RegleFacturationOut)
-def restore_regle(regle_id: int, db: Session = Depends(get_db)):
+def restore_regle(regle_id: int, background: BackgroundTasks, db: Session = Depends(get_db)):
     r = _get_or_404(db, regle_id)
     try:
         r.is_active = True
         r.deleted_at = None
-        db.commit()
+        _commit_and_publish(db)
         db.refresh(r)
+        background.add_task(_refresh_projection, [(r.code_activite, r.code_produit)])
         return r
     except Exception as e:
         db.rollback()
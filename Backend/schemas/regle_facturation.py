@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 
 
@@ -48,4 +48,32 @@ class RegleFacturationUpdate(BaseModel):
     categorie: Optional[str] = None
 
     # ✅ allow toggle active via PATCH (optionnel)
-    is_active: Optional[bool] = None
\ No newline at end of file
+    is_active: Optional[bool] = None
+
+
+class RegleDryRunOverride(BaseModel):
+    # id d'une règle existante: la remplace le temps de la simulation; sinon règle ajoutée
+    id: Optional[int] = None
+    code: Optional[str] = None
+    libelle: Optional[str] = None
+    condition_json: Optional[Dict[str, Any]] = None
+    statut_facturation: Optional[str] = None
+
+    code_activite: Optional[str] = None
+    code_produit: Optional[str] = None
+    plp_applicable: Optional[bool] = None
+    codes_cloture_facturables: Optional[list[str]] = None
+    is_active: Optional[bool] = None
+
+
+class RegleDryRunRequest(BaseModel):
+    # dossiers fournis (colonnes de v_dossier_facturable) ou lus dans la projection
+    dossiers: Optional[list[Dict[str, Any]]] = None
+    from_projection: bool = False
+    # projection d'un autre utilisateur (admin); par défaut l'utilisateur courant
+    user_id: Optional[int] = None
+    limit: int = Field(100_000, ge=1, le=500_000)
+
+    rules_override: Optional[list[RegleDryRunOverride]] = None
+    sample: int = Field(50, ge=0, le=5000)
+